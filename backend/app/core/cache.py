@@ -0,0 +1,358 @@
+"""Response caching primitives used by the AI and auth routes."""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Sequence
+
+from app.core.cache_backends import CacheBackendError
+
+
+def canonical_hash(*parts: Any) -> str:
+    """Stable SHA-256 over JSON-normalized inputs (key order and whitespace don't matter)."""
+    encoded = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+# Entry layout: format byte, generation count, the generations, then the payload.
+# Formats 1 and 2 were marshal, which is unsafe to load from a store shared
+# across processes and deploys; such entries now read as misses.
+_JSON = 3
+_JSON_ZLIB = 4
+_HEADER = struct.Struct(">BB")
+_GENERATION = struct.Struct(">Q")
+COMPRESS_MIN_BYTES = 512
+BACKEND_ERRORS = (OSError, sqlite3.Error, CacheBackendError, asyncio.TimeoutError)
+
+
+def dump_value(value: Any, generations: Sequence[int] = ()) -> bytes:
+    """Binary entry for plain JSON data (dicts, lists, str, numbers, ...); ``ValueError`` otherwise.
+
+    JSON reads back the same on every Python version and can't crash the
+    reader, which matters for a store every process and deploy shares.
+    Tuples come back as lists. Large payloads are zlib-compressed.
+    """
+    try:
+        payload = json.dumps(value, separators=(",", ":"), ensure_ascii=False, allow_nan=False).encode()
+    except TypeError as exc:
+        raise ValueError(str(exc)) from exc
+    kind = _JSON
+    if len(payload) >= COMPRESS_MIN_BYTES:
+        payload, kind = zlib.compress(payload, 1), _JSON_ZLIB
+    header = _HEADER.pack(kind, len(generations)) + b"".join(_GENERATION.pack(g) for g in generations)
+    return header + payload
+
+
+def load_value(data: bytes) -> tuple[tuple[int, ...], Any]:
+    """``(generations, value)`` from ``dump_value`` output; ``ValueError`` if unreadable."""
+    kind, count = _HEADER.unpack_from(data)
+    offset = _HEADER.size + count * _GENERATION.size
+    generations = tuple(_GENERATION.unpack_from(data, _HEADER.size + i * _GENERATION.size)[0] for i in range(count))
+    payload = data[offset:]
+    if kind == _JSON_ZLIB:
+        payload = zlib.decompress(payload)
+    elif kind != _JSON:
+        raise ValueError(f"unknown cache entry format {kind}")
+    # JSONDecodeError and UnicodeDecodeError are both ValueErrors.
+    return generations, json.loads(payload)
+
+
+class SharedCache:
+    """TTL cache over a ``cache_backends`` store, so every worker can share entries.
+
+    Values go through ``encode`` (to plain data), then ``dump_value``.
+    Entries live in an optional ``scope`` (one child, one user, ...).
+    ``invalidate(scope)`` drops a scope and ``invalidate()`` the whole cache,
+    both in O(1): they bump a generation counter in the backend, and entries
+    written under an older generation stop matching. A failing backend
+    counts as a miss, never as a request error. Every operation but
+    ``stats`` is a coroutine, since the backend may be across the network.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        backend,
+        ttl_seconds: float,
+        encode: Callable[[Any], Any] | None = None,
+        decode: Callable[[Any], Any] | None = None,
+    ) -> None:
+        self.name = name
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.encode = encode
+        self.decode = decode
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _generation_keys(self, scope: str) -> list[str]:
+        keys = [f"g:{self.name}"]
+        if scope:
+            keys.append(f"g:{self.name}:{scope}")
+        return keys
+
+    async def lookup(self, key: str, scope: str = "") -> tuple[Any | None, tuple[int, ...] | None]:
+        """``(value, generation)``; pass ``generation`` to ``set`` after computing a miss.
+
+        Storing under the generation read here means an ``invalidate`` that
+        lands while the value is being computed makes the result unservable.
+        """
+        generation_keys = self._generation_keys(scope)
+        try:
+            *counters, data = await self.backend.get_many([*generation_keys, f"v:{self.name}:{scope}:{key}"])
+        except BACKEND_ERRORS:
+            self.errors += 1
+            self.misses += 1
+            return None, None
+        generation = tuple(int(counter or 0) for counter in counters)
+        if data is not None:
+            try:
+                stored_generation, value = load_value(data)
+            except (ValueError, struct.error, zlib.error):
+                stored_generation, value = None, None
+            if stored_generation == generation:
+                self.hits += 1
+                return (value if self.decode is None else self.decode(value)), generation
+        self.misses += 1
+        return None, generation
+
+    async def get(self, key: str, scope: str = "") -> Any | None:
+        return (await self.lookup(key, scope))[0]
+
+    async def set(
+        self,
+        key: str,
+        value: Any,
+        ttl_seconds: float | None = None,
+        scope: str = "",
+        generation: tuple[int, ...] | None = None,
+    ) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        if ttl <= 0:
+            return
+        try:
+            if generation is None:
+                generation = tuple(int(c or 0) for c in await self.backend.get_many(self._generation_keys(scope)))
+            data = dump_value(value if self.encode is None else self.encode(value), generation)
+            await self.backend.set(f"v:{self.name}:{scope}:{key}", data, ttl)
+        except ValueError:
+            # Not plain data (JSON can't encode it); serve it uncached.
+            self.errors += 1
+        except BACKEND_ERRORS:
+            self.errors += 1
+
+    async def delete(self, key: str, scope: str = "") -> None:
+        try:
+            await self.backend.delete(f"v:{self.name}:{scope}:{key}")
+        except BACKEND_ERRORS:
+            self.errors += 1
+
+    async def invalidate(self, scope: str = "") -> None:
+        try:
+            await self.backend.incr(self._generation_keys(scope)[-1])
+        except BACKEND_ERRORS:
+            self.errors += 1
+
+    async def clear(self) -> None:
+        await self.invalidate()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "backend": self.backend.name,
+            **self.backend.stats(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+        }
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one in-flight task."""
+
+    def __init__(self) -> None:
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+
+            def _forget(done: asyncio.Task) -> None:
+                if self._inflight.get(key) is done:
+                    del self._inflight[key]
+
+            task.add_done_callback(_forget)
+        else:
+            self.coalesced += 1
+        # Shield so one caller disconnecting doesn't cancel the shared upstream call.
+        return await asyncio.shield(task)
+
+
+class SqliteStore:
+    """Small on-disk key/value store shared by every ``TwoTierCache`` namespace.
+
+    Calls are blocking; ``TwoTierCache`` runs them in worker threads, so one
+    lock serializes use of the connection.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " stored_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+            )
+            self._conn = conn
+        return self._conn
+
+    def get(self, namespace: str, key: str) -> tuple[float, Any] | None:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT stored_at, value FROM cache_entries WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def set(self, namespace: str, key: str, value: Any, stored_at: float) -> None:
+        encoded = json.dumps(value, separators=(",", ":"))
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, stored_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, encoded, stored_at),
+            )
+
+    def delete(self, namespace: str, key: str, stored_at: float) -> None:
+        """Drop an entry unless it was rewritten after ``stored_at``."""
+        with self._lock:
+            self.conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key = ? AND stored_at <= ?",
+                (namespace, key, stored_at),
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self.conn.execute("DELETE FROM cache_entries")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class TwoTierCache:
+    """In-memory LRU in front of a persistent ``SqliteStore``, with stale-while-revalidate.
+
+    Entries younger than ``fresh_seconds`` are served as-is. Entries up to
+    ``max_age_seconds`` old are still served, but ``get_or_load`` refreshes them
+    in the background. Older entries count as misses and are dropped from
+    both tiers.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        store: SqliteStore,
+        max_entries: int,
+        fresh_seconds: float,
+        max_age_seconds: float,
+    ) -> None:
+        self.namespace = namespace
+        self.store = store
+        self.max_entries = max_entries
+        self.fresh_seconds = fresh_seconds
+        self.max_age_seconds = max_age_seconds
+        self._memory: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._flight = SingleFlight()
+        self._refreshes: set[asyncio.Task] = set()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stale_refreshes = 0
+
+    def _remember(self, key: str, stored_at: float, value: Any) -> None:
+        self._memory[key] = (stored_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def lookup(self, key: str) -> tuple[Any, bool] | None:
+        """Return ``(value, is_stale)`` from memory or disk, or ``None`` on a miss."""
+        entry = self._memory.get(key)
+        in_memory = entry is not None
+        if not in_memory:
+            # Disk reads run in a worker thread so a slow disk doesn't stall the event loop.
+            entry = await asyncio.to_thread(self.store.get, self.namespace, key)
+            if entry is None:
+                self.misses += 1
+                return None
+        stored_at, value = entry
+        age = time.time() - stored_at
+        if age > self.max_age_seconds:
+            self.misses += 1
+            if in_memory:
+                del self._memory[key]
+            await asyncio.to_thread(self.store.delete, self.namespace, key, stored_at)
+            return None
+        if in_memory:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+        else:
+            self._remember(key, stored_at, value)
+            self.disk_hits += 1
+        return value, age > self.fresh_seconds
+
+    async def set(self, key: str, value: Any) -> None:
+        stored_at = time.time()
+        self._remember(key, stored_at, value)
+        await asyncio.to_thread(self.store.set, self.namespace, key, value, stored_at)
+
+    async def _load_and_store(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        value = await loader()
+        if value is not None:
+            await self.set(key, value)
+        return value
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Serve from cache, loading on a miss; ``None`` results from ``loader`` aren't stored."""
+        hit = await self.lookup(key)
+        if hit is not None:
+            value, stale = hit
+            if stale:
+                self.stale_refreshes += 1
+                task = asyncio.ensure_future(self._flight.do(key, lambda: self._load_and_store(key, loader)))
+                # The loop only keeps a weak reference to tasks, so hold on to it until it is done.
+                self._refreshes.add(task)
+                task.add_done_callback(self._refreshes.discard)
+                # Background refresh failures just leave the stale value in place.
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            return value
+        return await self._flight.do(key, lambda: self._load_and_store(key, loader))
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "memory_size": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "stale_refreshes": self.stale_refreshes,
+        }
@@ -0,0 +1,332 @@
+"""Byte-level key/value stores behind ``SharedCache``.
+
+``MemoryBackend`` is a per-process LRU. ``SqliteBackend`` is one local file
+that every worker process on the node opens. ``RedisBackend`` talks the Redis
+protocol (RESP) to a server shared by the node or the fleet. All three offer
+the same coroutines, so ``SharedCache`` does not care which one it has, and
+none of them blocks the event loop:
+
+- ``get_many(keys)`` - values in key order, ``None`` for missing or expired
+- ``set(key, value, ttl_seconds)``
+- ``delete(key)``
+- ``incr(key)`` - a counter that never expires (used for invalidation generations)
+- ``close()``
+- ``stats()`` - plain counters, not a coroutine
+
+``CACHE_BACKEND`` picks one; see ``cache_backend``.
+"""
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+from urllib.parse import unquote, urlsplit
+
+from app.core.config import settings
+
+
+class CacheBackendError(Exception):
+    """An error reply from a cache server."""
+
+
+class MemoryBackend:
+    """Bounded in-process LRU; counters are kept apart so eviction never resets them."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    async def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        now = time.monotonic()
+        values: List[Optional[bytes]] = []
+        with self._lock:
+            for key in keys:
+                counter = self._counters.get(key)
+                if counter is not None:
+                    values.append(str(counter).encode())
+                    continue
+                entry = self._entries.get(key)
+                if entry is None:
+                    values.append(None)
+                elif entry[0] <= now:
+                    del self._entries[key]
+                    values.append(None)
+                else:
+                    self._entries.move_to_end(key)
+                    values.append(entry[1])
+        return values
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    async def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    async def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "evictions": self.evictions}
+
+    async def close(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+
+
+class SqliteBackend:
+    """One WAL-mode SQLite file shared by every worker process on the node.
+
+    Expired rows are skipped on read and purged every ``PURGE_EVERY`` writes.
+    Each operation runs in a worker thread, so a busy or slow disk never
+    stalls the event loop; one lock serializes use of the connection.
+    """
+
+    name = "sqlite"
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str, prefix: str = "") -> None:
+        self.path = path
+        self.prefix = prefix
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_kv ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL) WITHOUT ROWID"
+            )
+            self._conn = conn
+        return self._conn
+
+    async def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        return await asyncio.to_thread(self._get_many, keys)
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        await asyncio.to_thread(self._set, key, value, ttl_seconds)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._delete, key)
+
+    async def incr(self, key: str) -> int:
+        return await asyncio.to_thread(self._incr, key)
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self._close)
+
+    def _get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        prefixed = [self.prefix + key for key in keys]
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT key, value FROM cache_kv WHERE key IN ({','.join('?' * len(prefixed))})"
+                " AND (expires_at IS NULL OR expires_at > ?)",
+                (*prefixed, time.time()),
+            ).fetchall()
+        found = {key: value if isinstance(value, bytes) else str(value).encode() for key, value in rows}
+        return [found.get(key) for key in prefixed]
+
+    def _set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache_kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (self.prefix + key, value, now + ttl_seconds),
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self.conn.execute("DELETE FROM cache_kv WHERE expires_at <= ?", (now,))
+
+    def _delete(self, key: str) -> None:
+        with self._lock:
+            self.conn.execute("DELETE FROM cache_kv WHERE key = ?", (self.prefix + key,))
+
+    def _incr(self, key: str) -> int:
+        with self._lock:
+            return self.conn.execute(
+                "INSERT INTO cache_kv (key, value, expires_at) VALUES (?, 1, NULL)"
+                " ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1 RETURNING value",
+                (self.prefix + key,),
+            ).fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        return {}
+
+    def _close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class RedisBackend:
+    """Minimal asyncio RESP client for ``redis://`` or ``unix://`` URLs.
+
+    One connection per process, opened on first use and reopened after a
+    network error; commands take turns on it under an ``asyncio.Lock``. For
+    ``RECONNECT_BACKOFF_SECONDS`` after an error, calls fail at once, so an
+    unreachable server does not add a timeout to every request. Only
+    ``MGET``, ``SET ... PX``, ``DEL`` and ``INCR`` are sent, so any
+    Redis-protocol server (Redis, Valkey, KeyDB, ...) works.
+    """
+
+    name = "redis"
+    RECONNECT_BACKOFF_SECONDS = 1.0
+
+    def __init__(self, url: str, prefix: str = "", timeout_seconds: float = 1.0) -> None:
+        self.url = url
+        self.prefix = prefix
+        self.timeout_seconds = timeout_seconds
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._lock: asyncio.Lock | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._down_until = 0.0
+        self.connects = 0
+
+    async def _connect(self) -> None:
+        parts = urlsplit(self.url)
+        if parts.scheme == "unix":
+            self._reader, self._writer = await asyncio.open_unix_connection(unquote(parts.path))
+        else:
+            # asyncio sets TCP_NODELAY on its TCP streams.
+            self._reader, self._writer = await asyncio.open_connection(
+                parts.hostname or "127.0.0.1", parts.port or 6379
+            )
+        self.connects += 1
+        if parts.password:
+            auth = [unquote(parts.username), unquote(parts.password)] if parts.username else [unquote(parts.password)]
+            await self._roundtrip("AUTH", *auth)
+        database = parts.path.strip("/") if parts.scheme != "unix" else ""
+        if database and database != "0":
+            await self._roundtrip("SELECT", database)
+
+    def _disconnect(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def _read_reply(self):
+        line = await self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("connection closed by cache server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload
+        if kind == b"-":
+            raise CacheBackendError(payload.decode(errors="replace"))
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            return (await self._reader.readexactly(length + 2))[:-2]
+        if kind == b"*":
+            length = int(payload)
+            return None if length < 0 else [await self._read_reply() for _ in range(length)]
+        raise CacheBackendError(f"unexpected reply {line[:20]!r}")
+
+    async def _roundtrip(self, *args):
+        chunks = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            chunks.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self._writer.write(b"".join(chunks))
+        await self._writer.drain()
+        return await self._read_reply()
+
+    async def _command(self, *args):
+        if self._reader is None:
+            if time.monotonic() < self._down_until:
+                raise ConnectionError("cache server unavailable")
+            await self._connect()
+        return await self._roundtrip(*args)
+
+    async def command(self, *args):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Streams and the lock belong to the loop that created them.
+            self._reader = self._writer = None
+            self._lock, self._loop = asyncio.Lock(), loop
+        async with self._lock:
+            try:
+                return await asyncio.wait_for(self._command(*args), self.timeout_seconds)
+            except asyncio.CancelledError:
+                # Cut off mid-reply: the next command would read this one's answer.
+                self._disconnect()
+                raise
+            except (OSError, ValueError, EOFError, asyncio.TimeoutError) as exc:
+                # The stream position is unknown now; start over after the backoff.
+                self._disconnect()
+                self._down_until = time.monotonic() + self.RECONNECT_BACKOFF_SECONDS
+                if isinstance(exc, OSError):
+                    raise
+                raise ConnectionError(f"cache server connection failed: {exc!r}") from exc
+
+    async def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        return await self.command("MGET", *(self.prefix + key for key in keys))
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        await self.command("SET", self.prefix + key, value, "PX", max(1, int(ttl_seconds * 1000)))
+
+    async def delete(self, key: str) -> None:
+        await self.command("DEL", self.prefix + key)
+
+    async def incr(self, key: str) -> int:
+        return await self.command("INCR", self.prefix + key)
+
+    def stats(self) -> Dict[str, int]:
+        return {"connects": self.connects}
+
+    async def close(self) -> None:
+        self._disconnect()
+
+
+_shared_backends: Dict[str, SqliteBackend | RedisBackend] = {}
+
+
+def cache_backend(max_entries: int) -> MemoryBackend | SqliteBackend | RedisBackend:
+    """The backend selected by ``CACHE_BACKEND``.
+
+    ``memory`` gives each cache its own LRU of ``max_entries``. ``sqlite``
+    and ``redis`` return one backend per process shared by every cache; they
+    are bounded by entry TTLs instead of a count.
+    """
+    kind = settings.cache_backend
+    if kind == "memory":
+        return MemoryBackend(max_entries)
+    if kind not in _shared_backends:
+        if kind == "sqlite":
+            _shared_backends[kind] = SqliteBackend(settings.cache_sqlite_path, settings.cache_key_prefix)
+        elif kind == "redis":
+            _shared_backends[kind] = RedisBackend(
+                settings.cache_redis_url, settings.cache_key_prefix, settings.cache_redis_timeout_seconds
+            )
+        else:
+            raise ValueError(f"CACHE_BACKEND must be memory, sqlite or redis, not {kind!r}")
+    return _shared_backends[kind]
+
+
+async def close_cache_backends() -> None:
+    for backend in _shared_backends.values():
+        await backend.close()
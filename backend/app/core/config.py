@@ -5,6 +5,18 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 class Settings(BaseSettings):
     app_name: str = "HappyTummy"
     database_url: str = Field(default="sqlite:///./app.db", validation_alias=AliasChoices("database_url", "DATABASE_URL"))
+    database_read_url: str | None = None
+    database_read_engine_enabled: bool = False
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_recycle_seconds: int = 1800
+    db_pool_pre_ping: bool = True
+    db_auto_migrate: bool = True
+    db_migration_lock_timeout_seconds: float = 60.0
+    sqlite_tuning_enabled: bool = True
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_mmap_size_bytes: int = 256 * 1024 * 1024
+    sqlite_cache_size_kib: int = 64 * 1024
     cors_origins: str = Field(
         default="http://localhost:8081,http://127.0.0.1:8081,http://localhost:19006,http://127.0.0.1:19006",
         validation_alias=AliasChoices("cors_origins", "CORS_ORIGINS"),
@@ -12,9 +24,73 @@ class Settings(BaseSettings):
     jwt_secret_key: str = "change-this-in-production"
     jwt_algorithm: str = "HS256"
     access_token_expire_minutes: int = 60
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 4
+    password_hash_queue_depth: int = 32
+    cache_backend: str = "memory"
+    cache_sqlite_path: str = "./shared_cache.db"
+    cache_redis_url: str = "redis://127.0.0.1:6379/0"
+    cache_redis_timeout_seconds: float = 0.5
+    cache_key_prefix: str = "happytummy:"
+    auth_cache_enabled: bool = True
+    auth_cache_max_entries: int = 10000
+    auth_cache_ttl_seconds: float = 300.0
     featherless_api_key: str | None = Field(default=None, validation_alias=AliasChoices("featherless_api_key", "FEATHERLESS_API_KEY"))
     featherless_model: str | None = Field(default=None, validation_alias=AliasChoices("featherless_model", "FEATHERLESS_MODEL"))
     spoonacular_key: str | None = Field(default=None, validation_alias=AliasChoices("spoonacular_key", "SPOONACULAR_KEY"))
+    featherless_fallback_models: str = ""
+    featherless_base_url: str = "https://api.featherless.ai/v1"
+    spoonacular_base_url: str = "https://api.spoonacular.com"
+    http2_enabled: bool = True
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry_seconds: float = 30.0
+    http_connect_timeout_seconds: float = 5.0
+    featherless_timeout_seconds: float = 30.0
+    spoonacular_timeout_seconds: float = 8.0
+    spoonacular_detail_timeout_seconds: float = 4.0
+    llm_max_in_flight: int = 8
+    llm_max_queue: int = 200
+    llm_queue_timeout_seconds: float = 20.0
+    llm_max_retries: int = 3
+    llm_backoff_base_seconds: float = 0.5
+    llm_backoff_max_seconds: float = 8.0
+    llm_circuit_failure_threshold: int = 5
+    llm_circuit_reset_seconds: float = 30.0
+    llm_hedging_enabled: bool = True
+    llm_hedge_percentile: float = 95.0
+    llm_hedge_min_delay_seconds: float = 2.0
+    llm_hedge_initial_delay_seconds: float = 10.0
+    llm_hedge_window: int = 200
+    chat_history_token_budget: int = 1200
+    chat_logs_token_budget: int = 400
+    chat_summary_max_tokens: int = 200
+    child_context_cache_max_entries: int = 4096
+    child_context_cache_ttl_seconds: float = 60.0
+    child_context_log_limit: int = 50
+    coach_cache_enabled: bool = True
+    coach_precompute_hour_utc: int = 3
+    coach_precompute_active_days: int = 7
+    coach_precompute_max_age_seconds: float = 36 * 60 * 60
+    coach_cache_max_entries: int = 1024
+    coach_cache_ttl_seconds: float = 6 * 60 * 60
+    jobs_worker_enabled: bool = True
+    jobs_concurrency: int = 4
+    jobs_poll_seconds: float = 2.0
+    jobs_lease_seconds: float = 600.0
+    jobs_max_attempts: int = 5
+    jobs_retry_base_seconds: float = 30.0
+    jobs_retention_days: int = 14
+    export_batch_rows: int = 1000
+    local_food_search_enabled: bool = True
+    log_batch_max_entries: int = 5000
+    metrics_enabled: bool = True
+    recommendation_top_k: int = 3
+    recommendation_window_days: int = 7
+    nutrition_cache_path: str = "./nutrition_cache.db"
+    nutrition_cache_memory_entries: int = 4096
+    nutrition_cache_fresh_seconds: float = 7 * 24 * 60 * 60
+    nutrition_cache_max_age_seconds: float = 90 * 24 * 60 * 60
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
 
@@ -22,4 +98,8 @@ class Settings(BaseSettings):
         items = [item.strip() for item in self.cors_origins.split(",")]
         return [item for item in items if item]
 
+    def get_featherless_fallback_models(self) -> list[str]:
+        items = [item.strip() for item in self.featherless_fallback_models.split(",")]
+        return [item for item in items if item]
+
 settings = Settings()
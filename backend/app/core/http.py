@@ -0,0 +1,48 @@
+"""Process-wide pooled HTTP clients for the upstream AI services."""
+import httpx
+
+from app.core.config import settings
+
+_clients: dict[str, httpx.AsyncClient] = {}
+
+
+def _build_client(base_url: str, timeout: float) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=base_url,
+        http2=settings.http2_enabled,
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry_seconds,
+        ),
+        timeout=httpx.Timeout(timeout, connect=settings.http_connect_timeout_seconds),
+    )
+
+
+def _get_client(name: str, base_url: str, timeout: float) -> httpx.AsyncClient:
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        # Normally opened by the app lifespan; created lazily if a route runs without it.
+        client = _build_client(base_url, timeout)
+        _clients[name] = client
+    return client
+
+
+def get_featherless_client() -> httpx.AsyncClient:
+    return _get_client("featherless", settings.featherless_base_url, settings.featherless_timeout_seconds)
+
+
+def get_spoonacular_client() -> httpx.AsyncClient:
+    return _get_client("spoonacular", settings.spoonacular_base_url, settings.spoonacular_timeout_seconds)
+
+
+def open_http_clients() -> None:
+    get_featherless_client()
+    get_spoonacular_client()
+
+
+async def close_http_clients() -> None:
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
@@ -0,0 +1,289 @@
+"""In-process metrics exposed in the Prometheus text format at ``/metrics``.
+
+Counters, gauges and histograms are plain dicts behind a lock, so recording a
+sample costs a few dict operations and nothing leaves the process until
+Prometheus (or ``curl``) scrapes the endpoint.
+"""
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from sqlalchemy import Engine, event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels: Mapping[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        header = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n"
+        return header + "".join(line + "\n" for line in self.samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts (+Inf last), sum]
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            state[0][index] += 1
+            state[1][0] += value
+
+    def count(self, **labels: Any) -> int:
+        state = self._values.get(self._key(labels))
+        return sum(state[0]) if state else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        return "".join(metric.render() for metric in self._metrics.values())
+
+
+registry = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+http_requests = Counter("http_requests_total", "HTTP responses by route and status.", ("method", "route", "status"))
+http_duration = Histogram("http_request_duration_seconds", "Time to send the full response.", ("method", "route"))
+http_in_flight = Gauge("http_requests_in_flight", "Requests currently being served.")
+db_queries = Counter("db_queries_total", "SQL statements executed.")
+db_duration = Histogram("db_query_duration_seconds", "Time per SQL statement.")
+request_db_queries = Histogram(
+    "http_request_db_queries", "SQL statements per request.", ("route",), buckets=COUNT_BUCKETS
+)
+request_db_duration = Histogram("http_request_db_seconds", "Total SQL time per request.", ("route",))
+upstream_requests = Counter(
+    "upstream_requests_total", "Calls to external APIs by HTTP status ('error' for transport failures).",
+    ("upstream", "operation", "status"),
+)
+upstream_duration = Histogram(
+    "upstream_request_duration_seconds", "External API latency per attempt (to the response head for streams).", ("upstream", "operation")
+)
+llm_completions = Counter(
+    "llm_completions_total", "LLM answers by the model and path (primary, hedge, fallback) that produced them.",
+    ("model", "path"),
+)
+llm_tokens = Counter("llm_tokens_total", "Tokens reported in upstream LLM usage blocks.", ("model", "kind"))
+
+
+@dataclass(slots=True)
+class RequestDbStats:
+    queries: int = 0
+    seconds: float = 0.0
+
+
+_request_db: ContextVar[Optional[RequestDbStats]] = ContextVar("request_db", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    starts = conn.info.get("metrics_query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    db_queries.inc()
+    db_duration.observe(elapsed)
+    stats = _request_db.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.seconds += elapsed
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context) -> None:
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("metrics_query_start"):
+        connection.info["metrics_query_start"].pop()
+
+
+class UpstreamCall:
+    """Times one external API call; set ``status`` to the HTTP status once known."""
+
+    __slots__ = ("upstream", "operation", "status", "_start")
+
+    def __init__(self, upstream: str, operation: str) -> None:
+        self.upstream = upstream
+        self.operation = operation
+        self.status: Optional[int] = None
+
+    def __enter__(self) -> "UpstreamCall":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        upstream_duration.observe(time.perf_counter() - self._start, upstream=self.upstream, operation=self.operation)
+        status = self.status if self.status is not None else "error"
+        upstream_requests.inc(upstream=self.upstream, operation=self.operation, status=status)
+
+
+def record_token_usage(model: Optional[str], usage: Optional[Mapping[str, Any]]) -> None:
+    if not usage:
+        return
+    for kind in ("prompt", "completion"):
+        tokens = usage.get(f"{kind}_tokens")
+        if isinstance(tokens, int):
+            llm_tokens.inc(tokens, model=model or "unknown", kind=kind)
+
+
+def route_template(scope) -> str:
+    """Matched path template, e.g. ``/api/children/{child_id}/rollups``."""
+    template = getattr(scope.get("route"), "path", None)
+    if template is None:
+        return "unmatched"
+    # Older FastAPI copies included routes with the prefix already in ``path``.
+    # Newer releases match the original route and record the include, with
+    # its (combined) prefix, in ``scope["fastapi"]``.
+    included = scope.get("fastapi", {}).get("included_router")
+    return getattr(getattr(included, "include_context", None), "prefix", "") + template
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: per-route latency/status plus per-request DB usage.
+
+    The route label is the matched path template (``/api/children/{child_id}/rollups``),
+    so cardinality stays bounded; unmatched paths share ``route="unmatched"``.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        stats = RequestDbStats()
+        token = _request_db.set(stats)
+
+        async def send_wrapper(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_in_flight.dec()
+            _request_db.reset(token)
+            route = route_template(scope)
+            method = scope["method"]
+            http_requests.inc(method=method, route=route, status=status)
+            http_duration.observe(elapsed, method=method, route=route)
+            request_db_queries.observe(stats.queries, route=route)
+            request_db_duration.observe(stats.seconds, route=route)
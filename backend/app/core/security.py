@@ -1,8 +1,17 @@
+import asyncio
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from typing import Any, Callable
 
 import bcrypt
-from jose import jwt
+from jose import JWTError, jwt
 
+from app.core.cache import SharedCache
+from app.core.cache_backends import cache_backend
 from app.core.config import settings
 
 
@@ -11,11 +20,165 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 
 def get_password_hash(password: str) -> str:
-    hashed = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
+    hashed = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=settings.bcrypt_rounds))
     return hashed.decode("utf-8")
 
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True when a stored ``$2b$<cost>$...`` hash uses a different cost than configured."""
+    try:
+        return int(hashed_password.split("$")[2]) != settings.bcrypt_rounds
+    except (IndexError, ValueError):
+        return False
+
+
+class PasswordHasherBusy(Exception):
+    """Raised instead of queueing when the bcrypt pool is saturated."""
+
+
+# bcrypt releases the GIL, so a dedicated thread pool keeps hashing off FastAPI's
+# shared threadpool. The semaphore caps running + queued jobs so bursts are shed.
+_hash_executor: ThreadPoolExecutor | None = None
+_hash_slots = threading.BoundedSemaphore(settings.password_hash_workers + settings.password_hash_queue_depth)
+
+
+async def _run_in_hash_pool(fn: Callable[..., Any], *args: Any) -> Any:
+    global _hash_executor
+    if not _hash_slots.acquire(blocking=False):
+        raise PasswordHasherBusy()
+    try:
+        if _hash_executor is None:
+            _hash_executor = ThreadPoolExecutor(
+                max_workers=settings.password_hash_workers, thread_name_prefix="bcrypt"
+            )
+        future = _hash_executor.submit(fn, *args)
+    except BaseException:
+        _hash_slots.release()
+        raise
+    future.add_done_callback(lambda _done: _hash_slots.release())
+    return await asyncio.wrap_future(future)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_in_hash_pool(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_in_hash_pool(get_password_hash, password)
+
+
+def shutdown_password_hasher() -> None:
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False, cancel_futures=True)
+        _hash_executor = None
+
+
 def create_access_token(subject: str) -> str:
     expire = datetime.now(timezone.utc) + timedelta(minutes=settings.access_token_expire_minutes)
     payload = {"sub": subject, "exp": expire}
     return jwt.encode(payload, settings.jwt_secret_key, algorithm=settings.jwt_algorithm)
+
+
+@dataclass(frozen=True, slots=True)
+class UserPrincipal:
+    """The authenticated user as seen by route handlers, detached from any DB session."""
+
+    id: int
+    first_name: str
+    username: str
+
+
+class PrincipalCache:
+    """Map of verified access token -> ``UserPrincipal`` in the shared cache.
+
+    Entries are keyed by a hash of the token, so raw tokens never reach a
+    shared backend, and scoped by the token's username so one user's tokens
+    can be revoked together. Entries never outlive the token's own ``exp``
+    claim.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float) -> None:
+        self._cache = SharedCache(
+            "auth",
+            cache_backend(max_entries),
+            ttl_seconds,
+            encode=lambda p: (p.id, p.first_name, p.username),
+            decode=lambda fields: UserPrincipal(*fields),
+        )
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    async def lookup(self, token: str) -> tuple[UserPrincipal | None, tuple[int, ...] | None]:
+        """``(principal, generation)``; pass ``generation`` to ``set`` after verifying a miss."""
+        try:
+            # Only picks the scope: a hit still needs the exact token that was verified.
+            username = jwt.get_unverified_claims(token).get("sub")
+        except JWTError:
+            return None, None
+        if not isinstance(username, str):
+            return None, None
+        return await self._cache.lookup(self._key(token), scope=username)
+
+    async def set(
+        self, token: str, principal: UserPrincipal, expires_at: float, generation: tuple[int, ...] | None
+    ) -> None:
+        # Without the generation read before verifying, a revocation that landed
+        # in between could not be told apart, so the principal is not cached.
+        if generation is None:
+            return
+        await self._cache.set(
+            self._key(token),
+            principal,
+            ttl_seconds=expires_at - time.time(),
+            scope=principal.username,
+            generation=generation,
+        )
+
+    async def invalidate_user(self, username: str) -> None:
+        await self._cache.invalidate(scope=username)
+
+    async def clear(self) -> None:
+        await self._cache.clear()
+
+    def stats(self) -> dict[str, Any]:
+        return self._cache.stats()
+
+
+principal_cache = PrincipalCache(settings.auth_cache_max_entries, settings.auth_cache_ttl_seconds)
+_invalidations: set[asyncio.Task] = set()
+_app_loop: asyncio.AbstractEventLoop | None = None
+
+
+def bind_app_loop(loop: asyncio.AbstractEventLoop) -> None:
+    """Record the loop serving requests; off-loop invalidations are handed to it."""
+    global _app_loop
+    _app_loop = loop
+
+
+def invalidate_user_principals(username: str) -> None:
+    """Drop cached principals for a user in every worker; call after a password or username change.
+
+    Callable from sync code such as ORM events. On the app loop the
+    invalidation is scheduled as a task. From another thread (a sync session
+    in a threadpool route, say) it is handed to the app loop and waited for,
+    since a second loop would take over the shared cache connections. Only a
+    process with no app loop, such as a script, runs it on a loop of its own.
+    """
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    app_loop = _app_loop if _app_loop is not None and _app_loop.is_running() else None
+    if running is not None and (app_loop is None or running is app_loop):
+        task = running.create_task(principal_cache.invalidate_user(username))
+        _invalidations.add(task)
+        task.add_done_callback(_invalidations.discard)
+    elif app_loop is not None:
+        future = asyncio.run_coroutine_threadsafe(principal_cache.invalidate_user(username), app_loop)
+        if running is None:
+            future.result()
+    else:
+        asyncio.run(principal_cache.invalidate_user(username))
@@ -0,0 +1,329 @@
+"""Admission control for rate-limited upstream APIs.
+
+``UpstreamScheduler`` caps concurrent requests to one upstream and admits
+waiters by priority (interactive before background). It retries 429/5xx and
+transport errors with jittered exponential backoff, honouring ``Retry-After``.
+A ``CircuitBreaker`` fails fast while the upstream keeps failing.
+``hedged`` races a backup call against a slow primary.
+"""
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from enum import IntEnum
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+import httpx
+
+from app.core.metrics import Counter, Gauge, Histogram
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+queue_depth = Gauge("upstream_queue_depth", "Requests waiting for an upstream slot.", ("upstream", "priority"))
+queue_wait = Histogram("upstream_queue_wait_seconds", "Time spent waiting for an upstream slot.", ("upstream", "priority"))
+in_flight = Gauge("upstream_in_flight", "Requests holding an upstream slot.", ("upstream",))
+retries = Counter("upstream_retries_total", "Upstream attempts that were retried.", ("upstream", "reason"))
+rejected = Counter("upstream_rejected_total", "Requests refused without calling the upstream.", ("upstream", "reason"))
+hedges = Counter("upstream_hedges_total", "Backup calls started because the primary was slow.", ("upstream",))
+circuit_state = Gauge("upstream_circuit_state", "0 closed, 1 half-open, 2 open.", ("upstream",))
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+class UpstreamUnavailable(Exception):
+    """Raised instead of calling the upstream: queue full, queue timeout or circuit open."""
+
+    def __init__(self, reason: str, retry_after: float) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a ``Retry-After`` header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failed requests; one probe is let through after ``reset_seconds``."""
+
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def _set_state(self, state: int) -> None:
+        self.state = state
+        circuit_state.set(state, upstream=self.name)
+
+    def before_call(self) -> None:
+        if self.state == self.OPEN:
+            remaining = self.opened_at + self.reset_seconds - time.monotonic()
+            if remaining > 0:
+                raise UpstreamUnavailable("circuit_open", remaining)
+            self._set_state(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                raise UpstreamUnavailable("circuit_open", self.reset_seconds)
+            self._probing = True
+
+    def end_call(self) -> None:
+        """Free the half-open probe if the call ended without an outcome (e.g. cancelled)."""
+        self._probing = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._probing = False
+        if self.state != self.CLOSED:
+            self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set_state(self.OPEN)
+
+
+class UpstreamScheduler:
+    def __init__(
+        self,
+        name: str,
+        max_in_flight: int,
+        max_queue: int,
+        queue_timeout_seconds: float,
+        max_retries: int,
+        backoff_base_seconds: float,
+        backoff_max_seconds: float,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.breaker = breaker
+        self._in_flight = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._queued: Dict[Priority, int] = {priority: 0 for priority in Priority}
+        self._seq = itertools.count()
+
+    @property
+    def queued(self) -> int:
+        return sum(self._queued.values())
+
+    async def _acquire(self, priority: Priority) -> None:
+        start = time.perf_counter()
+        if self._in_flight < self.max_in_flight and not self.queued:
+            self._in_flight += 1
+        else:
+            if self.queued >= self.max_queue:
+                rejected.inc(upstream=self.name, reason="queue_full")
+                raise UpstreamUnavailable("queue_full", self.backoff_base_seconds)
+            waiter = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._seq), waiter))
+            self._queued[priority] += 1
+            queue_depth.set(self._queued[priority], upstream=self.name, priority=priority.name.lower())
+            try:
+                # The slot is handed over by _release(), which resolves the future.
+                await asyncio.wait_for(waiter, self.queue_timeout_seconds)
+            except asyncio.TimeoutError:
+                # wait_for can time out just after _release() handed this waiter the slot.
+                if waiter.done() and not waiter.cancelled():
+                    self._release()
+                rejected.inc(upstream=self.name, reason="queue_timeout")
+                raise UpstreamUnavailable("queue_timeout", self.backoff_base_seconds) from None
+            except BaseException:
+                if waiter.done() and not waiter.cancelled():
+                    self._release()
+                raise
+            finally:
+                self._queued[priority] -= 1
+                queue_depth.set(self._queued[priority], upstream=self.name, priority=priority.name.lower())
+        queue_wait.observe(time.perf_counter() - start, upstream=self.name, priority=priority.name.lower())
+        in_flight.set(self._in_flight, upstream=self.name)
+
+    def _release(self) -> None:
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._in_flight -= 1
+        in_flight.set(self._in_flight, upstream=self.name)
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        delay = random.uniform(0, min(self.backoff_max_seconds, self.backoff_base_seconds * 2**attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max_seconds))
+        return delay
+
+    @asynccontextmanager
+    async def request(
+        self,
+        send: Callable[[], Awaitable[httpx.Response]],
+        priority: Priority = Priority.INTERACTIVE,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> AsyncIterator[httpx.Response]:
+        """Hold a slot while ``send`` is attempted (with retries) and the response is used.
+
+        Yields the last response, retryable or not, so the caller keeps its own
+        error handling. Transport errors are re-raised once retries run out.
+        Streamed responses are closed when the block exits. ``breaker`` overrides
+        the scheduler's own, e.g. to track several models behind one slot pool;
+        one of the two is required.
+
+        The breaker gets one outcome per request, from its final attempt, so
+        retries don't count one slow recovery several times. A final 429 means
+        the upstream is rate limiting rather than failing and records nothing.
+        """
+        breaker = breaker or self.breaker
+        if breaker is None:
+            raise ValueError(f"no circuit breaker for a {self.name} request")
+        try:
+            breaker.before_call()
+        except UpstreamUnavailable:
+            rejected.inc(upstream=self.name, reason="circuit_open")
+            raise
+        try:
+            await self._acquire(priority)
+        except BaseException:
+            breaker.end_call()
+            raise
+        response: Optional[httpx.Response] = None
+        try:
+            for attempt in range(self.max_retries + 1):
+                last_attempt = attempt == self.max_retries
+                try:
+                    response = await send()
+                except httpx.RequestError:
+                    if last_attempt:
+                        breaker.record_failure()
+                        raise
+                    retries.inc(upstream=self.name, reason="transport")
+                    await asyncio.sleep(self._backoff(attempt, None))
+                    continue
+                if response.status_code not in RETRYABLE_STATUS or last_attempt:
+                    break
+                retries.inc(upstream=self.name, reason=str(response.status_code))
+                await response.aclose()
+                await asyncio.sleep(self._backoff(attempt, parse_retry_after(response.headers.get("Retry-After"))))
+            if response.status_code not in RETRYABLE_STATUS:
+                breaker.record_success()
+            elif response.status_code != 429:
+                breaker.record_failure()
+            yield response
+        finally:
+            if response is not None:
+                await response.aclose()
+            self._release()
+            breaker.end_call()
+
+
+class LatencyTracker:
+    """Rolling window of call latencies; ``delay()`` is the hedge threshold."""
+
+    MIN_SAMPLES = 20
+
+    def __init__(self, window: int, percentile: float, min_delay: float, initial_delay: float) -> None:
+        self.samples: deque[float] = deque(maxlen=window)
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.initial_delay = initial_delay
+
+    def observe(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def delay(self) -> float:
+        if len(self.samples) < self.MIN_SAMPLES:
+            return self.initial_delay
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return max(self.min_delay, ordered[index])
+
+
+async def hedged(
+    name: str,
+    primary: Callable[[], Awaitable[T]],
+    backup: Callable[[], Awaitable[T]],
+    delay: Optional[float],
+    tracker: Optional[LatencyTracker] = None,
+    fallback_on: Callable[[BaseException], bool] = lambda exc: True,
+) -> Tuple[T, str]:
+    """Run ``primary``; start ``backup`` if it is still running after ``delay``
+    seconds (``None`` never hedges) or as soon as it fails with an error
+    ``fallback_on`` accepts, and return the first success.
+
+    Returns ``(result, path)`` where ``path`` is ``"primary"``, ``"hedge"``
+    (backup won the race) or ``"fallback"`` (primary failed). The losing call
+    is cancelled. If both fail, the primary's exception is raised, with the
+    backup's as its context when the backup failed last.
+    ``tracker`` records the primary's latency. When the primary loses, the
+    time it had been running is recorded, so the threshold cannot shrink
+    just because slow calls were cut short.
+    """
+    start = time.perf_counter()
+    first = asyncio.ensure_future(primary())
+    second: Optional[asyncio.Future] = None
+    try:
+        await asyncio.wait({first}, timeout=delay)
+        if first.done() and first.exception() is None:
+            if tracker is not None:
+                tracker.observe(time.perf_counter() - start)
+            return first.result(), "primary"
+        if first.done():
+            if not fallback_on(first.exception()):
+                raise first.exception()
+            try:
+                return await backup(), "fallback"
+            except Exception:
+                raise first.exception()
+        hedges.inc(upstream=name)
+        second = asyncio.ensure_future(backup())
+        pending = {first, second}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is first:
+                        if tracker is not None:
+                            tracker.observe(time.perf_counter() - start)
+                        return task.result(), "primary"
+                    if tracker is not None and not first.done():
+                        tracker.observe(time.perf_counter() - start)
+                    return task.result(), "hedge" if not first.done() else "fallback"
+        raise first.exception()
+    finally:
+        for task in (first, second):
+            if task is not None and not task.done():
+                task.cancel()
@@ -0,0 +1,508 @@
+"""Versioned schema migrations.
+
+Applied versions are recorded in ``schema_version``. ``upgrade`` applies the
+pending ones in order while holding a cross-process lock, so only one worker
+or deploy step ever runs DDL. App startup only compares the recorded version
+with ``LATEST_VERSION``.
+
+    python -m app.db.migrations upgrade | current | history
+
+Migrations must be safe on databases created by the old import-time
+``create_all``: check for a column or index before adding it.
+
+Tables are defined inside this module as they were when their step
+shipped, never taken from ``app.models``, so editing a model can't change
+what an old step creates. A model change needs a new step.
+"""
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Iterator, List
+
+from sqlalchemy import (
+    JSON,
+    Boolean,
+    Column,
+    Connection,
+    Date,
+    DateTime,
+    Engine,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    MetaData,
+    SmallInteger,
+    String,
+    Table,
+    Text,
+    case,
+    cast,
+    column,
+    exc,
+    false,
+    func,
+    insert,
+    inspect,
+    literal,
+    null,
+    select,
+    table,
+    text,
+    union_all,
+)
+from sqlalchemy.engine import make_url
+from sqlalchemy.schema import CreateColumn
+
+from app.core.config import settings
+
+# Kept out of Base.metadata so model-level create_all never touches it.
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# Arbitrary constant key for pg_advisory_lock.
+POSTGRES_LOCK_KEY = 7_244_113_026
+
+
+@dataclass(frozen=True, slots=True)
+class Migration:
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, description: str):
+    def register(fn: Callable[[Connection], None]) -> Callable[[Connection], None]:
+        assert version == len(MIGRATIONS) + 1, "migration versions must be sequential"
+        MIGRATIONS.append(Migration(version, description, fn))
+        return fn
+
+    return register
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+def _has_column(connection: Connection, table: str, column: str) -> bool:
+    return column in {c["name"] for c in inspect(connection).get_columns(table)}
+
+
+def _has_index(connection: Connection, table: str, index: str) -> bool:
+    return index in {i["name"] for i in inspect(connection).get_indexes(table)}
+
+
+def _add_column(connection: Connection, table_name: str, new_column: Column) -> None:
+    """``ALTER TABLE ... ADD COLUMN`` with the type, default and foreign key rendered for the dialect."""
+    Table(table_name, MetaData(), new_column)
+    dialect = connection.dialect
+    ddl = f"ALTER TABLE {dialect.identifier_preparer.format_table(new_column.table)} ADD COLUMN "
+    ddl += str(CreateColumn(new_column).compile(dialect=dialect))
+    for foreign_key in new_column.foreign_keys:
+        target_table, target_column = foreign_key.target_fullname.split(".")
+        quote = dialect.identifier_preparer.quote
+        ddl += f" REFERENCES {quote(target_table)} ({quote(target_column)})"
+    connection.execute(text(ddl))
+
+
+def _create_index(connection: Connection, table_name: str, name: str, *columns: str, unique: bool = False) -> None:
+    # Only the column names matter to CREATE INDEX; the types are placeholders.
+    target = Table(table_name, MetaData(), *(Column(c, Integer) for c in columns))
+    Index(name, *(target.c[c] for c in columns), unique=unique).create(connection)
+
+
+# Frozen table definitions, one MetaData so foreign keys between them resolve.
+frozen = MetaData()
+
+
+def _dimension(name: str, prefix: str, id_column: str | None = None) -> Table:
+    return Table(
+        name,
+        frozen,
+        Column(f"{prefix}Key", Integer, primary_key=True, autoincrement=True),
+        Column(id_column or f"{prefix}ID", Integer, nullable=True),
+        Column(f"{prefix}Food", String(50), nullable=True),
+        Column(f"{prefix}Fiber", Integer, nullable=True),
+    )
+
+
+def _symptom_dimension(n: int) -> Table:
+    return Table(
+        f"DimSymptom{n}",
+        frozen,
+        Column(f"Symptom{n}Key", Integer, primary_key=True, autoincrement=True),
+        Column(f"Symptom{n}ID", Integer, nullable=True),
+        Column(f"WaterOz{n}", Integer, nullable=True),
+        Column(f"FruitIntake{n}", Integer, nullable=True),
+        Column(f"Stool{n}", Integer, nullable=True),
+    )
+
+
+# The schema of the original import-time create_all.
+BASELINE_TABLES = [
+    Table(
+        "users",
+        frozen,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("first_name", String(100), nullable=False),
+        Column("username", String(50), unique=True, index=True, nullable=False),
+        Column("hashed_password", String(255), nullable=False),
+    ),
+    _dimension("DimCarb", "Carb"),
+    _dimension("DimFruit", "Fruit"),
+    _dimension("DimMeat", "Meat"),
+    _dimension("DimMilk1", "Milk1"),
+    _dimension("DimMilk2", "Milk2", id_column="MILK2ID"),
+    _symptom_dimension(1),
+    _symptom_dimension(2),
+    Table(
+        "DimUser",
+        frozen,
+        Column("UserKey", Integer, primary_key=True, autoincrement=True),
+        Column("UseID", Integer, nullable=True),
+        Column("Name", String(50), nullable=True),
+        Column("Age", Integer, nullable=True),
+        Column("Gender", String(50), nullable=True),
+        Column("Weight", Integer, nullable=True),
+        Column("Allergies", Integer, nullable=True),
+        Column("EarlyBorn", Integer, nullable=True),
+        Column("DeliveryMethod", Integer, nullable=True),
+        Column("EnviChange", Integer, nullable=True),
+        Column("ParentConsent", Boolean, nullable=False),
+    ),
+    Table(
+        "ParentChild",
+        frozen,
+        Column("id", Integer, primary_key=True, autoincrement=True),
+        Column("parent_user_id", Integer, ForeignKey("users.id"), nullable=False),
+        Column("child_user_key", Integer, ForeignKey("DimUser.UserKey"), nullable=False),
+    ),
+    _dimension("DimVeg", "Veg"),
+    Table(
+        "FactSystem",
+        frozen,
+        Column("CarbKey", Integer, ForeignKey("DimCarb.CarbKey"), nullable=True),
+        Column("MeatKey", Integer, ForeignKey("DimMeat.MeatKey"), nullable=True),
+        Column("FruitKey", Integer, ForeignKey("DimFruit.FruitKey"), nullable=True),
+        Column("VegKey", Integer, ForeignKey("DimVeg.VegKey"), nullable=True),
+        Column("Milk1Key", Integer, ForeignKey("DimMilk1.Milk1Key"), nullable=True),
+        Column("Milk2Key", Integer, ForeignKey("DimMilk2.Milk2Key"), nullable=True),
+        Column("UserKey", Integer, ForeignKey("DimUser.UserKey"), nullable=True),
+        Column("Symptom1Key", Integer, ForeignKey("DimSymptom1.Symptom1Key"), nullable=True),
+        Column("Symptom2Key", Integer, ForeignKey("DimSymptom2.Symptom2Key"), nullable=True),
+        Column("QuantityCarb", Integer, nullable=True),
+        Column("QuantityMeat", Integer, nullable=True),
+        Column("QuantityFruit", Integer, nullable=True),
+        Column("QuantityVeg", Integer, nullable=True),
+        Column("QuantityMilk1", String(50), nullable=True),
+        Column("QuantityMilk2", String(50), nullable=True),
+    ),
+]
+
+
+@migration(1, "baseline schema")
+def _baseline(connection: Connection) -> None:
+    frozen.create_all(connection, tables=BASELINE_TABLES)
+
+
+@migration(2, "DimUser.ParentConsent")
+def _parent_consent(connection: Connection) -> None:
+    if not _has_column(connection, "DimUser", "ParentConsent"):
+        _add_column(connection, "DimUser", Column("ParentConsent", Boolean, nullable=False, server_default=false()))
+
+
+@migration(3, "FactSystem.EntryID/LoggedAt and per-child entry index")
+def _fact_entry_ids(connection: Connection) -> None:
+    if not _has_column(connection, "FactSystem", "EntryID"):
+        _add_column(connection, "FactSystem", Column("EntryID", String(64)))
+    if not _has_column(connection, "FactSystem", "LoggedAt"):
+        _add_column(connection, "FactSystem", Column("LoggedAt", DateTime))
+    if not _has_index(connection, "FactSystem", "ux_FactSystem_UserKey_EntryID"):
+        _create_index(connection, "FactSystem", "ux_FactSystem_UserKey_EntryID", "UserKey", "EntryID", unique=True)
+
+
+_child_daily_rollup_table = Table(
+    "ChildDailyRollup",
+    frozen,
+    Column("UserKey", Integer, ForeignKey("DimUser.UserKey"), primary_key=True),
+    Column("Day", Date, primary_key=True),
+    *(Column(name, Float, nullable=False) for name in ("CarbFiber", "MeatFiber", "FruitFiber", "VegFiber", "MilkFiber")),
+    *(Column(name, Integer, nullable=False) for name in ("WaterOz", "FruitIntake", "StoolTotal", "StoolCount", "EntryCount")),
+)
+
+
+@migration(4, "ChildDailyRollup")
+def _child_daily_rollup(connection: Connection) -> None:
+    _child_daily_rollup_table.create(connection, checkfirst=True)
+
+
+_chat_session_table = Table(
+    "ChatSession",
+    frozen,
+    Column("SessionID", String(32), primary_key=True),
+    Column("UserID", Integer, ForeignKey("users.id"), nullable=False, index=True),
+    Column("Baby", JSON, nullable=True),
+    Column("RecentLogs", JSON, nullable=True),
+    Column("Summary", Text, nullable=True),
+    Column("SummarizedThrough", Integer, nullable=False),
+    Column("CreatedAt", DateTime, nullable=False),
+    Column("UpdatedAt", DateTime, nullable=False),
+)
+_chat_message_table = Table(
+    "ChatMessage",
+    frozen,
+    Column("MessageID", Integer, primary_key=True, autoincrement=True),
+    Column("SessionID", String(32), ForeignKey("ChatSession.SessionID", ondelete="CASCADE"), nullable=False),
+    Column("Role", String(16), nullable=False),
+    Column("Content", Text, nullable=False),
+    Column("Tokens", Integer, nullable=False),
+    Column("CreatedAt", DateTime, nullable=False),
+    Index("ix_ChatMessage_SessionID_MessageID", "SessionID", "MessageID"),
+)
+
+
+@migration(5, "ChatSession and ChatMessage")
+def _chat_sessions(connection: Connection) -> None:
+    _chat_session_table.create(connection, checkfirst=True)
+    _chat_message_table.create(connection, checkfirst=True)
+
+
+@migration(6, "ChatSession.ChildKey")
+def _chat_session_child(connection: Connection) -> None:
+    if not _has_column(connection, "ChatSession", "ChildKey"):
+        _add_column(connection, "ChatSession", Column("ChildKey", Integer, ForeignKey("DimUser.UserKey")))
+
+
+_job_table = Table(
+    "Job",
+    frozen,
+    Column("JobID", Integer, primary_key=True, autoincrement=True),
+    Column("Kind", String(50), nullable=False),
+    Column("Payload", JSON, nullable=True),
+    Column("Status", String(16), nullable=False),
+    Column("Attempts", Integer, nullable=False),
+    Column("RunAfter", DateTime, nullable=False),
+    Column("DedupKey", String(120), nullable=True),
+    Column("LockedBy", String(64), nullable=True),
+    Column("LockedAt", DateTime, nullable=True),
+    Column("LastError", Text, nullable=True),
+    Column("CreatedAt", DateTime, nullable=False),
+    Column("FinishedAt", DateTime, nullable=True),
+    Index("ix_Job_Status_RunAfter", "Status", "RunAfter"),
+    Index("ux_Job_DedupKey", "DedupKey", unique=True),
+)
+_coach_result_table = Table(
+    "CoachResult",
+    frozen,
+    Column("UserKey", Integer, ForeignKey("DimUser.UserKey"), primary_key=True),
+    Column("InputHash", String(64), nullable=False, index=True),
+    Column("Result", JSON, nullable=False),
+    Column("GeneratedAt", DateTime, nullable=False),
+)
+
+
+@migration(7, "Job queue and CoachResult")
+def _jobs(connection: Connection) -> None:
+    _job_table.create(connection, checkfirst=True)
+    _coach_result_table.create(connection, checkfirst=True)
+
+
+_log_event_table = Table(
+    "LogEvent",
+    frozen,
+    Column("EventID", Integer, primary_key=True, autoincrement=True),
+    Column("UserKey", Integer, ForeignKey("DimUser.UserKey"), nullable=False),
+    Column("LoggedAt", DateTime, nullable=False),
+    Column("Kind", SmallInteger, nullable=False),
+    Column("ItemKey", Integer, nullable=True),
+    Column("Quantity", Float, nullable=True),
+    Column("EntryID", String(64), nullable=True),
+    Index("ix_LogEvent_UserKey_LoggedAt", "UserKey", "LoggedAt"),
+    Index("ux_LogEvent_UserKey_EntryID_Kind", "UserKey", "EntryID", "Kind", unique=True),
+)
+# (event kind, FactSystem key column, quantity column)
+_FOOD_EVENT_SOURCES = (
+    (1, "CarbKey", "QuantityCarb"),
+    (2, "MeatKey", "QuantityMeat"),
+    (3, "FruitKey", "QuantityFruit"),
+    (4, "VegKey", "QuantityVeg"),
+    (5, "Milk1Key", "QuantityMilk1"),
+    (6, "Milk2Key", "QuantityMilk2"),
+)
+# (dimension, its key, columns for the water / fruit intake / stool kinds 7, 8, 9)
+_SYMPTOM_EVENT_SOURCES = (
+    ("DimSymptom1", "Symptom1Key", ("WaterOz1", "FruitIntake1", "Stool1")),
+    ("DimSymptom2", "Symptom2Key", ("WaterOz2", "FruitIntake2", "Stool2")),
+)
+
+
+def _copy_facts_to_log_events(connection: Connection) -> None:
+    """One INSERT ... SELECT of every fact with a child and ``LoggedAt`` into ``LogEvent``.
+
+    Events get their fact's ``EntryID``, except those from ``DimSymptom2``:
+    ingestion never writes it, and a fact using both symptom tables would
+    otherwise give one entry two events of a kind.
+    """
+    facts = table(
+        "FactSystem",
+        *(column(name) for name in ("UserKey", "LoggedAt", "EntryID", "Symptom1Key", "Symptom2Key")),
+        *(column(name) for _kind, key, quantity in _FOOD_EVENT_SOURCES for name in (key, quantity)),
+    )
+    timed = [facts.c.UserKey.is_not(None), facts.c.LoggedAt.is_not(None)]
+
+    def numeric(value):
+        if connection.dialect.name == "postgresql":
+            # Postgres rejects CAST('4 oz' AS FLOAT); SQLite reads the leading number.
+            return case((value.op("~")(r"^\s*[0-9]+(\.[0-9]+)?\s*$"), cast(value, Float)))
+        return cast(value, Float)
+
+    selects = []
+    for kind, key, quantity in _FOOD_EVENT_SOURCES:
+        selects.append(
+            select(
+                facts.c.UserKey,
+                facts.c.LoggedAt,
+                literal(kind),
+                facts.c[key],
+                numeric(facts.c[quantity]),
+                facts.c.EntryID,
+            ).where(*timed, facts.c[key].is_not(None))
+        )
+    for (name, key, values), entry_id in zip(_SYMPTOM_EVENT_SOURCES, (facts.c.EntryID, null())):
+        dimension = table(name, column(key), *(column(value) for value in values))
+        for kind, value in zip((7, 8, 9), values):
+            selects.append(
+                select(
+                    facts.c.UserKey,
+                    facts.c.LoggedAt,
+                    literal(kind),
+                    null(),
+                    cast(dimension.c[value], Float),
+                    entry_id,
+                )
+                .select_from(facts.join(dimension, dimension.c[key] == facts.c[key]))
+                .where(*timed, dimension.c[value].is_not(None))
+            )
+    columns = ["UserKey", "LoggedAt", "Kind", "ItemKey", "Quantity", "EntryID"]
+    events = table("LogEvent", *(column(name) for name in columns))
+    connection.execute(insert(events).from_select(columns, union_all(*selects)))
+
+
+@migration(8, "LogEvent, unique per (child, entry, kind), backfilled from FactSystem")
+def _log_events(connection: Connection) -> None:
+    _log_event_table.create(connection, checkfirst=True)
+    # One INSERT ... SELECT; a few seconds per million facts on SQLite.
+    if connection.scalar(select(_log_event_table.c.EventID).limit(1)) is None:
+        _copy_facts_to_log_events(connection)
+
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(engine: Engine) -> int:
+    """Highest applied version, or 0 for a database that has never been migrated."""
+    try:
+        with engine.connect() as connection:
+            return connection.scalar(select(func.max(schema_version.c.version))) or 0
+    except (exc.OperationalError, exc.ProgrammingError):
+        return 0
+
+
+@contextmanager
+def migration_lock(engine: Engine) -> Iterator[None]:
+    """Serialize migrators across processes.
+
+    SQLite holds an exclusive transaction on a ``<database>.migrate-lock`` file
+    next to the database; Postgres uses a session advisory lock. Other backends
+    run unlocked.
+    """
+    timeout = settings.db_migration_lock_timeout_seconds
+    url = make_url(str(engine.url))
+    if url.get_backend_name() == "sqlite" and url.database and url.database != ":memory:":
+        lock = sqlite3.connect(f"{url.database}.migrate-lock", timeout=timeout, isolation_level=None)
+        try:
+            lock.execute("BEGIN EXCLUSIVE")
+            yield
+        finally:
+            lock.close()
+    elif url.get_backend_name() == "postgresql":
+        with engine.connect() as connection:
+            connection.execute(text(f"SET lock_timeout = {int(timeout * 1000)}"))
+            connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": POSTGRES_LOCK_KEY})
+            connection.commit()
+            try:
+                yield
+            finally:
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": POSTGRES_LOCK_KEY})
+                connection.commit()
+    else:
+        yield
+
+
+def upgrade(engine: Engine) -> List[Migration]:
+    """Apply pending migrations, each in its own transaction; returns what ran."""
+    applied: List[Migration] = []
+    with migration_lock(engine):
+        schema_version.create(engine, checkfirst=True)
+        # Re-read under the lock: another process may have just finished.
+        version = current_version(engine)
+        for step in MIGRATIONS:
+            if step.version <= version:
+                continue
+            with engine.begin() as connection:
+                step.upgrade(connection)
+                connection.execute(
+                    schema_version.insert().values(
+                        version=step.version,
+                        description=step.description,
+                        applied_at=datetime.now(timezone.utc).replace(tzinfo=None),
+                    )
+                )
+            applied.append(step)
+    return applied
+
+
+def ensure_schema_current(engine: Engine, auto_upgrade: bool) -> None:
+    """Startup check: one version query, plus an upgrade only when behind and allowed."""
+    version = current_version(engine)
+    if version == LATEST_VERSION:
+        return
+    if version > LATEST_VERSION:
+        raise SchemaOutOfDate(f"Database schema is at version {version}, newer than this code ({LATEST_VERSION}).")
+    if not auto_upgrade:
+        raise SchemaOutOfDate(
+            f"Database schema is at version {version}, expected {LATEST_VERSION}. "
+            "Run `python -m app.db.migrations upgrade`."
+        )
+    upgrade(engine)
+
+
+if __name__ == "__main__":
+    commands = ("upgrade", "current", "history")
+    if len(sys.argv) != 2 or sys.argv[1] not in commands:
+        sys.exit("usage: python -m app.db.migrations upgrade|current|history")
+    from app.db.session import engine
+
+    if sys.argv[1] == "upgrade":
+        start = time.perf_counter()
+        steps = upgrade(engine)
+        for step in steps:
+            print(f"applied {step.version}: {step.description}")
+        print(f"schema at version {current_version(engine)} ({time.perf_counter() - start:.2f}s)")
+    elif sys.argv[1] == "current":
+        print(f"{current_version(engine)} (latest {LATEST_VERSION})")
+    else:
+        version = current_version(engine)
+        for step in MIGRATIONS:
+            print(f"{'x' if step.version <= version else ' '} {step.version}: {step.description}")
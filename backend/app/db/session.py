@@ -1,13 +1,93 @@
-from sqlalchemy import create_engine
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
 
-connect_args = {"check_same_thread": False} if settings.database_url.startswith("sqlite") else {}
+# Async driver used for each backend unless the URL already names an async one.
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+ASYNC_CAPABLE_DRIVERS = {"aiosqlite", "asyncpg", "psycopg", "psycopg_async", "aiomysql", "asyncmy"}
 
-engine = create_engine(settings.database_url, connect_args=connect_args)
+
+def to_async_url(database_url: str) -> str:
+    """``database_url`` with its sync driver (``pysqlite``, ``psycopg2``, ``pymysql``, ...) swapped for an async one."""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    explicit_driver = url.drivername.partition("+")[2]
+    if backend in ASYNC_DRIVERS and explicit_driver not in ASYNC_CAPABLE_DRIVERS:
+        url = url.set(drivername=ASYNC_DRIVERS[backend])
+    return url.render_as_string(hide_password=False)
+
+
+def is_sqlite(database_url: str) -> bool:
+    return database_url.startswith("sqlite")
+
+
+def engine_options(database_url: str) -> dict:
+    """Pool settings for server databases; SQLite keeps SQLAlchemy's defaults."""
+    if is_sqlite(database_url):
+        return {}
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_recycle": settings.db_pool_recycle_seconds,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+
+def apply_sqlite_pragmas(sync_engine: Engine, read_only: bool = False) -> None:
+    """Run the SQLite tuning profile on every new DBAPI connection of ``sync_engine``."""
+
+    @event.listens_for(sync_engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}")
+        if settings.sqlite_tuning_enabled:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute(f"PRAGMA mmap_size={settings.sqlite_mmap_size_bytes}")
+            cursor.execute(f"PRAGMA cache_size=-{settings.sqlite_cache_size_kib}")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+
+def build_engine(database_url: str, read_only: bool = False) -> Engine:
+    connect_args = {"check_same_thread": False} if is_sqlite(database_url) else {}
+    engine = create_engine(database_url, connect_args=connect_args, **engine_options(database_url))
+    if is_sqlite(database_url):
+        apply_sqlite_pragmas(engine, read_only=read_only)
+    return engine
+
+
+def build_async_engine(database_url: str, read_only: bool = False) -> AsyncEngine:
+    engine = create_async_engine(to_async_url(database_url), **engine_options(database_url))
+    if is_sqlite(database_url):
+        apply_sqlite_pragmas(engine.sync_engine, read_only=read_only)
+    return engine
+
+
+engine = build_engine(settings.database_url)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = build_async_engine(settings.database_url)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# GET routes read through this engine. Without DATABASE_READ_URL it points at the
+# primary database; on SQLite its connections are additionally marked query-only.
+if settings.database_read_engine_enabled:
+    async_read_engine = build_async_engine(settings.database_read_url or settings.database_url, read_only=True)
+    AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
+else:
+    async_read_engine = async_engine
+    AsyncReadSessionLocal = AsyncSessionLocal
+
 
 def get_db():
     db = SessionLocal()
@@ -15,3 +95,19 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
+async def dispose_async_engines() -> None:
+    await async_engine.dispose()
+    if async_read_engine is not async_engine:
+        await async_read_engine.dispose()
@@ -1,23 +1,64 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import inspect, text
+from fastapi.responses import PlainTextResponse
 
+from app.core.cache_backends import close_cache_backends
 from app.core.config import settings
-from app.db.base import Base
-from app.db.session import engine
-from app.models import happytummy_schema
-from app.models.user import User
+from app.core.http import close_http_clients, open_http_clients
+from app.core.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, registry as metrics_registry
+from app.core.security import bind_app_loop, shutdown_password_hasher
+from app.db.migrations import ensure_schema_current
+from app.db.session import SessionLocal, dispose_async_engines, engine
 from app.routes.auth import router as auth_router
 from app.routes.children import router as children_router
 from app.routes.ai import router as ai_router
+from app.routes.chat import router as chat_router
+from app.services import coach_precompute  # noqa: F401  (registers job handlers)
+from app.services.dimensions import dimension_registry
+from app.services.jobs import JobWorker
+from app.services.nutrition import cache_store as nutrition_cache_store
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+	# A single version query when the schema is current; DDL only runs under the migration lock.
+	ensure_schema_current(engine, auto_upgrade=settings.db_auto_migrate)
+	open_http_clients()
+	bind_app_loop(asyncio.get_running_loop())
+	with SessionLocal() as db:
+		dimension_registry.load(db)
+	worker = JobWorker(settings.jobs_concurrency, settings.jobs_poll_seconds) if settings.jobs_worker_enabled else None
+	if worker is not None:
+		worker.start()
+	try:
+		yield
+	finally:
+		if worker is not None:
+			await worker.stop()
+		await close_http_clients()
+		nutrition_cache_store.close()
+		await close_cache_backends()
+		shutdown_password_hasher()
+		await dispose_async_engines()
+
 
-app = FastAPI(title=settings.app_name, version="0.1.0")
+app = FastAPI(title=settings.app_name, version="0.1.0", lifespan=lifespan)
 
 if settings.jwt_secret_key == "change-this-in-production":
 	raise RuntimeError("Set JWT_SECRET_KEY in backend/.env before starting the server.")
 if len(settings.jwt_secret_key) < 32:
 	raise RuntimeError("JWT_SECRET_KEY must be at least 32 characters.")
 
+if settings.metrics_enabled:
+	app.add_middleware(MetricsMiddleware)
+
+	@app.get("/metrics", include_in_schema=False)
+	def metrics() -> PlainTextResponse:
+		return PlainTextResponse(metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
 app.add_middleware(
 	CORSMiddleware,
 	allow_origins=settings.get_cors_origins(),
@@ -26,27 +67,7 @@ app.add_middleware(
 	allow_headers=["*"],
 )
 
-Base.metadata.create_all(bind=engine)
-
-
-def ensure_schema_compatibility() -> None:
-	inspector = inspect(engine)
-	table_names = inspector.get_table_names()
-	if "DimUser" not in table_names:
-		return
-
-	column_names = {column["name"] for column in inspector.get_columns("DimUser")}
-	if "ParentConsent" in column_names:
-		return
-
-	with engine.begin() as connection:
-		connection.execute(
-			text('ALTER TABLE "DimUser" ADD COLUMN "ParentConsent" BOOLEAN NOT NULL DEFAULT 0')
-		)
-
-
-ensure_schema_compatibility()
-
 app.include_router(children_router, prefix="/api", tags=["children"])
 app.include_router(auth_router, prefix="/api")
-app.include_router(ai_router, tags=["ai"])
\ No newline at end of file
+app.include_router(ai_router, tags=["ai"])
+app.include_router(chat_router)
\ No newline at end of file
@@ -0,0 +1,36 @@
+from datetime import datetime
+
+from sqlalchemy import JSON, DateTime, ForeignKey, Index, Integer, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class ChatSession(Base):
+    __tablename__ = "ChatSession"
+
+    session_id: Mapped[str] = mapped_column("SessionID", String(32), primary_key=True)
+    user_id: Mapped[int] = mapped_column("UserID", ForeignKey("users.id"), nullable=False, index=True)
+    # Set for sessions about a stored child; Baby/RecentLogs are then unused.
+    child_key: Mapped[int | None] = mapped_column("ChildKey", ForeignKey("DimUser.UserKey"), nullable=True)
+    baby: Mapped[dict | None] = mapped_column("Baby", JSON, nullable=True)
+    recent_logs: Mapped[list | None] = mapped_column("RecentLogs", JSON, nullable=True)
+    # Rolling summary of every message up to and including SummarizedThrough.
+    summary: Mapped[str | None] = mapped_column("Summary", Text, nullable=True)
+    summarized_through: Mapped[int] = mapped_column("SummarizedThrough", Integer, nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column("CreatedAt", DateTime, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column("UpdatedAt", DateTime, nullable=False)
+
+
+class ChatMessage(Base):
+    __tablename__ = "ChatMessage"
+    __table_args__ = (Index("ix_ChatMessage_SessionID_MessageID", "SessionID", "MessageID"),)
+
+    message_id: Mapped[int] = mapped_column("MessageID", Integer, primary_key=True, autoincrement=True)
+    session_id: Mapped[str] = mapped_column(
+        "SessionID", ForeignKey("ChatSession.SessionID", ondelete="CASCADE"), nullable=False
+    )
+    role: Mapped[str] = mapped_column("Role", String(16), nullable=False)
+    content: Mapped[str] = mapped_column("Content", Text, nullable=False)
+    tokens: Mapped[int] = mapped_column("Tokens", Integer, nullable=False)
+    created_at: Mapped[datetime] = mapped_column("CreatedAt", DateTime, nullable=False)
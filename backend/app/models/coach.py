@@ -0,0 +1,17 @@
+from datetime import datetime
+
+from sqlalchemy import JSON, DateTime, ForeignKey, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class CoachResult(Base):
+    """Latest precomputed coach response per child, looked up by its input hash."""
+
+    __tablename__ = "CoachResult"
+
+    user_key: Mapped[int] = mapped_column("UserKey", ForeignKey("DimUser.UserKey"), primary_key=True)
+    input_hash: Mapped[str] = mapped_column("InputHash", String(64), nullable=False, index=True)
+    result: Mapped[dict] = mapped_column("Result", JSON, nullable=False)
+    generated_at: Mapped[datetime] = mapped_column("GeneratedAt", DateTime, nullable=False)
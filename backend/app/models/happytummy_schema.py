@@ -1,4 +1,6 @@
-from sqlalchemy import Column, ForeignKey, Integer, String, Boolean, Table
+from datetime import date, datetime
+
+from sqlalchemy import Column, Date, DateTime, Float, ForeignKey, Index, Integer, SmallInteger, String, Boolean, Table
 from sqlalchemy.orm import Mapped, mapped_column
 
 
@@ -121,4 +123,54 @@ FactSystem = Table(
     Column("QuantityVeg", Integer, nullable=True),
     Column("QuantityMilk1", String(50), nullable=True),
     Column("QuantityMilk2", String(50), nullable=True),
+    # Client-supplied log entry ID; unique per child so batch uploads can be replayed safely.
+    Column("EntryID", String(64), nullable=True),
+    Column("LoggedAt", DateTime, nullable=True),
+    Index("ux_FactSystem_UserKey_EntryID", "UserKey", "EntryID", unique=True),
 )
+
+
+class ChildDailyRollup(Base):
+    """Per-child, per-day totals maintained incrementally from FactSystem inserts."""
+
+    __tablename__ = "ChildDailyRollup"
+
+    user_key: Mapped[int] = mapped_column("UserKey", ForeignKey("DimUser.UserKey"), primary_key=True)
+    day: Mapped[date] = mapped_column("Day", Date, primary_key=True)
+    carb_fiber: Mapped[float] = mapped_column("CarbFiber", Float, nullable=False, default=0)
+    meat_fiber: Mapped[float] = mapped_column("MeatFiber", Float, nullable=False, default=0)
+    fruit_fiber: Mapped[float] = mapped_column("FruitFiber", Float, nullable=False, default=0)
+    veg_fiber: Mapped[float] = mapped_column("VegFiber", Float, nullable=False, default=0)
+    milk_fiber: Mapped[float] = mapped_column("MilkFiber", Float, nullable=False, default=0)
+    water_oz: Mapped[int] = mapped_column("WaterOz", Integer, nullable=False, default=0)
+    fruit_intake: Mapped[int] = mapped_column("FruitIntake", Integer, nullable=False, default=0)
+    stool_total: Mapped[int] = mapped_column("StoolTotal", Integer, nullable=False, default=0)
+    stool_count: Mapped[int] = mapped_column("StoolCount", Integer, nullable=False, default=0)
+    entry_count: Mapped[int] = mapped_column("EntryCount", Integer, nullable=False, default=0)
+
+
+class LogEvent(Base):
+    """One measurement per row: a food eaten or a symptom value, for one child at one time.
+
+    A narrow copy of ``FactSystem``, written alongside it. Milk quantities are
+    numeric and symptoms are inline, so reading a child's history is one range
+    scan of ``ix_LogEvent_UserKey_LoggedAt`` with no joins.
+    """
+
+    __tablename__ = "LogEvent"
+    __table_args__ = (
+        Index("ix_LogEvent_UserKey_LoggedAt", "UserKey", "LoggedAt"),
+        # A replayed or concurrent log batch can't copy the same entry twice.
+        Index("ux_LogEvent_UserKey_EntryID_Kind", "UserKey", "EntryID", "Kind", unique=True),
+    )
+
+    event_id: Mapped[int] = mapped_column("EventID", Integer, primary_key=True, autoincrement=True)
+    user_key: Mapped[int] = mapped_column("UserKey", ForeignKey("DimUser.UserKey"), nullable=False)
+    logged_at: Mapped[datetime] = mapped_column("LoggedAt", DateTime, nullable=False)
+    # app.services.log_events.EventKind
+    kind: Mapped[int] = mapped_column("Kind", SmallInteger, nullable=False)
+    # Dimension key of the food for food kinds; NULL for symptoms.
+    item_key: Mapped[int | None] = mapped_column("ItemKey", Integer, nullable=True)
+    quantity: Mapped[float | None] = mapped_column("Quantity", Float, nullable=True)
+    # FactSystem.EntryID of the source fact; NULL for facts without one and for DimSymptom2 values.
+    entry_id: Mapped[str | None] = mapped_column("EntryID", String(64), nullable=True)
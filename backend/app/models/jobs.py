@@ -0,0 +1,29 @@
+from datetime import datetime
+
+from sqlalchemy import JSON, DateTime, Index, Integer, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class Job(Base):
+    __tablename__ = "Job"
+    __table_args__ = (
+        Index("ix_Job_Status_RunAfter", "Status", "RunAfter"),
+        Index("ux_Job_DedupKey", "DedupKey", unique=True),
+    )
+
+    job_id: Mapped[int] = mapped_column("JobID", Integer, primary_key=True, autoincrement=True)
+    kind: Mapped[str] = mapped_column("Kind", String(50), nullable=False)
+    payload: Mapped[dict | None] = mapped_column("Payload", JSON, nullable=True)
+    # queued -> running -> done | failed; failed attempts go back to queued until the last one.
+    status: Mapped[str] = mapped_column("Status", String(16), nullable=False, default="queued")
+    attempts: Mapped[int] = mapped_column("Attempts", Integer, nullable=False, default=0)
+    run_after: Mapped[datetime] = mapped_column("RunAfter", DateTime, nullable=False)
+    # Enqueueing the same key twice is a no-op (e.g. one nightly run per day).
+    dedup_key: Mapped[str | None] = mapped_column("DedupKey", String(120), nullable=True)
+    locked_by: Mapped[str | None] = mapped_column("LockedBy", String(64), nullable=True)
+    locked_at: Mapped[datetime | None] = mapped_column("LockedAt", DateTime, nullable=True)
+    last_error: Mapped[str | None] = mapped_column("LastError", Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column("CreatedAt", DateTime, nullable=False)
+    finished_at: Mapped[datetime | None] = mapped_column("FinishedAt", DateTime, nullable=True)
@@ -1,61 +1,276 @@
 """AI-powered coach and chat endpoints for baby digestion support."""
 import json
+import logging
 import os
-from typing import Optional, Any, List, Dict
-from fastapi import APIRouter, HTTPException
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Any, AsyncIterator, List, Dict
+from fastapi import APIRouter, Body, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 import httpx
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.cache import SharedCache, SingleFlight, canonical_hash
+from app.core.cache_backends import cache_backend
 from app.core.config import settings
+from app.core.http import get_featherless_client
+from app.core.metrics import Counter, UpstreamCall, llm_completions, record_token_usage
+from app.core.security import UserPrincipal
+from app.core.upstream import (
+    CircuitBreaker,
+    LatencyTracker,
+    Priority,
+    UpstreamScheduler,
+    UpstreamUnavailable,
+    hedged,
+    parse_retry_after,
+)
+from app.db.session import AsyncReadSessionLocal
+from app.models.coach import CoachResult
+from app.routes.auth import get_current_user
+from app.services.chat_context import assemble_messages, context_prompt, turns_from_messages
+from app.services.child_context import ChildContext, child_context_cache
+from app.services.nutrition import cache_stats as nutrition_cache_stats, search_ingredients, search_local
+from app.services.recommendations import recommend_for_child
 
 router = APIRouter(prefix="/api/ai", tags=["ai"])
+logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client pointing to Featherless
-FEATHERLESS_BASE_URL = "https://api.featherless.ai/v1"
 FEATHERLESS_API_KEY = settings.featherless_api_key
 FEATHERLESS_MODEL = settings.featherless_model
+# Primary first; the second model is also the hedge target.
+FEATHERLESS_MODELS = [model for model in [FEATHERLESS_MODEL, *settings.get_featherless_fallback_models()] if model]
 SPOONACULAR_KEY = settings.spoonacular_key
 
+# Bump whenever the coach prompt changes so stale cached answers are not served.
+COACH_PROMPT_VERSION = "1"
+coach_cache = SharedCache("coach", cache_backend(settings.coach_cache_max_entries), settings.coach_cache_ttl_seconds)
+coach_flight = SingleFlight()
+coach_precomputed_hits = Counter(
+    "coach_precomputed_hits_total", "Coach responses served from the nightly precompute."
+)
+
+featherless_scheduler = UpstreamScheduler(
+    "featherless",
+    max_in_flight=settings.llm_max_in_flight,
+    max_queue=settings.llm_max_queue,
+    queue_timeout_seconds=settings.llm_queue_timeout_seconds,
+    max_retries=settings.llm_max_retries,
+    backoff_base_seconds=settings.llm_backoff_base_seconds,
+    backoff_max_seconds=settings.llm_backoff_max_seconds,
+)
+# One breaker per model, passed with each request, so a failing model can be
+# skipped while the others serve.
+featherless_breakers = {
+    model: CircuitBreaker(
+        f"featherless:{model}", settings.llm_circuit_failure_threshold, settings.llm_circuit_reset_seconds
+    )
+    for model in FEATHERLESS_MODELS
+}
+featherless_latency = LatencyTracker(
+    settings.llm_hedge_window,
+    settings.llm_hedge_percentile,
+    settings.llm_hedge_min_delay_seconds,
+    settings.llm_hedge_initial_delay_seconds,
+)
+
+
+class FeatherlessUnavailable(HTTPException):
+    """503 raised when the scheduler, or Featherless itself, sheds load."""
+
+    def __init__(self, exc: UpstreamUnavailable) -> None:
+        super().__init__(
+            status_code=503,
+            detail=f"AI service is busy ({exc.reason}), please retry shortly",
+            headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+        )
+        self.reason = exc.reason
 
-async def call_featherless(messages: List[Dict[str, str]], max_tokens: int = 350, temperature: float = 0.2) -> str:
-    """Call Featherless API with OpenAI-compatible interface."""
-    if not FEATHERLESS_API_KEY or not FEATHERLESS_MODEL:
-        raise HTTPException(status_code=500, detail="Featherless API key or model not configured")
-    
-    async with httpx.AsyncClient() as client:
-        try:
+
+def featherless_error(status_code: int, retry_after: Optional[str], body: str) -> HTTPException:
+    """Client-facing error for a non-200 Featherless reply left after the scheduler's retries.
+
+    429 and 503 mean Featherless is shedding load, so they become the same
+    503 with ``Retry-After`` as a request the scheduler sheds itself. The
+    upstream body is logged, never returned to the client.
+    """
+    logger.warning("Featherless returned %s: %.500s", status_code, body)
+    if status_code in (429, 503):
+        delay = parse_retry_after(retry_after)
+        return FeatherlessUnavailable(
+            UpstreamUnavailable("upstream_busy", settings.llm_backoff_max_seconds if delay is None else delay)
+        )
+    return HTTPException(status_code=500, detail=f"Featherless API error (status {status_code})")
+
+
+async def complete_with_model(
+    model: str,
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    temperature: float,
+    priority: Priority,
+) -> str:
+    """One chat completion from ``model``, with the scheduler's retries."""
+    client = get_featherless_client()
+
+    async def send() -> httpx.Response:
+        with UpstreamCall("featherless", "chat_completions") as call:
             response = await client.post(
-                f"{FEATHERLESS_BASE_URL}/chat/completions",
+                "/chat/completions",
                 headers={
                     "Authorization": f"Bearer {FEATHERLESS_API_KEY}",
                     "Content-Type": "application/json",
                 },
                 json={
-                    "model": FEATHERLESS_MODEL,
+                    "model": model,
                     "messages": messages,
                     "temperature": temperature,
                     "max_tokens": max_tokens,
                 },
-                timeout=30.0,
             )
-            
+            call.status = response.status_code
+            return response
+
+    try:
+        async with featherless_scheduler.request(send, priority, featherless_breakers[model]) as response:
             if response.status_code != 200:
-                raise HTTPException(status_code=500, detail=f"Featherless API error: {response.text}")
-            
+                raise featherless_error(response.status_code, response.headers.get("Retry-After"), response.text)
+        
             result = response.json()
-            return result.get("choices", [{}])[0].get("message", {}).get("content", "")
-        except httpx.RequestError as e:
-            raise HTTPException(status_code=500, detail=f"Featherless API request failed: {str(e)}")
+        record_token_usage(model, result.get("usage"))
+        return result.get("choices", [{}])[0].get("message", {}).get("content", "")
+    except UpstreamUnavailable as e:
+        raise FeatherlessUnavailable(e)
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=500, detail=f"Featherless API request failed: {str(e)}")
 
 
-@router.post("/coach")
-async def get_coach_message(
-    baby: Optional[Dict[str, Any]] = None,
-    insights: Optional[List[Any]] = None,
-    recommendations: Optional[Dict[str, Any]] = None,
-) -> Dict[str, Any]:
-    """Generate personalized coaching message based on baby profile and recommendations."""
-    if not baby or not recommendations:
-        raise HTTPException(status_code=400, detail="Missing baby or recommendations")
+def can_fall_back(exc: BaseException) -> bool:
+    """Another model may help with upstream errors, a busy model and open circuits, not with a full queue."""
+    if isinstance(exc, FeatherlessUnavailable):
+        return exc.reason in ("circuit_open", "upstream_busy")
+    return isinstance(exc, HTTPException)
+
+
+async def call_featherless(
+    messages: List[Dict[str, str]],
+    max_tokens: int = 350,
+    temperature: float = 0.2,
+    priority: Priority = Priority.INTERACTIVE,
+) -> str:
+    """Call Featherless API with OpenAI-compatible interface.
+
+    With fallback models configured, a second request goes to the next model
+    when the primary is slower than its recent latency percentile (first answer
+    wins) or fails; any further models are tried in order after that.
+    """
+    if not FEATHERLESS_API_KEY or not FEATHERLESS_MODELS:
+        raise HTTPException(status_code=500, detail="Featherless API key or model not configured")
+
+    attempts = [
+        (model, lambda model=model: complete_with_model(model, messages, max_tokens, temperature, priority))
+        for model in FEATHERLESS_MODELS
+    ]
+    if len(attempts) == 1:
+        text = await attempts[0][1]()
+        llm_completions.inc(model=FEATHERLESS_MODELS[0], path="primary")
+        return text
+
+    # Hedging needs spare capacity; with callers already queued it would only add load.
+    delay = None
+    if settings.llm_hedging_enabled and not featherless_scheduler.queued:
+        delay = featherless_latency.delay()
+    try:
+        text, path = await hedged(
+            "featherless", attempts[0][1], attempts[1][1], delay, featherless_latency, fallback_on=can_fall_back
+        )
+        llm_completions.inc(model=attempts[0 if path == "primary" else 1][0], path=path)
+        return text
+    except HTTPException as e:
+        if not can_fall_back(e) or len(attempts) == 2:
+            raise
+        error = e
+    for model, attempt in attempts[2:]:
+        try:
+            text = await attempt()
+        except HTTPException as e:
+            if not can_fall_back(e):
+                raise
+            error = e
+            continue
+        llm_completions.inc(model=model, path="fallback")
+        return text
+    raise error
+
+
+async def stream_featherless(
+    messages: List[Dict[str, str]],
+    max_tokens: int = 350,
+    temperature: float = 0.2,
+    priority: Priority = Priority.INTERACTIVE,
+) -> AsyncIterator[str]:
+    """Call Featherless with ``stream=true`` and yield content deltas as they arrive."""
+    if not FEATHERLESS_API_KEY or not FEATHERLESS_MODEL:
+        raise HTTPException(status_code=500, detail="Featherless API key or model not configured")
+
+    client = get_featherless_client()
+    request = client.build_request(
+        "POST",
+        "/chat/completions",
+        headers={
+            "Authorization": f"Bearer {FEATHERLESS_API_KEY}",
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream",
+        },
+        json={
+            "model": FEATHERLESS_MODEL,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True,
+        },
+    )
+
+    async def send() -> httpx.Response:
+        # Retries are only possible until the first byte, so time just the response head.
+        with UpstreamCall("featherless", "chat_completions_stream") as call:
+            response = await client.send(request, stream=True)
+            call.status = response.status_code
+            return response
+
+    try:
+        breaker = featherless_breakers[FEATHERLESS_MODEL]
+        async with featherless_scheduler.request(send, priority, breaker) as response:
+            if response.status_code != 200:
+                body = (await response.aread()).decode(errors="replace")
+                raise featherless_error(response.status_code, response.headers.get("Retry-After"), body)
+
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(payload)
+                except json.JSONDecodeError:
+                    continue
+                # Only present when the server honours stream_options.include_usage.
+                record_token_usage(FEATHERLESS_MODEL, chunk.get("usage"))
+                delta = (chunk.get("choices") or [{}])[0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+    except UpstreamUnavailable as e:
+        raise FeatherlessUnavailable(e)
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=500, detail=f"Featherless API request failed: {str(e)}")
+
 
+async def generate_coach_message(
+    baby: Dict[str, Any],
+    insights: Optional[List[Any]],
+    recommendations: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Ask Featherless for a coaching message; returns the route's response body."""
     system_prompt = """
 You are Happy Tummy, a baby digestion support coach for ages 6–24 months.
 You do NOT diagnose, predict diseases, or provide medical advice.
@@ -96,6 +311,7 @@ RECOMMENDATIONS (deterministic mapping):
             ],
             max_tokens=350,
             temperature=0.2,
+            priority=Priority.BACKGROUND,
         )
 
         # Try to parse JSON response
@@ -106,26 +322,125 @@ RECOMMENDATIONS (deterministic mapping):
             # Return raw text if JSON parsing fails (for debugging)
             return {"result": text, "parseError": True}
     
+    except FeatherlessUnavailable:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Coach generation failed: {str(e)}")
 
 
-@router.post("/chat")
-async def get_chat_reply(
+def coach_cache_key(
+    baby: Dict[str, Any],
+    insights: Optional[List[Any]],
+    recommendations: Dict[str, Any],
+) -> str:
+    return canonical_hash(
+        COACH_PROMPT_VERSION, FEATHERLESS_MODEL, baby, insights or [], recommendations
+    )
+
+
+async def load_precomputed_coach(db: AsyncSession, key: str) -> Optional[Dict[str, Any]]:
+    """A nightly ``CoachResult`` for exactly these inputs, if it is recent enough."""
+    oldest = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(
+        seconds=settings.coach_precompute_max_age_seconds
+    )
+    return await db.scalar(
+        select(CoachResult.result)
+        .where(CoachResult.input_hash == key, CoachResult.generated_at >= oldest)
+        .limit(1)
+    )
+
+
+async def cached_coach_message(
+    baby: Dict[str, Any],
+    insights: Optional[List[Any]],
+    recommendations: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Coach response from memory, then from the nightly precompute, then live.
+
+    ``CoachResult`` is read on its own short-lived session, closed before
+    any call to Featherless.
+    """
+    if not settings.coach_cache_enabled:
+        return await generate_coach_message(baby, insights, recommendations)
+
+    key = coach_cache_key(baby, insights, recommendations)
+    # Stored under the generation read here, so a ``clear`` meanwhile wins.
+    cached, generation = await coach_cache.lookup(key)
+    if cached is not None:
+        return cached
+    async with AsyncReadSessionLocal() as db:
+        precomputed = await load_precomputed_coach(db, key)
+    if precomputed is not None:
+        coach_precomputed_hits.inc()
+        await coach_cache.set(key, precomputed, generation=generation)
+        return precomputed
+
+    async def generate_and_store() -> Dict[str, Any]:
+        result = await generate_coach_message(baby, insights, recommendations)
+        if not result.get("parseError"):
+            await coach_cache.set(key, result, generation=generation)
+        return result
+
+    return await coach_flight.do(key, generate_and_store)
+
+
+async def owned_child_context(db: AsyncSession, user: UserPrincipal, child_id: int) -> ChildContext:
+    context = await child_context_cache.get(db, user.id, child_id)
+    if context is None:
+        raise HTTPException(status_code=404, detail="Child not found")
+    return context
+
+
+@router.post("/coach")
+async def get_coach_message(
     baby: Optional[Dict[str, Any]] = None,
-    recentLogs: Optional[List[Any]] = None,
-    conversation: Optional[List[Dict[str, str]]] = None,
-    userMessage: str = None,
-) -> Dict[str, str]:
-    """Generate a chat reply based on baby profile, logs, and conversation history."""
-    if not userMessage or not isinstance(userMessage, str):
-        raise HTTPException(status_code=400, detail="Missing userMessage")
+    insights: Optional[List[Any]] = None,
+    recommendations: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Generate personalized coaching message based on baby profile and recommendations."""
+    if not baby or not recommendations:
+        raise HTTPException(status_code=400, detail="Missing baby or recommendations")
 
-    safe_baby = baby or {}
-    safe_logs = recentLogs[-7:] if isinstance(recentLogs, list) else []
-    safe_conversation = conversation[-10:] if isinstance(conversation, list) else []
+    return await cached_coach_message(baby, insights, recommendations)
 
-    system_prompt = """
+
+@router.post("/children/{child_id}/coach")
+async def get_child_coach_message(
+    child_id: int,
+    insights: Optional[List[Any]] = None,
+    recommendations: Optional[Dict[str, Any]] = None,
+    current_user: UserPrincipal = Depends(get_current_user),
+) -> Dict[str, Any]:
+    """Like ``/coach``, with the baby profile loaded from the child's stored record.
+
+    Without ``recommendations`` in the body, the server-side engine scores
+    them from the child's recent logs. Both are read on a short-lived read
+    session that is closed before Featherless is called.
+    """
+    async with AsyncReadSessionLocal() as db:
+        context = await owned_child_context(db, current_user, child_id)
+        if not recommendations:
+            recommendations = await recommend_for_child(db, child_id)
+    return await cached_coach_message(context.baby, insights, recommendations)
+
+
+@router.get("/coach/cache", dependencies=[Depends(get_current_user)])
+async def get_coach_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters for the coach response cache."""
+    return {
+        **coach_cache.stats(),
+        "coalesced": coach_flight.coalesced,
+        "precomputed": int(coach_precomputed_hits.value()),
+    }
+
+
+@router.get("/context/cache", dependencies=[Depends(get_current_user)])
+async def get_child_context_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters for the per-child chat context cache."""
+    return child_context_cache.stats()
+
+
+CHAT_SYSTEM_PROMPT = """
 You are Happy Tummy AI, a friendly digestion support assistant for babies age 6–24 months.
 
 Boundaries:
@@ -142,21 +457,31 @@ Output format:
 Return plain text (no markdown), 3–6 short sentences max.
 """.strip()
 
-    context_prompt = f"""
-BABY PROFILE:
-{json.dumps(safe_baby)}
 
-RECENT DIGESTION LOGS (most recent last):
-{json.dumps(safe_logs)}
-""".strip()
+def chat_context_prompt(baby: Optional[Dict[str, Any]], recentLogs: Optional[List[Any]]) -> str:
+    """Baby profile plus as many recent logs as fit the log token budget."""
+    return context_prompt(baby, recentLogs, settings.chat_logs_token_budget)
+
+
+def build_chat_messages(
+    context: str,
+    conversation: Optional[List[Dict[str, str]]],
+    userMessage: str,
+) -> List[Dict[str, str]]:
+    """Assemble the Featherless message list for a chat turn from a context block."""
+    turns = turns_from_messages(conversation if isinstance(conversation, list) else [])
+    messages, _overflow = assemble_messages(
+        CHAT_SYSTEM_PROMPT,
+        context,
+        None,
+        turns,
+        userMessage,
+        settings.chat_history_token_budget,
+    )
+    return messages
 
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "system", "content": context_prompt},
-        *safe_conversation,
-        {"role": "user", "content": userMessage},
-    ]
 
+async def chat_reply(messages: List[Dict[str, str]]) -> Dict[str, str]:
     try:
         answer = await call_featherless(
             messages=messages,
@@ -165,87 +490,142 @@ RECENT DIGESTION LOGS (most recent last):
         )
         return {"reply": answer or "Sorry — I couldn't generate a response."}
     
+    except FeatherlessUnavailable:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat generation failed: {str(e)}")
 
 
-@router.get("/nutrition/search")
-async def search_nutrition(query: str) -> Dict[str, List[Dict[str, Any]]]:
-    """Search Spoonacular for food nutrition information."""
-    if not query:
-        raise HTTPException(status_code=400, detail="Missing query")
+@router.post("/chat")
+async def get_chat_reply(
+    baby: Optional[Dict[str, Any]] = None,
+    recentLogs: Optional[List[Any]] = None,
+    conversation: Optional[List[Dict[str, str]]] = None,
+    userMessage: str = None,
+) -> Dict[str, str]:
+    """Generate a chat reply based on baby profile, logs, and conversation history."""
+    if not userMessage or not isinstance(userMessage, str):
+        raise HTTPException(status_code=400, detail="Missing userMessage")
 
-    if not SPOONACULAR_KEY:
-        raise HTTPException(status_code=500, detail="Spoonacular API key not configured")
+    messages = build_chat_messages(chat_context_prompt(baby, recentLogs), conversation, userMessage)
+    return await chat_reply(messages)
+
+
+@router.post("/children/{child_id}/chat")
+async def get_child_chat_reply(
+    child_id: int,
+    conversation: Optional[List[Dict[str, str]]] = Body(default=None, embed=True),
+    userMessage: str = None,
+    current_user: UserPrincipal = Depends(get_current_user),
+) -> Dict[str, str]:
+    """Like ``/chat``, with the profile and recent logs loaded from the child's records."""
+    if not userMessage or not isinstance(userMessage, str):
+        raise HTTPException(status_code=400, detail="Missing userMessage")
+
+    async with AsyncReadSessionLocal() as db:
+        context = await owned_child_context(db, current_user, child_id)
+    return await chat_reply(build_chat_messages(context.prompt, conversation, userMessage))
 
-    search_url = (
-        f"https://api.spoonacular.com/food/ingredients/search"
-        f"?query={query}&number=5&apiKey={SPOONACULAR_KEY}"
-    )
 
-    def get_available_units(description: str) -> List[str]:
-        desc = description.lower()
-        if any(x in desc for x in ["juice", "milk", "water"]):
-            return ["ml", "fl oz", "cup"]
-        if any(x in desc for x in ["cereal", "powder"]):
-            return ["g", "tbsp", "tsp"]
-        if any(x in desc for x in ["fruit", "vegetable"]):
-            return ["g", "oz", "piece", "slice"]
-        if "babyfood" in desc:
-            return ["g", "jar", "tbsp"]
-        return ["g", "oz", "tbsp", "tsp"]
-
-    async def fetch_detail(client: httpx.AsyncClient, ingredient_id: int) -> Dict[str, Any]:
+def sse_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """Format one Server-Sent Events frame."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+def chat_event_stream(request: Request, messages: List[Dict[str, str]]) -> StreamingResponse:
+    async def event_stream() -> AsyncIterator[str]:
+        parts: List[str] = []
         try:
-            url = (
-                f"https://api.spoonacular.com/food/ingredients/{ingredient_id}/information"
-                f"?amount=100&unit=grams&apiKey={SPOONACULAR_KEY}"
-            )
-            resp = await client.get(url, timeout=4.0)
-            if resp.status_code != 200:
-                return {}
-            info = resp.json()
-            nutrients = info.get("nutrition", {}).get("nutrients", [])
-            def find(name: str) -> Optional[float]:
-                for n in nutrients:
-                    if n.get("name", "").lower() == name.lower():
-                        return n.get("amount")
-                return None
-            return {"calories": find("Calories"), "fiber": find("Fiber"), "sugar": find("Sugar"), "protein": find("Protein"), "water": find("Water")}
-        except Exception:
-            return {}
+            async for delta in stream_featherless(messages, max_tokens=220, temperature=0.2):
+                if await request.is_disconnected():
+                    # Leaving the generator closes the upstream stream too.
+                    return
+                parts.append(delta)
+                yield sse_event({"delta": delta})
+        except HTTPException as e:
+            # The 200 head is already sent, so a 503's Retry-After travels in the event.
+            retry_after = (e.headers or {}).get("Retry-After")
+            error = {"detail": f"Chat generation failed: {e.detail}"}
+            yield sse_event({**error, "retryAfter": int(retry_after)} if retry_after else error, event="error")
+            return
+        reply = "".join(parts) or "Sorry — I couldn't generate a response."
+        yield sse_event({"reply": reply}, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(search_url, timeout=8.0)
-            if response.status_code != 200:
-                raise HTTPException(status_code=500, detail=f"Spoonacular error: {response.text}")
 
-            data = response.json()
-            items = data.get("results", [])
+@router.post("/chat/stream")
+async def stream_chat_reply(
+    request: Request,
+    baby: Optional[Dict[str, Any]] = None,
+    recentLogs: Optional[List[Any]] = None,
+    conversation: Optional[List[Dict[str, str]]] = None,
+    userMessage: str = None,
+) -> StreamingResponse:
+    """Stream a chat reply token-by-token as Server-Sent Events.
+
+    Emits ``data: {"delta": ...}`` frames as Featherless produces them, then a
+    final ``event: done`` frame with the full reply, or ``event: error`` if the
+    upstream fails mid-stream.
+    """
+    if not userMessage or not isinstance(userMessage, str):
+        raise HTTPException(status_code=400, detail="Missing userMessage")
+    if not FEATHERLESS_API_KEY or not FEATHERLESS_MODEL:
+        raise HTTPException(status_code=500, detail="Featherless API key or model not configured")
 
-            import asyncio
-            nutrition_data = await asyncio.gather(
-                *[fetch_detail(client, item.get("id")) for item in items]
-            )
+    messages = build_chat_messages(chat_context_prompt(baby, recentLogs), conversation, userMessage)
+    return chat_event_stream(request, messages)
+
+
+@router.post("/children/{child_id}/chat/stream")
+async def stream_child_chat_reply(
+    request: Request,
+    child_id: int,
+    conversation: Optional[List[Dict[str, str]]] = Body(default=None, embed=True),
+    userMessage: str = None,
+    current_user: UserPrincipal = Depends(get_current_user),
+) -> StreamingResponse:
+    """Like ``/chat/stream``, with the profile and recent logs loaded from the child's records."""
+    if not userMessage or not isinstance(userMessage, str):
+        raise HTTPException(status_code=400, detail="Missing userMessage")
+    if not FEATHERLESS_API_KEY or not FEATHERLESS_MODEL:
+        raise HTTPException(status_code=500, detail="Featherless API key or model not configured")
+
+    async with AsyncReadSessionLocal() as db:
+        context = await owned_child_context(db, current_user, child_id)
+    return chat_event_stream(request, build_chat_messages(context.prompt, conversation, userMessage))
+
+
+@router.get("/nutrition/search")
+async def search_nutrition(query: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Search the local food index, falling back to Spoonacular on a miss."""
+    if not query:
+        raise HTTPException(status_code=400, detail="Missing query")
 
-            results = [
-                {
-                    "name": item.get("name", "").capitalize(),
-                    "fdcId": item.get("id"),
-                    "calories": nutrition_data[i].get("calories"),
-                    "fiber": nutrition_data[i].get("fiber"),
-                    "sugar": nutrition_data[i].get("sugar"),
-                    "protein": nutrition_data[i].get("protein"),
-                    "water": nutrition_data[i].get("water"),
-                    "availableUnits": get_available_units(item.get("name", "")),
-                }
-                for i, item in enumerate(items)
-            ]
-
-            return {"results": results}
+    if settings.local_food_search_enabled:
+        local_results = search_local(query)
+        if local_results:
+            return {"results": local_results}
 
+    if not SPOONACULAR_KEY:
+        raise HTTPException(status_code=500, detail="Spoonacular API key not configured")
+
+    try:
+        return {"results": await search_ingredients(query)}
+    except HTTPException:
+        raise
     except httpx.RequestError as e:
         raise HTTPException(status_code=500, detail=f"Spoonacular search failed: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Nutrition search error: {str(e)}")
+
+
+@router.get("/nutrition/cache", dependencies=[Depends(get_current_user)])
+async def get_nutrition_cache_stats() -> Dict[str, Dict[str, int]]:
+    """Hit/miss counters for the Spoonacular lookup cache."""
+    return nutrition_cache_stats()
@@ -3,11 +3,21 @@ from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
-from app.core.security import create_access_token, get_password_hash, verify_password
-from app.db.session import get_db
+from app.core.security import (
+    PasswordHasherBusy,
+    UserPrincipal,
+    create_access_token,
+    get_password_hash_async,
+    invalidate_user_principals,
+    password_needs_rehash,
+    principal_cache,
+    verify_password_async,
+)
+from app.db.session import AsyncReadSessionLocal, get_async_db
 from app.models.user import User
 from app.schemas.auth import Token, UserCreate, UserLogin, UserOut
 
@@ -15,41 +25,70 @@ router = APIRouter(prefix="/auth", tags=["auth"])
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
 
+def password_hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-in requests, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
+
 @router.post("/register", response_model=UserOut, status_code=status.HTTP_201_CREATED)
-def register(payload: UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(User).filter(User.username == payload.username).first()
+async def register(payload: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    existing_user = await db.scalar(select(User).where(User.username == payload.username))
     if existing_user:
         raise HTTPException(status_code=400, detail="Username already exists")
 
+    try:
+        hashed_password = await get_password_hash_async(payload.password)
+    except PasswordHasherBusy:
+        raise password_hasher_busy()
+
     user = User(
         first_name=payload.first_name,
         username=payload.username,
-        hashed_password=get_password_hash(payload.password),
+        hashed_password=hashed_password,
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
 
 @router.post("/login", response_model=Token)
-def login(payload: UserLogin, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == payload.username).first()
-    if not user or not verify_password(payload.password, user.hashed_password):
+async def login(payload: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(User).where(User.username == payload.username))
+    try:
+        verified = user is not None and await verify_password_async(payload.password, user.hashed_password)
+    except PasswordHasherBusy:
+        raise password_hasher_busy()
+    if not verified:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid username or password")
 
+    if password_needs_rehash(user.hashed_password):
+        # Best effort: a busy pool just means we upgrade the hash on a later login.
+        try:
+            user.hashed_password = await get_password_hash_async(payload.password)
+            await db.commit()
+        except PasswordHasherBusy:
+            pass
+
     token = create_access_token(subject=user.username)
     return Token(access_token=token)
 
 
-def get_current_user(
-    token: Annotated[str, Depends(oauth2_scheme)], db: Session = Depends(get_db)
-) -> User:
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]) -> UserPrincipal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
     )
 
+    generation = None
+    if settings.auth_cache_enabled:
+        principal, generation = await principal_cache.lookup(token)
+        if principal is not None:
+            return principal
+
     try:
         payload = jwt.decode(token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm])
         username: str | None = payload.get("sub")
@@ -58,13 +97,30 @@ def get_current_user(
     except JWTError as exc:
         raise credentials_exception from exc
 
-    user = db.query(User).filter(User.username == username).first()
+    # Short-lived read session: the connection goes back to the pool before the
+    # route body runs, so a route's own session never waits on this one.
+    async with AsyncReadSessionLocal() as db:
+        user = await db.scalar(select(User).where(User.username == username))
     if user is None:
         raise credentials_exception
 
-    return user
+    principal = UserPrincipal(id=user.id, first_name=user.first_name, username=user.username)
+    if settings.auth_cache_enabled:
+        # Stored under the generation read before the user was loaded, so a
+        # password change that lands in between is not undone.
+        await principal_cache.set(token, principal, expires_at=payload["exp"], generation=generation)
+    return principal
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_principal(mapper, connection, target: User) -> None:
+    # Password or username changes must not keep authenticating via old cache entries.
+    # Tokens carry the username, so a rename also revokes the old name's entries.
+    for username in {target.username, *inspect(target).attrs.username.history.deleted}:
+        invalidate_user_principals(username)
 
 
 @router.get("/me", response_model=UserOut)
-def me(current_user: User = Depends(get_current_user)):
+async def me(current_user: UserPrincipal = Depends(get_current_user)):
     return current_user
@@ -0,0 +1,211 @@
+"""Server-side chat sessions: the client sends only the new message each turn."""
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from typing import List, Set
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import SingleFlight
+from app.core.config import settings
+from app.core.security import UserPrincipal
+from app.core.upstream import Priority
+from app.db.session import AsyncSessionLocal, get_async_db, get_async_read_db
+from app.models.chat import ChatMessage, ChatSession
+from app.routes.ai import (
+    CHAT_SYSTEM_PROMPT,
+    FeatherlessUnavailable,
+    call_featherless,
+    chat_context_prompt,
+    owned_child_context,
+)
+from app.routes.auth import get_current_user
+from app.schemas.chat import ChatSessionCreate, ChatSessionDetail, ChatSessionOut, ChatTurnIn, ChatTurnOut
+from app.services.chat_context import (
+    ChatTurn,
+    assemble_messages,
+    estimate_tokens,
+    fit_turns,
+    prompt_tokens,
+    summary_messages,
+)
+
+router = APIRouter(prefix="/api/ai/chat/sessions", tags=["ai"])
+
+summary_flight = SingleFlight()
+_summary_tasks: Set[asyncio.Task] = set()
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+async def get_owned_session(db: AsyncSession, user_id: int, session_id: str) -> ChatSession:
+    session = await db.get(ChatSession, session_id)
+    if session is None or session.user_id != user_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat session not found")
+    return session
+
+
+async def load_unsummarized_turns(db: AsyncSession, session: ChatSession) -> List[ChatTurn]:
+    rows = await db.execute(
+        select(ChatMessage.role, ChatMessage.content, ChatMessage.tokens, ChatMessage.message_id)
+        .where(
+            ChatMessage.session_id == session.session_id,
+            ChatMessage.message_id > session.summarized_through,
+        )
+        .order_by(ChatMessage.message_id)
+    )
+    return [ChatTurn(*row) for row in rows]
+
+
+async def summarize_session(session_id: str) -> None:
+    """Fold the oldest unsummarized turns into the session summary.
+
+    Keeps the newest turns worth half the history budget verbatim, so the
+    next several turns fit without summarizing again. No connection is held
+    while Featherless writes the summary.
+    """
+    async with AsyncSessionLocal() as db:
+        session = await db.get(ChatSession, session_id)
+        if session is None:
+            return
+        turns = await load_unsummarized_turns(db, session)
+        previous_summary, summarized_through = session.summary, session.summarized_through
+    fold, _keep = fit_turns(turns, settings.chat_history_token_budget // 2)
+    if not fold:
+        return
+    summary = await call_featherless(
+        summary_messages(previous_summary, fold),
+        max_tokens=settings.chat_summary_max_tokens,
+        temperature=0.0,
+        priority=Priority.BACKGROUND,
+    )
+    if not summary.strip():
+        return
+    async with AsyncSessionLocal() as db:
+        # Skipped if another process summarized the session in the meantime.
+        await db.execute(
+            update(ChatSession)
+            .where(ChatSession.session_id == session_id, ChatSession.summarized_through == summarized_through)
+            .values(summary=summary.strip(), summarized_through=fold[-1].message_id)
+        )
+        await db.commit()
+
+
+def schedule_summary(session_id: str) -> None:
+    task = asyncio.ensure_future(summary_flight.do(session_id, lambda: summarize_session(session_id)))
+    _summary_tasks.add(task)
+    # A failed summary is retried on the next turn that overflows.
+    task.add_done_callback(lambda t: _summary_tasks.discard(t) or t.cancelled() or t.exception())
+
+
+@router.post("", response_model=ChatSessionOut, status_code=status.HTTP_201_CREATED)
+async def create_chat_session(
+    payload: ChatSessionCreate,
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    if payload.child_id is not None:
+        # Also warms the child's context cache for the first turn.
+        await owned_child_context(db, current_user, payload.child_id)
+
+    now = utcnow()
+    session = ChatSession(
+        session_id=uuid.uuid4().hex,
+        user_id=current_user.id,
+        child_key=payload.child_id,
+        baby=None if payload.child_id is not None else payload.baby,
+        recent_logs=None if payload.child_id is not None else payload.recent_logs,
+        summarized_through=0,
+        created_at=now,
+        updated_at=now,
+    )
+    db.add(session)
+    await db.commit()
+    return session
+
+
+@router.get("/{session_id}", response_model=ChatSessionDetail)
+async def get_chat_session(
+    session_id: str,
+    limit: int = Query(default=50, ge=1, le=500),
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    session = await get_owned_session(db, current_user.id, session_id)
+    messages = await db.scalars(
+        select(ChatMessage)
+        .where(ChatMessage.session_id == session_id)
+        .order_by(ChatMessage.message_id.desc())
+        .limit(limit)
+    )
+    return ChatSessionDetail(
+        session_id=session.session_id, summary=session.summary, messages=list(reversed(messages.all()))
+    )
+
+
+@router.post("/{session_id}/messages", response_model=ChatTurnOut)
+async def post_chat_message(
+    session_id: str,
+    payload: ChatTurnIn,
+    current_user: UserPrincipal = Depends(get_current_user),
+):
+    """Answer one turn using the session's child context, summary and recent history.
+
+    The session is read and the turn written on two short-lived database
+    sessions, so no connection is held while Featherless answers.
+    """
+    # The primary, not the read engine: a replica could miss the session or its latest turns.
+    async with AsyncSessionLocal() as db:
+        session = await get_owned_session(db, current_user.id, session_id)
+        if session.child_key is not None:
+            context = (await owned_child_context(db, current_user, session.child_key)).prompt
+        else:
+            context = chat_context_prompt(session.baby, session.recent_logs)
+        turns = await load_unsummarized_turns(db, session)
+    messages, overflow = assemble_messages(
+        CHAT_SYSTEM_PROMPT,
+        context,
+        session.summary,
+        turns,
+        payload.message,
+        settings.chat_history_token_budget,
+    )
+
+    try:
+        reply = await call_featherless(messages=messages, max_tokens=220, temperature=0.2)
+    except FeatherlessUnavailable:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Chat generation failed: {str(e)}")
+    reply = reply or "Sorry — I couldn't generate a response."
+
+    now = utcnow()
+    async with AsyncSessionLocal() as db:
+        db.add_all(
+            [
+                ChatMessage(
+                    session_id=session_id,
+                    role="user",
+                    content=payload.message,
+                    tokens=estimate_tokens(payload.message),
+                    created_at=now,
+                ),
+                ChatMessage(
+                    session_id=session_id,
+                    role="assistant",
+                    content=reply,
+                    tokens=estimate_tokens(reply),
+                    created_at=now,
+                ),
+            ]
+        )
+        await db.execute(update(ChatSession).where(ChatSession.session_id == session_id).values(updated_at=now))
+        await db.commit()
+
+    if overflow:
+        schedule_summary(session_id)
+    return ChatTurnOut(session_id=session_id, reply=reply, prompt_tokens=prompt_tokens(messages))
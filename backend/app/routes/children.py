@@ -1,32 +1,55 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from datetime import date, datetime, timedelta, timezone
 
-from app.db.session import get_db
-from app.models.happytummy_schema import DimUser, ParentChild
-from app.models.user import User
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.security import UserPrincipal
+from app.db.session import get_async_db, get_async_read_db
+from app.models.happytummy_schema import ChildDailyRollup, DimUser, ParentChild
 from app.routes.auth import get_current_user
-from app.schemas.children import ChildCreate, ChildOut
+from app.schemas.children import ChildCreate, ChildOut, RecommendationsOut
+from app.schemas.logs import ChildHistoryOut, DailyRollupOut, LogBatchIn, LogBatchOut, LogEventOut, RollupWindowOut
+from app.services.dimensions import dimension_registry
+from app.services.history_export import MEDIA_TYPES, ExportFormat, export_chunks, gzip_chunks
+from app.services.log_events import GROUP_BY_KIND, KIND_NAMES, child_history
+from app.services.log_ingest import ingest_log_batch
+from app.services.recommendations import recommend_for_child
 
 router = APIRouter()
 
+
+async def get_owned_child(db: AsyncSession, parent_user_id: int, child_key: int) -> DimUser:
+    child = await db.scalar(
+        select(DimUser)
+        .join(ParentChild, ParentChild.child_user_key == DimUser.user_key)
+        .where(ParentChild.parent_user_id == parent_user_id, DimUser.user_key == child_key)
+    )
+    if child is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Child not found")
+    return child
+
+
 @router.get("/children", response_model=list[ChildOut])
-def list_children(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+async def list_children(
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
-    return (
-        db.query(DimUser)
+    result = await db.scalars(
+        select(DimUser)
         .join(ParentChild, ParentChild.child_user_key == DimUser.user_key)
-        .filter(ParentChild.parent_user_id == current_user.id)
-        .all()
+        .where(ParentChild.parent_user_id == current_user.id)
     )
+    return result.all()
 
 
 @router.post("/children", response_model=ChildOut)
-def create_child(
+async def create_child(
     payload: ChildCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     if payload.parent_consent is not True:
         raise HTTPException(
@@ -47,10 +70,126 @@ def create_child(
         parent_consent=payload.parent_consent
     )
     db.add(child)
-    db.flush()
+    await db.flush()
 
     link = ParentChild(parent_user_id=current_user.id, child_user_key=child.user_key)
     db.add(link)
-    db.commit()
-    db.refresh(child)
-    return child
\ No newline at end of file
+    await db.commit()
+    await db.refresh(child)
+    return child
+
+
+@router.post("/children/{child_id}/logs:batch", response_model=LogBatchOut)
+async def ingest_child_logs(
+    child_id: int,
+    payload: LogBatchIn,
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    if len(payload.entries) > settings.log_batch_max_entries:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.log_batch_max_entries} entries per batch",
+        )
+
+    await get_owned_child(db, current_user.id, child_id)
+    return await ingest_log_batch(db, child_id, payload.entries)
+
+
+@router.get("/children/{child_id}/rollups", response_model=RollupWindowOut)
+async def get_child_rollups(
+    child_id: int,
+    days: int = Query(default=7, ge=1, le=90),
+    end: date | None = None,
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """Daily totals for the last ``days`` days (UTC) ending at ``end``, one entry per day."""
+    await get_owned_child(db, current_user.id, child_id)
+
+    end = end or datetime.now(timezone.utc).date()
+    start = end - timedelta(days=days - 1)
+    rollups = await db.scalars(
+        select(ChildDailyRollup).where(
+            ChildDailyRollup.user_key == child_id,
+            ChildDailyRollup.day >= start,
+            ChildDailyRollup.day <= end,
+        )
+    )
+    by_day = {rollup.day: rollup for rollup in rollups}
+    return RollupWindowOut(
+        start=start,
+        end=end,
+        days=[
+            DailyRollupOut.model_validate(by_day[day]) if day in by_day else DailyRollupOut(day=day)
+            for day in (start + timedelta(days=offset) for offset in range(days))
+        ],
+    )
+
+
+@router.get("/children/{child_id}/history", response_model=ChildHistoryOut)
+async def get_child_history(
+    child_id: int,
+    days: int = Query(default=7, ge=1, le=90),
+    end: datetime | None = None,
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """Every food and symptom value logged in the ``days`` days before ``end`` (UTC), oldest first."""
+    await get_owned_child(db, current_user.id, child_id)
+
+    if end is None:
+        end = datetime.now(timezone.utc).replace(tzinfo=None)
+    elif end.tzinfo is not None:
+        end = end.astimezone(timezone.utc).replace(tzinfo=None)
+    start = end - timedelta(days=days)
+    dimensions = dimension_registry.current()
+    events = []
+    for event in await child_history(db, child_id, start, end):
+        group = GROUP_BY_KIND.get(event["kind"])
+        events.append(
+            LogEventOut(
+                logged_at=event["logged_at"],
+                kind=KIND_NAMES[event["kind"]],
+                item=dimensions.name_of(group, event["item_key"]) if group else None,
+                quantity=event["quantity"],
+            )
+        )
+    return ChildHistoryOut(start=start, end=end, events=events)
+
+
+@router.get("/children/{child_id}/export")
+async def export_child_history(
+    child_id: int,
+    export_format: ExportFormat = Query(default="csv", alias="format"),
+    gzip: bool = False,
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """The child's whole log history as a streamed CSV or NDJSON download.
+
+    Entries logged before timestamps were recorded come first, with an empty ``logged_at``.
+    """
+    await get_owned_child(db, current_user.id, child_id)
+
+    chunks = export_chunks(child_id, export_format)
+    filename = f"child-{child_id}-history.{export_format}"
+    media_type = MEDIA_TYPES[export_format]
+    if gzip:
+        chunks, filename, media_type = gzip_chunks(chunks), f"{filename}.gz", "application/gzip"
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/children/{child_id}/recommendations", response_model=RecommendationsOut)
+async def get_child_recommendations(
+    child_id: int,
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """Foods to try and avoid today, scored from the child's recent logs."""
+    await get_owned_child(db, current_user.id, child_id)
+    return await recommend_for_child(db, child_id)
@@ -0,0 +1,42 @@
+from datetime import datetime
+from typing import Any, Literal
+
+from pydantic import BaseModel, Field
+
+
+class ChatSessionCreate(BaseModel):
+    # With child_id, the profile and logs come from the child's records instead.
+    child_id: int | None = None
+    baby: dict[str, Any] | None = None
+    recent_logs: list[Any] | None = None
+
+
+class ChatSessionOut(BaseModel):
+    session_id: str
+    created_at: datetime
+
+    model_config = {"from_attributes": True}
+
+
+class ChatTurnIn(BaseModel):
+    message: str = Field(min_length=1, max_length=4000)
+
+
+class ChatTurnOut(BaseModel):
+    session_id: str
+    reply: str
+    prompt_tokens: int
+
+
+class ChatMessageOut(BaseModel):
+    role: Literal["user", "assistant"]
+    content: str
+    created_at: datetime
+
+    model_config = {"from_attributes": True}
+
+
+class ChatSessionDetail(BaseModel):
+    session_id: str
+    summary: str | None
+    messages: list[ChatMessageOut]
@@ -28,3 +28,9 @@ class ChildOut(BaseModel):
     parent_consent: bool
 
     model_config = {"from_attributes": True}
+
+
+class RecommendationsOut(BaseModel):
+    try_today: list[str]
+    avoid_today: list[str]
+    habit_tip: str
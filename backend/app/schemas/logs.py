@@ -0,0 +1,65 @@
+from datetime import date, datetime
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+
+class LogEntryIn(BaseModel):
+    entry_id: str = Field(min_length=1, max_length=64)
+    kind: Literal["food", "milk", "symptom"]
+    logged_at: datetime | None = None
+    # food / milk
+    name: str | None = Field(default=None, max_length=50)
+    food_group: Literal["carb", "meat", "fruit", "veg"] | None = None
+    quantity: float | None = Field(default=None, ge=0)
+    # symptom
+    water_oz: int | None = Field(default=None, ge=0)
+    fruit_intake: int | None = Field(default=None, ge=0)
+    stool: int | None = None
+
+
+class LogBatchIn(BaseModel):
+    entries: list[LogEntryIn] = Field(min_length=1)
+
+
+class LogBatchOut(BaseModel):
+    received: int
+    inserted: int
+    duplicates: int
+    unresolved: list[str]
+
+
+class DailyRollupOut(BaseModel):
+    day: date
+    carb_fiber: float = 0
+    meat_fiber: float = 0
+    fruit_fiber: float = 0
+    veg_fiber: float = 0
+    milk_fiber: float = 0
+    water_oz: int = 0
+    fruit_intake: int = 0
+    stool_total: int = 0
+    stool_count: int = 0
+    entry_count: int = 0
+
+    model_config = {"from_attributes": True}
+
+
+class RollupWindowOut(BaseModel):
+    start: date
+    end: date
+    days: list[DailyRollupOut]
+
+
+class LogEventOut(BaseModel):
+    logged_at: datetime
+    kind: str
+    # Food name for food events; None for symptom values.
+    item: str | None = None
+    quantity: float | None = None
+
+
+class ChildHistoryOut(BaseModel):
+    start: datetime
+    end: datetime
+    events: list[LogEventOut]
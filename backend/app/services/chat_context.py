@@ -0,0 +1,127 @@
+"""Token-budgeted prompt assembly for chat.
+
+Token counts are estimated (about four characters per token plus a small
+per-message overhead) rather than computed with the model's tokenizer; the
+budget only needs to be right to within a few percent.
+"""
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_SYSTEM_PROMPT = """
+You maintain the running memory of a chat between a parent and Happy Tummy AI,
+a baby digestion support assistant. Merge the previous summary and the new
+messages into one short summary for continuing the conversation. Keep facts
+about the baby, symptoms and foods mentioned, advice already given and open
+questions. Plain text, at most 120 words.
+""".strip()
+
+
+@dataclass(frozen=True, slots=True)
+class ChatTurn:
+    role: str
+    content: str
+    tokens: int
+    message_id: int = 0
+
+    def as_message(self) -> Dict[str, str]:
+        return {"role": self.role, "content": self.content}
+
+
+def estimate_tokens(text: str) -> int:
+    return MESSAGE_OVERHEAD_TOKENS + (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def trim_logs(logs: Optional[Sequence[Any]], budget: int) -> List[Any]:
+    """Most recent logs (the end of the list) whose JSON fits in ``budget`` tokens."""
+    kept: List[Any] = []
+    used = 0
+    for log in reversed(logs or []):
+        cost = estimate_tokens(json.dumps(log))
+        if used + cost > budget:
+            break
+        kept.append(log)
+        used += cost
+    kept.reverse()
+    return kept
+
+
+def context_prompt(baby: Optional[Dict[str, Any]], recent_logs: Optional[Sequence[Any]], logs_budget: int) -> str:
+    """Baby profile plus as many recent logs as fit ``logs_budget`` tokens."""
+    safe_logs = trim_logs(recent_logs if isinstance(recent_logs, list) else [], logs_budget)
+    return f"""
+BABY PROFILE:
+{json.dumps(baby or {})}
+
+RECENT DIGESTION LOGS (most recent last):
+{json.dumps(safe_logs)}
+""".strip()
+
+
+def fit_turns(turns: Sequence[ChatTurn], budget: int) -> Tuple[List[ChatTurn], List[ChatTurn]]:
+    """Split ``turns`` (oldest first) into ``(older overflow, newest that fit in budget)``."""
+    used = 0
+    start = len(turns)
+    while start > 0 and used + turns[start - 1].tokens <= budget:
+        start -= 1
+        used += turns[start].tokens
+    return list(turns[:start]), list(turns[start:])
+
+
+def turns_from_messages(conversation: Optional[Sequence[Dict[str, str]]]) -> List[ChatTurn]:
+    """Client-supplied ``[{role, content}]`` history as turns, dropping malformed entries."""
+    turns = []
+    for message in conversation or []:
+        if not isinstance(message, dict):
+            continue
+        role, content = message.get("role"), message.get("content")
+        if role in ("user", "assistant") and isinstance(content, str):
+            turns.append(ChatTurn(role, content, estimate_tokens(content)))
+    return turns
+
+
+def assemble_messages(
+    system_prompt: str,
+    context_prompt: str,
+    summary: Optional[str],
+    turns: Sequence[ChatTurn],
+    user_message: str,
+    history_budget: int,
+) -> Tuple[List[Dict[str, str]], List[ChatTurn]]:
+    """Prompt for one chat turn plus the turns that did not fit.
+
+    The summary (if any) is charged against ``history_budget`` first and
+    the newest turns fill the rest; the system/context prompts and the new
+    user message are always included.
+    """
+    summary_message = None
+    if summary:
+        summary_message = {"role": "system", "content": f"CONVERSATION SO FAR (summary):\n{summary}"}
+        history_budget -= estimate_tokens(summary_message["content"])
+    overflow, kept = fit_turns(turns, max(0, history_budget))
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "system", "content": context_prompt},
+        *([summary_message] if summary_message else []),
+        *(turn.as_message() for turn in kept),
+        {"role": "user", "content": user_message},
+    ]
+    return messages, overflow
+
+
+def summary_messages(previous_summary: Optional[str], turns: Sequence[ChatTurn]) -> List[Dict[str, str]]:
+    transcript = "\n".join(f"{turn.role.upper()}: {turn.content}" for turn in turns)
+    return [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": f"PREVIOUS SUMMARY:\n{previous_summary or '(none)'}\n\nNEW MESSAGES:\n{transcript}",
+        },
+    ]
+
+
+def prompt_tokens(messages: Sequence[Dict[str, str]]) -> int:
+    return sum(estimate_tokens(message["content"]) for message in messages)
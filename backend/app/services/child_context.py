@@ -0,0 +1,175 @@
+"""Chat and coach context for a child, built from the database.
+
+One prebuilt query checks that the parent owns the child, loads the
+``DimUser`` profile and the child's most recent ``FactSystem`` entries. The
+serialized result is cached per (child, parent) in the shared cache. Log
+ingestion calls ``invalidate`` so the next prompt sees the new entries. With
+a ``sqlite`` or ``redis`` cache backend that reaches every worker; with
+``memory``, other workers pick them up when their entry expires.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+from sqlalchemy import bindparam, func, select, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.core.cache import SharedCache
+from app.core.cache_backends import cache_backend
+from app.core.config import settings
+from app.models.happytummy_schema import DimSymptom1, DimSymptom2, DimUser, FactSystem, ParentChild
+from app.services.chat_context import context_prompt
+from app.services.dimensions import DimensionSnapshot, dimension_registry
+from app.services.rollups import FACT_COLUMNS_BY_GROUP
+
+# DimUser column -> key in the prompt's BABY PROFILE block.
+PROFILE_FIELDS = {
+    "Name": "name",
+    "Age": "age",
+    "Gender": "gender",
+    "Weight": "weight",
+    "Allergies": "allergies",
+    "EarlyBorn": "earlyBorn",
+    "DeliveryMethod": "deliveryMethod",
+    "EnviChange": "enviChange",
+}
+
+_symptom2 = aliased(DimSymptom2)
+_recent_facts = (
+    select(
+        FactSystem.c.LoggedAt,
+        *(FactSystem.c[key_column] for key_column, _quantity in FACT_COLUMNS_BY_GROUP.values()),
+        *(FactSystem.c[quantity_column] for _key, quantity_column in FACT_COLUMNS_BY_GROUP.values()),
+        func.coalesce(DimSymptom1.water_oz1, _symptom2.water_oz2).label("WaterOz"),
+        func.coalesce(DimSymptom1.fruit_intake1, _symptom2.fruit_intake2).label("FruitIntake"),
+        func.coalesce(DimSymptom1.stool1, _symptom2.stool2).label("Stool"),
+    )
+    .outerjoin(DimSymptom1, DimSymptom1.symptom1_key == FactSystem.c.Symptom1Key)
+    .outerjoin(_symptom2, _symptom2.symptom2_key == FactSystem.c.Symptom2Key)
+    .where(FactSystem.c.UserKey == bindparam("child_key"))
+    .order_by(FactSystem.c.LoggedAt.desc())
+    .limit(bindparam("log_limit"))
+    .subquery("recent")
+)
+
+PROFILE_QUERY = select(*(DimUser.__table__.c[column] for column in PROFILE_FIELDS)).where(
+    DimUser.user_key == bindparam("child_key")
+)
+
+# Zero rows when the parent does not own the child; otherwise one row per
+# recent entry (or a single row with NULL log columns when there are none).
+CHILD_CONTEXT_QUERY = (
+    select(*(DimUser.__table__.c[column] for column in PROFILE_FIELDS), _recent_facts)
+    .select_from(DimUser)
+    .join(ParentChild, ParentChild.child_user_key == DimUser.user_key)
+    .outerjoin(_recent_facts, true())
+    .where(ParentChild.parent_user_id == bindparam("parent_user_id"), DimUser.user_key == bindparam("child_key"))
+    .order_by(_recent_facts.c.LoggedAt)
+)
+
+
+@dataclass(frozen=True, slots=True)
+class ChildContext:
+    baby: Dict[str, Any]
+    recent_logs: List[Dict[str, Any]]
+    prompt: str
+
+
+def serialize_log(row: Mapping[str, Any], dimensions: DimensionSnapshot) -> Optional[Dict[str, Any]]:
+    foods = []
+    for group, (key_column, quantity_column) in FACT_COLUMNS_BY_GROUP.items():
+        key = row[key_column]
+        if key is None:
+            continue
+        name = dimensions.name_of(group, key) or f"{group} #{key}"
+        quantity = row[quantity_column]
+        foods.append(f"{name} x{quantity}" if quantity not in (None, "") else name)
+    symptoms = {
+        field: row[column]
+        for column, field in (("WaterOz", "waterOz"), ("FruitIntake", "fruitIntake"), ("Stool", "stool"))
+        if row[column] is not None
+    }
+    if not foods and not symptoms:
+        # Also the NULL row produced when the child has no entries at all.
+        return None
+    log: Dict[str, Any] = {}
+    if isinstance(row["LoggedAt"], datetime):
+        log["loggedAt"] = row["LoggedAt"].isoformat(timespec="minutes")
+    if foods:
+        log["foods"] = foods
+    return {**log, **symptoms}
+
+
+def baby_profile(row: Mapping[str, Any]) -> Dict[str, Any]:
+    return {field: row[column] for column, field in PROFILE_FIELDS.items() if row[column] is not None}
+
+
+async def load_baby_profile(db: AsyncSession, child_key: int) -> Optional[Dict[str, Any]]:
+    """The BABY PROFILE dict for ``child_key`` without an ownership check (for background jobs)."""
+    row = (await db.execute(PROFILE_QUERY, {"child_key": child_key})).mappings().first()
+    return baby_profile(row) if row is not None else None
+
+
+def build_child_context(rows: Sequence[Mapping[str, Any]]) -> ChildContext:
+    baby = baby_profile(rows[0])
+    dimensions = dimension_registry.current()
+    logs = [log for log in (serialize_log(row, dimensions) for row in rows) if log is not None]
+    return ChildContext(baby, logs, context_prompt(baby, logs, settings.chat_logs_token_budget))
+
+
+class ChildContextCache:
+    """Per-child context cache with O(1) invalidation.
+
+    Each child is a scope of the shared cache; ``invalidate`` bumps its
+    generation, so every cached entry for that child (one per parent) stops
+    matching at once and ages out.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float) -> None:
+        self._cache = SharedCache(
+            "context",
+            cache_backend(max_entries),
+            ttl_seconds,
+            encode=lambda context: (context.baby, context.recent_logs, context.prompt),
+            decode=lambda fields: ChildContext(*fields),
+        )
+        self.invalidations = 0
+
+    async def invalidate(self, child_key: int) -> None:
+        await self._cache.invalidate(scope=str(child_key))
+        self.invalidations += 1
+
+    async def get(self, db: AsyncSession, parent_user_id: int, child_key: int) -> Optional[ChildContext]:
+        """Context for ``child_key``, or ``None`` if ``parent_user_id`` does not own it."""
+        # The generation is read before the query: if logs arrive meanwhile,
+        # this result is stored under the old generation and is never served.
+        scope = str(child_key)
+        cached, generation = await self._cache.lookup(str(parent_user_id), scope)
+        if cached is not None:
+            return cached
+        result = await db.execute(
+            CHILD_CONTEXT_QUERY,
+            {
+                "parent_user_id": parent_user_id,
+                "child_key": child_key,
+                "log_limit": settings.child_context_log_limit,
+            },
+        )
+        rows = result.mappings().all()
+        if not rows:
+            return None
+        context = build_child_context(rows)
+        await self._cache.set(str(parent_user_id), context, scope=scope, generation=generation)
+        return context
+
+    async def clear(self) -> None:
+        await self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._cache.stats(), "invalidations": self.invalidations}
+
+
+child_context_cache = ChildContextCache(
+    settings.child_context_cache_max_entries, settings.child_context_cache_ttl_seconds
+)
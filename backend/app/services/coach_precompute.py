@@ -0,0 +1,86 @@
+"""Nightly precomputation of coach messages.
+
+``coach.nightly`` runs once a day from ``COACH_PRECOMPUTE_HOUR_UTC`` and fans
+out one ``coach.precompute`` job per child with logs in the last
+``COACH_PRECOMPUTE_ACTIVE_DAYS`` days. Each of those builds the same inputs
+``/api/ai/children/{id}/coach`` would (stored profile, server-side
+recommendations, no insights) and stores the response in ``CoachResult``
+under the hash of those inputs. The route serves it directly while the
+inputs still hash the same; new logs change the recommendations and
+therefore the hash, which sends that child back to live generation.
+
+Upstream load stays bounded by ``JOBS_CONCURRENCY`` per worker and by the
+Featherless scheduler, where these calls run at background priority.
+"""
+from datetime import timedelta
+from typing import Any, Dict
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.coach import CoachResult
+from app.models.happytummy_schema import FactSystem
+from app.routes.ai import FeatherlessUnavailable, coach_cache_key, generate_coach_message, load_precomputed_coach
+from app.services.child_context import load_baby_profile
+from app.services.jobs import RetryLater, daily_job, enqueue, job_handler, job_row, utcnow
+from app.services.recommendations import recommend_for_child
+
+FANOUT_CHUNK = 5_000
+
+
+@daily_job("coach.nightly", settings.coach_precompute_hour_utc)
+@job_handler("coach.nightly")
+async def enqueue_active_children(payload: Dict[str, Any]) -> None:
+    now = utcnow()
+    since = now - timedelta(days=settings.coach_precompute_active_days)
+    async with AsyncSessionLocal() as db:
+        child_keys = list(
+            await db.scalars(
+                select(FactSystem.c.UserKey)
+                .where(FactSystem.c.UserKey.is_not(None), FactSystem.c.LoggedAt >= since)
+                .distinct()
+            )
+        )
+        for start in range(0, len(child_keys), FANOUT_CHUNK):
+            await enqueue(
+                db,
+                [
+                    job_row("coach.precompute", {"child_key": key}, dedup_key=f"coach.precompute:{key}:{now.date()}")
+                    for key in child_keys[start : start + FANOUT_CHUNK]
+                ],
+            )
+        await db.commit()
+
+
+@job_handler("coach.precompute")
+async def precompute_coach(payload: Dict[str, Any]) -> None:
+    child_key = int(payload["child_key"])
+    async with AsyncSessionLocal() as db:
+        baby = await load_baby_profile(db, child_key)
+        if baby is None:
+            return
+        recommendations = await recommend_for_child(db, child_key)
+        key = coach_cache_key(baby, None, recommendations)
+        if await load_precomputed_coach(db, key) is not None:
+            # Nothing changed since the last run; keep the stored answer.
+            return
+
+    try:
+        result = await generate_coach_message(baby, None, recommendations)
+    except FeatherlessUnavailable as e:
+        raise RetryLater(str(e.detail), float(e.headers["Retry-After"]))
+    if result.get("parseError"):
+        raise RuntimeError("coach response was not valid JSON")
+
+    now = utcnow()
+    async with AsyncSessionLocal() as db:
+        await db.merge(
+            CoachResult(
+                user_key=child_key,
+                input_hash=key,
+                result={**result, "generatedAt": now.isoformat(timespec="seconds") + "Z"},
+                generated_at=now,
+            )
+        )
+        await db.commit()
@@ -0,0 +1,191 @@
+"""In-memory registry of the food dimension tables.
+
+``DimCarb``, ``DimFruit``, ``DimVeg``, ``DimMeat``, ``DimMilk1`` and
+``DimMilk2`` are small and read on almost every request. They are loaded
+once at startup into an immutable, versioned ``DimensionSnapshot`` with
+O(1) lookups by key, by ID and by normalized name. Readers take
+``dimension_registry.current()`` once and get a consistent view for as long
+as they hold it, without locking.
+
+Commits that touch a food row build a new snapshot (copy-on-write) and swap
+it in with a single assignment. Subscribers such as the food search index
+are told about each swap. Other worker processes pick up the change on
+their next restart or ``load``.
+
+``DimSymptom1``/``DimSymptom2`` are not included: log ingestion writes one
+row per symptom entry, so they grow with ``FactSystem`` and stay in SQL.
+"""
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app.models.happytummy_schema import DimCarb, DimFruit, DimMeat, DimMilk1, DimMilk2, DimVeg
+
+# group -> (model, key attr, id attr, food attr, fiber attr)
+FOOD_GROUPS: Dict[str, tuple] = {
+    "carb": (DimCarb, "carb_key", "carb_id", "carb_food", "carb_fiber"),
+    "fruit": (DimFruit, "fruit_key", "fruit_id", "fruit_food", "fruit_fiber"),
+    "veg": (DimVeg, "veg_key", "veg_id", "veg_food", "veg_fiber"),
+    "meat": (DimMeat, "meat_key", "meat_id", "meat_food", "meat_fiber"),
+    "milk1": (DimMilk1, "milk1_key", "milk1_id", "milk1_food", "milk1_fiber"),
+    "milk2": (DimMilk2, "milk2_key", "milk2_id", "milk2_food", "milk2_fiber"),
+}
+_GROUP_BY_MODEL = {spec[0]: group for group, spec in FOOD_GROUPS.items()}
+
+
+@dataclass(frozen=True, slots=True)
+class FoodEntry:
+    group: str
+    key: int
+    food_id: Optional[int]
+    name: str
+    fiber: Optional[int]
+
+    @property
+    def ref(self) -> tuple[str, int]:
+        return self.group, self.key
+
+
+# (group, key, entry); entry is None for a deleted row.
+FoodChange = Tuple[str, int, Optional[FoodEntry]]
+
+
+def normalize_name(name: str) -> str:
+    return " ".join("".join(ch if ch.isalnum() else " " for ch in name.lower()).split())
+
+
+def entry_from_row(group: str, row: Any) -> Optional[FoodEntry]:
+    _, key_attr, id_attr, food_attr, fiber_attr = FOOD_GROUPS[group]
+    name = getattr(row, food_attr)
+    if not name or not normalize_name(name):
+        return None
+    return FoodEntry(group, getattr(row, key_attr), getattr(row, id_attr), name, getattr(row, fiber_attr))
+
+
+class DimensionSnapshot:
+    """One immutable version of the food dimensions."""
+
+    __slots__ = ("version", "entries", "_by_id", "_by_name")
+
+    def __init__(self, version: int, entries: Iterable[FoodEntry]) -> None:
+        ordered = sorted(entries, key=lambda entry: entry.ref)
+        by_id: Dict[tuple[str, int], FoodEntry] = {}
+        by_name: Dict[str, List[FoodEntry]] = {}
+        for entry in ordered:
+            if entry.food_id is not None:
+                by_id.setdefault((entry.group, entry.food_id), entry)
+            by_name.setdefault(normalize_name(entry.name), []).append(entry)
+        self.version = version
+        self.entries: Mapping[tuple[str, int], FoodEntry] = MappingProxyType({e.ref: e for e in ordered})
+        self._by_id: Mapping[tuple[str, int], FoodEntry] = MappingProxyType(by_id)
+        self._by_name: Mapping[str, tuple[FoodEntry, ...]] = MappingProxyType(
+            {name: tuple(matches) for name, matches in by_name.items()}
+        )
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, group: str, key: int) -> Optional[FoodEntry]:
+        return self.entries.get((group, key))
+
+    def by_id(self, group: str, food_id: int) -> Optional[FoodEntry]:
+        return self._by_id.get((group, food_id))
+
+    def resolve(self, name: str, groups: Optional[Sequence[str]] = None) -> Optional[FoodEntry]:
+        """Exact (normalized) name match, optionally restricted to some food groups."""
+        for entry in self._by_name.get(normalize_name(name), ()):
+            if groups is None or entry.group in groups:
+                return entry
+        return None
+
+    def fiber_of(self, group: str, key: int) -> Optional[int]:
+        entry = self.entries.get((group, key))
+        return entry.fiber if entry is not None else None
+
+    def name_of(self, group: str, key: int) -> Optional[str]:
+        entry = self.entries.get((group, key))
+        return entry.name if entry is not None else None
+
+
+# Called with the new snapshot and the changes that produced it (None after a full load).
+Subscriber = Callable[[DimensionSnapshot, Optional[Sequence[FoodChange]]], None]
+
+
+class DimensionRegistry:
+    def __init__(self) -> None:
+        self._snapshot = DimensionSnapshot(0, ())
+        # Serializes writers only; readers just read ``_snapshot``.
+        self._lock = threading.Lock()
+        self._subscribers: List[Subscriber] = []
+        self.loaded = False
+
+    def current(self) -> DimensionSnapshot:
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def subscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.append(subscriber)
+
+    def _swap(self, entries: Iterable[FoodEntry], changes: Optional[Sequence[FoodChange]]) -> None:
+        # Caller holds the lock.
+        snapshot = DimensionSnapshot(self._snapshot.version + 1, entries)
+        self._snapshot = snapshot
+        for subscriber in self._subscribers:
+            subscriber(snapshot, changes)
+
+    def load(self, db: Session) -> None:
+        """Read every food table and swap in a fresh snapshot; used at startup."""
+        entries = []
+        for group, (model, *_rest) in FOOD_GROUPS.items():
+            for row in db.scalars(select(model)):
+                entry = entry_from_row(group, row)
+                if entry is not None:
+                    entries.append(entry)
+        with self._lock:
+            self._swap(entries, None)
+            self.loaded = True
+
+    def apply(self, changes: Sequence[FoodChange]) -> None:
+        with self._lock:
+            entries = dict(self._snapshot.entries)
+            for group, key, entry in changes:
+                entries.pop((group, key), None)
+                if entry is not None:
+                    entries[entry.ref] = entry
+            self._swap(entries.values(), changes)
+
+
+dimension_registry = DimensionRegistry()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_food_changes(session: Session, flush_context: Any) -> None:
+    # Snapshot rows now: after commit they are expired and can't be read without SQL.
+    pending = session.info.setdefault("food_dimension_changes", [])
+    for obj in (*session.new, *session.dirty):
+        group = _GROUP_BY_MODEL.get(type(obj))
+        if group is not None:
+            pending.append((group, getattr(obj, FOOD_GROUPS[group][1]), entry_from_row(group, obj)))
+    for obj in session.deleted:
+        group = _GROUP_BY_MODEL.get(type(obj))
+        if group is not None:
+            pending.append((group, getattr(obj, FOOD_GROUPS[group][1]), None))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_food_changes(session: Session) -> None:
+    changes = session.info.pop("food_dimension_changes", None)
+    if changes and dimension_registry.loaded:
+        dimension_registry.apply(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_food_changes(session: Session) -> None:
+    session.info.pop("food_dimension_changes", None)
@@ -0,0 +1,139 @@
+"""Offline food search over the Dim* food tables.
+
+An in-process index with word-prefix autocomplete and trigram typo tolerance.
+It follows ``dimension_registry``: rebuilt when the registry is loaded and
+updated incrementally for each committed change to a food row, so edits
+show up without a full rebuild.
+"""
+import bisect
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from app.services.dimensions import DimensionSnapshot, FoodChange, FoodEntry, dimension_registry, normalize_name
+
+MIN_TRIGRAM_SIMILARITY = 0.3
+
+
+def trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class FoodSearchIndex:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: Dict[tuple[str, int], FoodEntry] = {}
+        self._grams: Dict[tuple[str, int], set[str]] = {}
+        self._postings: Dict[str, set[tuple[str, int]]] = {}
+        # Sorted (word, ref) pairs for word-prefix lookups via bisect.
+        self._words: List[tuple[str, tuple[str, int]]] = []
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _add(self, entry: FoodEntry) -> None:
+        ref = entry.ref
+        normalized = normalize_name(entry.name)
+        grams = trigrams(normalized)
+        self._entries[ref] = entry
+        self._grams[ref] = grams
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(ref)
+        for word in set(normalized.split()):
+            bisect.insort(self._words, (word, ref))
+
+    def _remove(self, ref: tuple[str, int]) -> None:
+        entry = self._entries.pop(ref, None)
+        if entry is None:
+            return
+        for gram in self._grams.pop(ref):
+            refs = self._postings[gram]
+            refs.discard(ref)
+            if not refs:
+                del self._postings[gram]
+        normalized = normalize_name(entry.name)
+        for word in set(normalized.split()):
+            i = bisect.bisect_left(self._words, (word, ref))
+            if i < len(self._words) and self._words[i] == (word, ref):
+                del self._words[i]
+
+    def upsert(self, entry: FoodEntry) -> None:
+        with self._lock:
+            self._remove(entry.ref)
+            self._add(entry)
+
+    def remove(self, group: str, key: int) -> None:
+        with self._lock:
+            self._remove((group, key))
+
+    def rebuild(self, entries: Sequence[FoodEntry]) -> None:
+        fresh = FoodSearchIndex()
+        for entry in entries:
+            fresh._add(entry)
+        with self._lock:
+            self._entries, self._grams = fresh._entries, fresh._grams
+            self._postings, self._words = fresh._postings, fresh._words
+            self.loaded = True
+
+    def follow(self, snapshot: DimensionSnapshot, changes: Optional[Sequence[FoodChange]]) -> None:
+        """``dimension_registry`` subscriber."""
+        if changes is None:
+            self.rebuild(list(snapshot.entries.values()))
+            return
+        for group, key, entry in changes:
+            if entry is None:
+                self.remove(group, key)
+            else:
+                self.upsert(entry)
+
+    def search(self, query: str, limit: int = 5) -> List[FoodEntry]:
+        """Word-prefix matches first, then trigram-similar names for typos."""
+        normalized = normalize_name(query)
+        if not normalized:
+            return []
+        words = normalized.split()
+        with self._lock:
+            prefix_hits: Optional[set[tuple[str, int]]] = None
+            for word in words:
+                refs = set()
+                i = bisect.bisect_left(self._words, (word,))
+                while i < len(self._words) and self._words[i][0].startswith(word):
+                    refs.add(self._words[i][1])
+                    i += 1
+                prefix_hits = refs if prefix_hits is None else prefix_hits & refs
+            ranked = sorted(prefix_hits or (), key=lambda ref: (len(self._entries[ref].name), ref))
+
+            if len(ranked) < limit:
+                query_grams = trigrams(normalized)
+                overlap: Dict[tuple[str, int], int] = {}
+                for gram in query_grams:
+                    for ref in self._postings.get(gram, ()):
+                        overlap[ref] = overlap.get(ref, 0) + 1
+                seen = set(ranked)
+                fuzzy = []
+                for ref, shared in overlap.items():
+                    if ref in seen:
+                        continue
+                    similarity = shared / (len(query_grams) + len(self._grams[ref]) - shared)
+                    if similarity >= MIN_TRIGRAM_SIMILARITY:
+                        fuzzy.append((-similarity, len(self._entries[ref].name), ref))
+                ranked.extend(ref for *_rank, ref in sorted(fuzzy))
+
+            results: List[FoodEntry] = []
+            names = set()
+            for ref in ranked:
+                entry = self._entries[ref]
+                # DimMilk1/DimMilk2 duplicate each other; show each food once.
+                name = normalize_name(entry.name)
+                if name in names:
+                    continue
+                names.add(name)
+                results.append(entry)
+                if len(results) == limit:
+                    break
+            return results
+
+
+food_index = FoodSearchIndex()
+dimension_registry.subscribe(food_index.follow)
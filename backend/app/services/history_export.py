@@ -0,0 +1,97 @@
+"""Streamed CSV / NDJSON export of a child's full log history.
+
+Rows come from ``LogEvent`` in ``(UserKey, LoggedAt)`` index order through
+``AsyncSession.stream`` with ``yield_per``. They are preceded by the
+child's facts that have no ``LoggedAt`` (from before migration 3), which
+``LogEvent`` does not hold; those are read from ``FactSystem`` and exported
+with an empty ``logged_at``. Each batch of
+``EXPORT_BATCH_ROWS`` rows is formatted (and optionally gzip-compressed) and
+handed to the response before the next one is fetched. Memory therefore
+depends on the batch size, not on the length of the history.
+"""
+import csv
+import io
+import json
+import zlib
+from typing import AsyncIterator, Iterable, List, Literal, Sequence
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.session import AsyncReadSessionLocal
+from app.models.happytummy_schema import FactSystem, LogEvent
+from app.services.dimensions import dimension_registry
+from app.services.log_events import GROUP_BY_KIND, KIND_NAMES, fact_events
+
+ExportFormat = Literal["csv", "ndjson"]
+EXPORT_COLUMNS = ("logged_at", "kind", "item", "quantity")
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+
+def untimed_export_query(dialect_name: str, child_key: int):
+    events = fact_events(dialect_name, FactSystem.c.UserKey == child_key, FactSystem.c.LoggedAt.is_(None)).subquery()
+    return select(events.c.LoggedAt, events.c.Kind, events.c.ItemKey, events.c.Quantity).execution_options(
+        yield_per=settings.export_batch_rows
+    )
+
+
+def export_query(child_key: int):
+    return (
+        select(LogEvent.logged_at, LogEvent.kind, LogEvent.item_key, LogEvent.quantity)
+        .where(LogEvent.user_key == child_key)
+        .order_by(LogEvent.logged_at, LogEvent.event_id)
+        .execution_options(yield_per=settings.export_batch_rows)
+    )
+
+
+async def export_batches(child_key: int) -> AsyncIterator[List[tuple]]:
+    """``EXPORT_COLUMNS`` tuples, one ``yield_per`` batch at a time: untimed facts, then oldest first."""
+    dimensions = dimension_registry.current()
+    # A session of its own: the request's session is closed once the route returns.
+    async with AsyncReadSessionLocal() as db:
+        for query in (untimed_export_query(db.bind.dialect.name, child_key), export_query(child_key)):
+            result = await db.stream(query)
+            async for partition in result.partitions():
+                batch = []
+                for logged_at, kind, item_key, quantity in partition:
+                    group = GROUP_BY_KIND.get(kind)
+                    batch.append(
+                        (
+                            logged_at.isoformat() if logged_at is not None else None,
+                            KIND_NAMES.get(kind, str(kind)),
+                            dimensions.name_of(group, item_key) if group else None,
+                            quantity,
+                        )
+                    )
+                yield batch
+
+
+def format_csv(rows: Iterable[Sequence], header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def format_ndjson(rows: Iterable[Sequence]) -> str:
+    return "".join(json.dumps(dict(zip(EXPORT_COLUMNS, row))) + "\n" for row in rows)
+
+
+async def export_chunks(child_key: int, export_format: ExportFormat) -> AsyncIterator[bytes]:
+    if export_format == "csv":
+        yield format_csv((), header=True).encode()
+    async for batch in export_batches(child_key):
+        text = format_csv(batch) if export_format == "csv" else format_ndjson(batch)
+        yield text.encode()
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Compress a byte stream into one gzip member without buffering it."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
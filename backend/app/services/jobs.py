@@ -0,0 +1,379 @@
+"""Persistent background jobs backed by the ``Job`` table.
+
+Workers claim jobs with one atomic ``UPDATE ... RETURNING``, so the
+in-process worker of every app process and any number of
+``python -m app.services.jobs worker`` processes can share one table. A job
+whose worker dies is handed out again once its lease expires, unless it has
+used up its attempts. Failed jobs are retried with exponential backoff up to
+``JOBS_MAX_ATTEMPTS``. A worker only records the outcome of a job it still
+holds: each claim writes a fresh lease token to ``LockedBy``, so a job
+reclaimed after its lease expired, even by the same process, is not
+overwritten by the handler that lost it.
+
+Handlers register with ``@job_handler(kind)``; ``@daily_job(kind, hour)``
+additionally enqueues that kind once per UTC day from ``hour`` onwards.
+``jobs.cleanup`` is one of those: it deletes finished jobs older than
+``JOBS_RETENTION_DAYS``, so daily fan-outs don't grow the table forever.
+
+    python -m app.services.jobs worker | status | enqueue <kind> [json payload]
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import sys
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge, Histogram
+from app.db.session import AsyncSessionLocal
+from app.models.jobs import Job
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+HANDLERS: Dict[str, Handler] = {}
+
+
+@dataclass(frozen=True, slots=True)
+class DailyJob:
+    kind: str
+    hour_utc: int
+
+
+DAILY_JOBS: List[DailyJob] = []
+CLEANUP_BATCH_ROWS = 10_000
+
+jobs_finished = Counter("jobs_total", "Background jobs finished, by outcome.", ("kind", "outcome"))
+job_duration = Histogram("job_duration_seconds", "Time spent running one background job.", ("kind",))
+jobs_running = Gauge("jobs_running", "Background jobs currently running in this process.")
+
+
+class RetryLater(Exception):
+    """Raised by a handler to run the job again after ``delay`` seconds."""
+
+    def __init__(self, reason: str, delay: float) -> None:
+        super().__init__(reason)
+        self.delay = delay
+
+
+@dataclass(frozen=True, slots=True)
+class ClaimedJob:
+    job_id: int
+    kind: str
+    payload: Dict[str, Any]
+    attempts: int
+    lease: str  # this claim's ``LockedBy`` token
+
+
+def job_handler(kind: str):
+    def register(fn: Handler) -> Handler:
+        HANDLERS[kind] = fn
+        return fn
+
+    return register
+
+
+def daily_job(kind: str, hour_utc: int):
+    def register(fn: Handler) -> Handler:
+        DAILY_JOBS.append(DailyJob(kind, hour_utc))
+        return fn
+
+    return register
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def job_row(
+    kind: str,
+    payload: Optional[Dict[str, Any]] = None,
+    dedup_key: Optional[str] = None,
+    run_after: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    now = utcnow()
+    return {
+        "Kind": kind,
+        "Payload": payload,
+        "Status": "queued",
+        "Attempts": 0,
+        "RunAfter": run_after or now,
+        "DedupKey": dedup_key,
+        "CreatedAt": now,
+    }
+
+
+def job_insert(dialect_name: str):
+    """INSERT that silently skips rows whose DedupKey already exists."""
+    if dialect_name == "sqlite":
+        return sqlite.insert(Job.__table__).on_conflict_do_nothing(index_elements=["DedupKey"])
+    if dialect_name == "postgresql":
+        return postgresql.insert(Job.__table__).on_conflict_do_nothing(index_elements=["DedupKey"])
+    return insert(Job.__table__)
+
+
+async def enqueue(db: AsyncSession, rows: Sequence[Dict[str, Any]]) -> None:
+    """Add ``job_row`` rows in the caller's transaction; the caller commits."""
+    if rows:
+        await db.execute(job_insert(db.bind.dialect.name), list(rows))
+
+
+async def claim(db: AsyncSession, worker_id: str, limit: int) -> List[ClaimedJob]:
+    now = utcnow()
+    # Unique per claim, so two claims of one job by the same worker differ; the
+    # worker ID is kept after it for operators.
+    lease = f"{uuid.uuid4().hex}:{worker_id}"[:64]
+    # Running jobs past their lease belonged to a worker that died. One that
+    # keeps killing its worker fails for good once its attempts are used up.
+    expired = (Job.status == "running", Job.locked_at < now - timedelta(seconds=settings.jobs_lease_seconds))
+    await db.execute(
+        update(Job)
+        .where(*expired, Job.attempts >= settings.jobs_max_attempts)
+        .values(status="failed", locked_by=None, locked_at=None, finished_at=now, last_error="lease expired")
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(
+        update(Job)
+        .where(*expired)
+        .values(status="queued", locked_by=None)
+        .execution_options(synchronize_session=False)
+    )
+    due = (
+        select(Job.job_id)
+        .where(Job.status == "queued", Job.run_after <= now)
+        .order_by(Job.run_after, Job.job_id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    claimed = await db.execute(
+        update(Job)
+        .where(Job.job_id.in_(due), Job.status == "queued")
+        .values(status="running", locked_by=lease, locked_at=now, attempts=Job.attempts + 1)
+        .returning(Job.job_id, Job.kind, Job.payload, Job.attempts)
+        .execution_options(synchronize_session=False)
+    )
+    jobs = [
+        ClaimedJob(job_id, kind, payload or {}, attempts, lease) for job_id, kind, payload, attempts in claimed
+    ]
+    await db.commit()
+    return jobs
+
+
+async def finish(job: ClaimedJob, error: Optional[str] = None, retry_after: Optional[float] = None) -> str:
+    """Record the outcome of a claimed job; returns ``done``, ``retry`` or ``failed``.
+
+    Returns ``lost`` instead, recording nothing, if the job's lease expired
+    and it was reclaimed while this worker was still running it.
+    """
+    now = utcnow()
+    if error is None:
+        outcome, values = "done", {"status": "done", "finished_at": now, "last_error": None}
+    elif job.attempts < settings.jobs_max_attempts:
+        delay = retry_after if retry_after is not None else settings.jobs_retry_base_seconds * 2 ** (job.attempts - 1)
+        outcome = "retry"
+        values = {"status": "queued", "run_after": now + timedelta(seconds=delay), "last_error": error}
+    else:
+        outcome, values = "failed", {"status": "failed", "finished_at": now, "last_error": error}
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(Job)
+            .where(Job.job_id == job.job_id, Job.locked_by == job.lease)
+            .values(locked_by=None, locked_at=None, **values)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+    if result.rowcount == 0:
+        logger.warning("job %s (%s) was reclaimed before it finished", job.job_id, job.kind)
+        outcome = "lost"
+    jobs_finished.inc(kind=job.kind, outcome=outcome)
+    return outcome
+
+
+async def release(job: ClaimedJob) -> None:
+    """Hand a job back untouched, e.g. when the worker shuts down mid-run."""
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(Job)
+            .where(Job.job_id == job.job_id, Job.locked_by == job.lease)
+            .values(status="queued", locked_by=None, locked_at=None, attempts=Job.attempts - 1)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+
+
+async def run_job(job: ClaimedJob) -> str:
+    handler = HANDLERS.get(job.kind)
+    if handler is None:
+        return await finish(job, error=f"no handler for job kind {job.kind!r}")
+    start = time.perf_counter()
+    jobs_running.inc()
+    try:
+        await handler(job.payload)
+    except asyncio.CancelledError:
+        await asyncio.shield(release(job))
+        raise
+    except RetryLater as e:
+        return await finish(job, error=str(e), retry_after=e.delay)
+    except Exception as e:
+        logger.exception("job %s (%s) failed", job.job_id, job.kind)
+        return await finish(job, error=repr(e))
+    finally:
+        jobs_running.dec()
+        job_duration.observe(time.perf_counter() - start, kind=job.kind)
+    return await finish(job)
+
+
+class JobWorker:
+    """Poll the job table and run up to ``concurrency`` jobs at a time."""
+
+    def __init__(self, concurrency: int, poll_seconds: float, worker_id: Optional[str] = None) -> None:
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self._running: Set[asyncio.Task] = set()
+        self._stop = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._daily_checked_at = 0.0
+
+    async def schedule_daily(self) -> None:
+        # Dedup keys make this safe to run from every worker; once a minute is plenty.
+        if time.monotonic() - self._daily_checked_at < 60 or not DAILY_JOBS:
+            return
+        self._daily_checked_at = time.monotonic()
+        now = utcnow()
+        due = [job_row(d.kind, dedup_key=f"{d.kind}:{now.date()}") for d in DAILY_JOBS if now.hour >= d.hour_utc]
+        if due:
+            async with AsyncSessionLocal() as db:
+                await enqueue(db, due)
+                await db.commit()
+
+    async def poll(self) -> int:
+        """Schedule daily jobs and start as many claimed jobs as there are free slots."""
+        await self.schedule_daily()
+        free = self.concurrency - len(self._running)
+        if free <= 0:
+            return 0
+        async with AsyncSessionLocal() as db:
+            jobs = await claim(db, self.worker_id, free)
+        for job in jobs:
+            task = asyncio.create_task(run_job(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+        return len(jobs)
+
+    async def run(self) -> None:
+        try:
+            while not self._stop.is_set():
+                try:
+                    started = await self.poll()
+                except Exception:
+                    logger.exception("job worker poll failed")
+                    started = 0
+                if started:
+                    continue
+                waiters = [asyncio.ensure_future(self._stop.wait()), *self._running]
+                # Wake on the poll interval, on shutdown, or when a slot frees up.
+                await asyncio.wait(waiters, timeout=self.poll_seconds, return_when=asyncio.FIRST_COMPLETED)
+                waiters[0].cancel()
+        finally:
+            for task in list(self._running):
+                task.cancel()
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            await self._task
+
+
+async def delete_finished_jobs(db: AsyncSession, finished_before: datetime) -> int:
+    """Delete ``done`` and ``failed`` jobs finished before ``finished_before``; returns how many.
+
+    Works in batches of ``CLEANUP_BATCH_ROWS``, each committed on its own, so
+    a large backlog never holds one long write transaction.
+    """
+    deleted = 0
+    while True:
+        batch = (
+            select(Job.job_id)
+            .where(Job.status.in_(("done", "failed")), Job.finished_at < finished_before)
+            .limit(CLEANUP_BATCH_ROWS)
+            .scalar_subquery()
+        )
+        result = await db.execute(delete(Job).where(Job.job_id.in_(batch)).execution_options(synchronize_session=False))
+        await db.commit()
+        deleted += result.rowcount
+        if result.rowcount < CLEANUP_BATCH_ROWS:
+            return deleted
+
+
+@daily_job("jobs.cleanup", 0)
+@job_handler("jobs.cleanup")
+async def cleanup_finished_jobs(payload: Dict[str, Any]) -> None:
+    async with AsyncSessionLocal() as db:
+        deleted = await delete_finished_jobs(db, utcnow() - timedelta(days=settings.jobs_retention_days))
+    logger.info("deleted %d finished jobs", deleted)
+
+
+async def job_counts(db: AsyncSession) -> Dict[str, Dict[str, int]]:
+    counts: Dict[str, Dict[str, int]] = {}
+    for kind, status, count in await db.execute(
+        select(Job.kind, Job.status, func.count()).group_by(Job.kind, Job.status)
+    ):
+        counts.setdefault(kind, {})[status] = count
+    return counts
+
+
+async def _main(command: str, args: List[str]) -> None:
+    from app.core.http import close_http_clients, open_http_clients
+    from app.db.session import SessionLocal, dispose_async_engines
+    from app.services import coach_precompute  # noqa: F401  (registers handlers)
+    from app.services.dimensions import dimension_registry
+
+    try:
+        if command == "worker":
+            open_http_clients()
+            with SessionLocal() as db:
+                dimension_registry.load(db)
+            try:
+                await JobWorker(settings.jobs_concurrency, settings.jobs_poll_seconds).run()
+            finally:
+                await close_http_clients()
+        elif command == "enqueue":
+            payload = json.loads(args[1]) if len(args) > 1 else None
+            async with AsyncSessionLocal() as db:
+                await enqueue(db, [job_row(args[0], payload)])
+                await db.commit()
+            print(f"enqueued {args[0]}")
+        else:
+            async with AsyncSessionLocal() as db:
+                for kind, statuses in sorted((await job_counts(db)).items()):
+                    print(kind, " ".join(f"{status}={count}" for status, count in sorted(statuses.items())))
+    finally:
+        await dispose_async_engines()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("worker", "status", "enqueue") or (
+        sys.argv[1] == "enqueue" and len(sys.argv) not in (3, 4)
+    ):
+        sys.exit("usage: python -m app.services.jobs worker | status | enqueue <kind> [json payload]")
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_main(sys.argv[1], sys.argv[2:]))
+    except KeyboardInterrupt:
+        pass
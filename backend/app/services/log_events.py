@@ -0,0 +1,220 @@
+"""Narrow per-measurement copy of ``FactSystem`` in ``LogEvent``.
+
+``FactSystem`` is wide and unindexed by time. Milk is split over two
+dimension tables with text quantities, and symptoms sit behind
+``DimSymptom1``/``DimSymptom2``. ``LogEvent`` stores one row per food eaten
+or symptom value, as (child, time, kind, item key, numeric quantity), under
+a ``(UserKey, LoggedAt)`` index. A child's history for any window is then
+one index range scan with no joins.
+
+Log ingestion writes both tables in the same transaction. Each event keeps
+its fact's ``EntryID`` under a unique ``(UserKey, EntryID, Kind)`` index, so
+a replayed batch can't copy an entry twice. Migration 8 backfills
+existing facts; repair or re-backfill with::
+
+    python -m app.services.log_events rebuild [child_key ...]
+
+Facts without ``UserKey`` or ``LoggedAt`` (rows from before migration 3)
+have no place on a timeline and are not copied; the history export reads
+a child's untimed facts straight from ``FactSystem`` with ``fact_events``.
+"""
+import sys
+from datetime import datetime
+from enum import IntEnum
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+from sqlalchemy import Float, bindparam, case, cast, delete, insert, literal, null, select, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.happytummy_schema import DimSymptom1, DimSymptom2, FactSystem, LogEvent
+from app.services.rollups import FACT_COLUMNS_BY_GROUP, Symptom
+
+
+class EventKind(IntEnum):
+    CARB = 1
+    MEAT = 2
+    FRUIT = 3
+    VEG = 4
+    MILK1 = 5
+    MILK2 = 6
+    WATER_OZ = 7
+    FRUIT_INTAKE = 8
+    STOOL = 9
+
+
+FOOD_KINDS = {group: EventKind[group.upper()] for group in FACT_COLUMNS_BY_GROUP}
+GROUP_BY_KIND = {kind: group for group, kind in FOOD_KINDS.items()}
+SYMPTOM_KINDS = (EventKind.WATER_OZ, EventKind.FRUIT_INTAKE, EventKind.STOOL)  # order of ``Symptom``
+KIND_NAMES = {kind: kind.name.lower() for kind in EventKind}
+
+EVENT_COLUMNS = ("UserKey", "LoggedAt", "Kind", "ItemKey", "Quantity", "EntryID")
+# (dimension, its key, FactSystem key column, columns in ``SYMPTOM_KINDS`` order)
+_SYMPTOM_SOURCES = (
+    (
+        DimSymptom1,
+        DimSymptom1.symptom1_key,
+        "Symptom1Key",
+        (DimSymptom1.water_oz1, DimSymptom1.fruit_intake1, DimSymptom1.stool1),
+    ),
+    (
+        DimSymptom2,
+        DimSymptom2.symptom2_key,
+        "Symptom2Key",
+        (DimSymptom2.water_oz2, DimSymptom2.fruit_intake2, DimSymptom2.stool2),
+    ),
+)
+_event_table = LogEvent.__table__
+
+CHILD_HISTORY_QUERY = (
+    select(LogEvent.logged_at, LogEvent.kind, LogEvent.item_key, LogEvent.quantity)
+    .where(
+        LogEvent.user_key == bindparam("child_key"),
+        LogEvent.logged_at >= bindparam("since"),
+        LogEvent.logged_at < bindparam("until"),
+    )
+    .order_by(LogEvent.logged_at, LogEvent.event_id)
+)
+
+
+def numeric(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def events_from_fact(fact: Mapping[str, Any], symptoms: Sequence[Symptom] = ()) -> List[Dict[str, Any]]:
+    """``LogEvent`` rows for one ``FactSystem`` row and its ``DimSymptom1`` values."""
+    child_key, logged_at, entry_id = fact["UserKey"], fact["LoggedAt"], fact["EntryID"]
+    if child_key is None or logged_at is None:
+        return []
+    events = []
+    for group, (key_column, quantity_column) in FACT_COLUMNS_BY_GROUP.items():
+        key = fact[key_column]
+        if key is not None:
+            events.append(
+                {
+                    "UserKey": child_key,
+                    "LoggedAt": logged_at,
+                    "Kind": FOOD_KINDS[group],
+                    "ItemKey": key,
+                    "Quantity": numeric(fact[quantity_column]),
+                    "EntryID": entry_id,
+                }
+            )
+    for values in symptoms:
+        for kind, value in zip(SYMPTOM_KINDS, values):
+            if value is not None:
+                events.append(
+                    {
+                        "UserKey": child_key,
+                        "LoggedAt": logged_at,
+                        "Kind": kind,
+                        "ItemKey": None,
+                        "Quantity": value,
+                        "EntryID": entry_id,
+                    }
+                )
+    return events
+
+
+def _numeric_sql(column, dialect_name: str):
+    if dialect_name == "postgresql":
+        # Postgres rejects CAST('4 oz' AS FLOAT); SQLite reads the leading number.
+        return case((column.op("~")(r"^\s*[0-9]+(\.[0-9]+)?\s*$"), cast(column, Float)))
+    return cast(column, Float)
+
+
+def fact_events(dialect_name: str, *where):
+    """``EVENT_COLUMNS`` for every measurement of the ``FactSystem`` rows matching ``where``, as one UNION ALL.
+
+    ``DimSymptom2`` events get no ``EntryID``: ingestion never writes that
+    table, and a fact using both symptom tables would otherwise give one
+    entry two events of a kind.
+    """
+    selects = []
+    for group, (key_column, quantity_column) in FACT_COLUMNS_BY_GROUP.items():
+        selects.append(
+            select(
+                FactSystem.c.UserKey,
+                FactSystem.c.LoggedAt,
+                literal(int(FOOD_KINDS[group])).label("Kind"),
+                FactSystem.c[key_column].label("ItemKey"),
+                _numeric_sql(FactSystem.c[quantity_column], dialect_name).label("Quantity"),
+                FactSystem.c.EntryID,
+            ).where(*where, FactSystem.c[key_column].is_not(None))
+        )
+    for (table, key, fact_key, columns), entry_id in zip(_SYMPTOM_SOURCES, (FactSystem.c.EntryID, null())):
+        for kind, column in zip(SYMPTOM_KINDS, columns):
+            selects.append(
+                select(
+                    FactSystem.c.UserKey,
+                    FactSystem.c.LoggedAt,
+                    literal(int(kind)).label("Kind"),
+                    null().label("ItemKey"),
+                    cast(column, Float).label("Quantity"),
+                    entry_id.label("EntryID"),
+                )
+                .select_from(FactSystem.join(table, key == FactSystem.c[fact_key]))
+                .where(*where, column.is_not(None))
+            )
+    return union_all(*selects)
+
+
+def backfill_statement(dialect_name: str, child_keys: Optional[Sequence[int]] = None):
+    """One INSERT ... SELECT copying ``FactSystem`` (optionally just ``child_keys``) into ``LogEvent``."""
+    facts = [FactSystem.c.UserKey.is_not(None), FactSystem.c.LoggedAt.is_not(None)]
+    if child_keys is not None:
+        facts.append(FactSystem.c.UserKey.in_(child_keys))
+    return insert(_event_table).from_select(list(EVENT_COLUMNS), fact_events(dialect_name, *facts))
+
+
+def backfill(connection: Connection, child_keys: Optional[Sequence[int]] = None) -> int:
+    """Replace the events of ``child_keys`` (everyone when ``None``) with a fresh copy of their facts."""
+    clear = delete(_event_table)
+    if child_keys is not None:
+        clear = clear.where(_event_table.c.UserKey.in_(child_keys))
+    connection.execute(clear)
+    return connection.execute(backfill_statement(connection.dialect.name, child_keys)).rowcount
+
+
+def rebuild_log_events(db: Session, child_keys: Optional[Sequence[int]] = None) -> int:
+    inserted = backfill(db.connection(), child_keys)
+    db.commit()
+    return inserted
+
+
+def event_insert(dialect_name: str):
+    """INSERT that silently skips events whose (UserKey, EntryID, Kind) already exists."""
+    if dialect_name == "sqlite":
+        return sqlite.insert(_event_table).on_conflict_do_nothing(index_elements=["UserKey", "EntryID", "Kind"])
+    if dialect_name == "postgresql":
+        return postgresql.insert(_event_table).on_conflict_do_nothing(index_elements=["UserKey", "EntryID", "Kind"])
+    return insert(_event_table)
+
+
+async def add_log_events(db: AsyncSession, events: Sequence[Dict[str, Any]]) -> None:
+    """Insert ``events_from_fact`` rows in the caller's transaction."""
+    if events:
+        await db.execute(event_insert(db.bind.dialect.name), list(events))
+
+
+async def child_history(db: AsyncSession, child_key: int, since: datetime, until: datetime) -> List[Mapping[str, Any]]:
+    """A child's events in ``[since, until)``, oldest first, from one index range scan."""
+    result = await db.execute(CHILD_HISTORY_QUERY, {"child_key": child_key, "since": since, "until": until})
+    return result.mappings().all()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        sys.exit("usage: python -m app.services.log_events rebuild [child_key ...]")
+    from app.db.session import SessionLocal
+
+    keys = [int(arg) for arg in sys.argv[2:]] or None
+    with SessionLocal() as session:
+        print(f"rebuilt {rebuild_log_events(session, keys)} log events")
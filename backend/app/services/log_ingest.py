@@ -0,0 +1,149 @@
+"""Batch ingestion of client daily logs into the ``FactSystem`` star schema."""
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.happytummy_schema import DimSymptom1, FactSystem
+from app.schemas.logs import LogBatchOut, LogEntryIn
+from app.services.child_context import child_context_cache
+from app.services.dimensions import dimension_registry
+from app.services.log_events import add_log_events, events_from_fact
+from app.services.rollups import FACT_COLUMNS_BY_GROUP, RollupAccumulator, apply_rollup_deltas
+
+SOLID_FOOD_GROUPS = ("carb", "meat", "fruit", "veg")
+MILK_GROUPS = ("milk1", "milk2")
+FACT_COLUMN_NAMES = [column.name for column in FactSystem.columns]
+
+
+def to_utc_naive(value: datetime | None) -> datetime:
+    if value is None:
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def fact_insert(dialect_name: str):
+    """INSERT that silently skips rows whose (UserKey, EntryID) already exists."""
+    if dialect_name == "sqlite":
+        return sqlite.insert(FactSystem).on_conflict_do_nothing(index_elements=["UserKey", "EntryID"])
+    if dialect_name == "postgresql":
+        return postgresql.insert(FactSystem).on_conflict_do_nothing(index_elements=["UserKey", "EntryID"])
+    return insert(FactSystem)
+
+
+async def insert_facts(db: AsyncSession, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Insert ``rows`` and return the ones actually written.
+
+    The entry-ID check before the insert doesn't see a concurrent replay of
+    the same batch; its rows are skipped by ON CONFLICT and left out of the
+    RETURNING result here.
+    """
+    dialect = db.bind.dialect
+    statement = fact_insert(dialect.name)
+    if not dialect.insert_returning:
+        # No RETURNING (MySQL): a plain INSERT raises on a conflict instead of skipping.
+        await db.execute(statement, rows)
+        return rows
+    written = set(await db.scalars(statement.returning(FactSystem.c.EntryID), rows))
+    return [row for row in rows if row["EntryID"] in written]
+
+
+async def ingest_log_batch(db: AsyncSession, child_key: int, entries: List[LogEntryIn]) -> LogBatchOut:
+    """Write a batch of log entries for one child in a single transaction.
+
+    Entries whose ``entry_id`` was already stored for this child are skipped, so
+    offline clients can replay a batch. Food and milk names are resolved to
+    dimension keys in memory; entries that don't resolve are reported back and
+    not written.
+    """
+    unique: Dict[str, LogEntryIn] = {}
+    for entry in entries:
+        unique.setdefault(entry.entry_id, entry)
+
+    existing = set(
+        await db.scalars(
+            select(FactSystem.c.EntryID).where(
+                FactSystem.c.UserKey == child_key, FactSystem.c.EntryID.in_(list(unique))
+            )
+        )
+    )
+
+    # One snapshot for the whole batch, so a concurrent dimension change can't split it.
+    dimensions = dimension_registry.current()
+    rows: List[Dict[str, Any]] = []
+    symptom_rows: List[tuple[Dict[str, Any], LogEntryIn]] = []
+    unresolved: List[str] = []
+    for entry_id, entry in unique.items():
+        if entry_id in existing:
+            continue
+        row = dict.fromkeys(FACT_COLUMN_NAMES)
+        row.update(UserKey=child_key, EntryID=entry_id, LoggedAt=to_utc_naive(entry.logged_at))
+
+        if entry.kind == "symptom":
+            symptom_rows.append((row, entry))
+            rows.append(row)
+            continue
+
+        if entry.kind == "milk":
+            groups = MILK_GROUPS
+        else:
+            groups = (entry.food_group,) if entry.food_group else SOLID_FOOD_GROUPS
+        food = dimensions.resolve(entry.name, groups) if entry.name else None
+        if food is None:
+            unresolved.append(entry_id)
+            continue
+
+        key_column, quantity_column = FACT_COLUMNS_BY_GROUP[food.group]
+        row[key_column] = food.key
+        if entry.quantity is not None:
+            # Milk quantities are stored as text in FactSystem; solids as whole units.
+            row[quantity_column] = f"{entry.quantity:g}" if food.group in MILK_GROUPS else round(entry.quantity)
+        rows.append(row)
+
+    if symptom_rows:
+        symptom_keys = await db.scalars(
+            insert(DimSymptom1).returning(DimSymptom1.symptom1_key, sort_by_parameter_order=True),
+            [
+                {"water_oz1": entry.water_oz, "fruit_intake1": entry.fruit_intake, "stool1": entry.stool}
+                for _row, entry in symptom_rows
+            ],
+        )
+        for (row, _entry), symptom_key in zip(symptom_rows, symptom_keys):
+            row["Symptom1Key"] = symptom_key
+
+    written: List[Dict[str, Any]] = []
+    if rows:
+        written = await insert_facts(db, rows)
+        written_ids = {id(row) for row in written}
+        # Symptom rows of facts a concurrent replay already wrote would be orphaned.
+        orphaned = [row["Symptom1Key"] for row, _entry in symptom_rows if id(row) not in written_ids]
+        if orphaned:
+            await db.execute(delete(DimSymptom1).where(DimSymptom1.symptom1_key.in_(orphaned)))
+
+        # Keep ChildDailyRollup and LogEvent in step within the same transaction.
+        # Only facts this insert wrote are copied, so a concurrent replay of
+        # the same batch can't add its rows to the rollups or events twice.
+        accumulator = RollupAccumulator()
+        events: List[Dict[str, Any]] = []
+        symptoms_by_entry = {id(row): entry for row, entry in symptom_rows}
+        for row in written:
+            entry = symptoms_by_entry.get(id(row))
+            symptoms = [(entry.water_oz, entry.fruit_intake, entry.stool)] if entry else []
+            accumulator.add(row, dimensions.fiber_of, symptoms)
+            events.extend(events_from_fact(row, symptoms))
+        await apply_rollup_deltas(db, accumulator)
+        await add_log_events(db, events)
+    await db.commit()
+    if written:
+        await child_context_cache.invalidate(child_key)
+
+    return LogBatchOut(
+        received=len(entries),
+        inserted=len(written),
+        duplicates=len(entries) - len(written) - len(unresolved),
+        unresolved=unresolved,
+    )
@@ -0,0 +1,174 @@
+"""Spoonacular ingredient lookups behind a persistent two-tier cache.
+
+Run ``python -m app.services.nutrition warm`` to pre-populate the cache with
+common baby foods (or pass food names to warm specific queries).
+"""
+import asyncio
+import sys
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from app.core.cache import SqliteStore, TwoTierCache
+from app.core.config import settings
+from app.core.http import close_http_clients, get_spoonacular_client
+from app.core.metrics import UpstreamCall
+from app.services.food_index import food_index
+
+COMMON_BABY_FOODS = [
+    "apple", "applesauce", "avocado", "banana", "blueberries", "broccoli",
+    "butternut squash", "carrot", "chicken", "green beans", "lentils", "mango",
+    "oatmeal", "pear", "peas", "plum", "prune", "rice cereal", "spinach",
+    "sweet potato", "whole milk yogurt", "zucchini",
+]
+
+cache_store = SqliteStore(settings.nutrition_cache_path)
+query_cache = TwoTierCache(
+    "spoonacular:query",
+    cache_store,
+    max_entries=settings.nutrition_cache_memory_entries,
+    fresh_seconds=settings.nutrition_cache_fresh_seconds,
+    max_age_seconds=settings.nutrition_cache_max_age_seconds,
+)
+ingredient_cache = TwoTierCache(
+    "spoonacular:ingredient",
+    cache_store,
+    max_entries=settings.nutrition_cache_memory_entries,
+    fresh_seconds=settings.nutrition_cache_fresh_seconds,
+    max_age_seconds=settings.nutrition_cache_max_age_seconds,
+)
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def get_available_units(description: str) -> List[str]:
+    desc = description.lower()
+    if any(x in desc for x in ["juice", "milk", "water"]):
+        return ["ml", "fl oz", "cup"]
+    if any(x in desc for x in ["cereal", "powder"]):
+        return ["g", "tbsp", "tsp"]
+    if any(x in desc for x in ["fruit", "vegetable"]):
+        return ["g", "oz", "piece", "slice"]
+    if "babyfood" in desc:
+        return ["g", "jar", "tbsp"]
+    return ["g", "oz", "tbsp", "tsp"]
+
+
+async def fetch_search(query: str) -> List[Dict[str, Any]]:
+    client = get_spoonacular_client()
+    with UpstreamCall("spoonacular", "ingredient_search") as call:
+        response = await client.get(
+            "/food/ingredients/search",
+            params={"query": query, "number": 5, "apiKey": settings.spoonacular_key},
+        )
+        call.status = response.status_code
+    if response.status_code != 200:
+        raise HTTPException(status_code=500, detail=f"Spoonacular error: {response.text}")
+    return [
+        {"id": item.get("id"), "name": item.get("name", "")}
+        for item in response.json().get("results", [])
+    ]
+
+
+async def fetch_detail(ingredient_id: int) -> Optional[Dict[str, Any]]:
+    """Nutrients per 100 g, or ``None`` if Spoonacular didn't answer (not cached)."""
+    try:
+        client = get_spoonacular_client()
+        with UpstreamCall("spoonacular", "ingredient_information") as call:
+            resp = await client.get(
+                f"/food/ingredients/{ingredient_id}/information",
+                params={"amount": 100, "unit": "grams", "apiKey": settings.spoonacular_key},
+                timeout=settings.spoonacular_detail_timeout_seconds,
+            )
+            call.status = resp.status_code
+        if resp.status_code != 200:
+            return None
+        info = resp.json()
+        nutrients = info.get("nutrition", {}).get("nutrients", [])
+        def find(name: str) -> Optional[float]:
+            for n in nutrients:
+                if n.get("name", "").lower() == name.lower():
+                    return n.get("amount")
+            return None
+        return {"calories": find("Calories"), "fiber": find("Fiber"), "sugar": find("Sugar"), "protein": find("Protein"), "water": find("Water")}
+    except Exception:
+        return None
+
+
+async def get_ingredient_nutrition(ingredient_id: int) -> Dict[str, Any]:
+    nutrition = await ingredient_cache.get_or_load(str(ingredient_id), lambda: fetch_detail(ingredient_id))
+    return nutrition or {}
+
+
+async def search_ingredients(query: str) -> List[Dict[str, Any]]:
+    """Ingredient matches with nutrition, shaped like the ``/nutrition/search`` results."""
+    key = normalize_query(query)
+    items = await query_cache.get_or_load(key, lambda: fetch_search(key))
+    nutrition_data = await asyncio.gather(
+        *[get_ingredient_nutrition(item["id"]) for item in items]
+    )
+    return [
+        {
+            "name": item["name"].capitalize(),
+            "fdcId": item["id"],
+            "calories": nutrition.get("calories"),
+            "fiber": nutrition.get("fiber"),
+            "sugar": nutrition.get("sugar"),
+            "protein": nutrition.get("protein"),
+            "water": nutrition.get("water"),
+            "availableUnits": get_available_units(item["name"]),
+        }
+        for item, nutrition in zip(items, nutrition_data)
+    ]
+
+
+def search_local(query: str) -> List[Dict[str, Any]]:
+    """Matches from the offline Dim* food index, in the same shape as Spoonacular results.
+
+    Local foods have no Spoonacular ID; they are identified by ``localId``
+    within ``foodGroup`` instead, so the two ID spaces never mix.
+    """
+    return [
+        {
+            "name": entry.name.capitalize(),
+            "fdcId": None,
+            "localId": entry.food_id,
+            "calories": None,
+            "fiber": entry.fiber,
+            "sugar": None,
+            "protein": None,
+            "water": None,
+            "availableUnits": get_available_units(entry.name),
+            "source": "local",
+            "foodGroup": entry.group,
+        }
+        for entry in food_index.search(query)
+    ]
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    return {"query": query_cache.stats(), "ingredient": ingredient_cache.stats()}
+
+
+async def warm(foods: List[str]) -> None:
+    try:
+        for food in foods:
+            try:
+                results = await search_ingredients(food)
+            except HTTPException as e:
+                print(f"{food}: failed ({e.detail})")
+                continue
+            print(f"{food}: {len(results)} ingredients cached")
+    finally:
+        await close_http_clients()
+        cache_store.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "warm":
+        sys.exit("usage: python -m app.services.nutrition warm [food ...]")
+    if not settings.spoonacular_key:
+        sys.exit("SPOONACULAR_KEY is not configured")
+    asyncio.run(warm(sys.argv[2:] or COMMON_BABY_FOODS))
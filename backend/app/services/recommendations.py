@@ -0,0 +1,305 @@
+"""Deterministic try-today / avoid-today food recommendations.
+
+A child's recent ``LogEvent`` rows become a row of per-food counts; the
+food dimensions become fiber and allergen vectors. Every food is then scored
+for every child with array arithmetic, so one child and a whole nightly
+batch go through the same code:
+
+- stools harder than Bristol type 4 push towards high-fiber foods, looser
+  ones away from them; without stool logs a low-fiber diet nudges upwards;
+- foods not eaten recently get a variety bonus;
+- children flagged with allergies never get common allergens suggested;
+- foods eaten recently that push the wrong way are listed to avoid.
+
+    python -m app.services.recommendations score [days]
+"""
+import sys
+import time
+from itertools import chain
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.happytummy_schema import DimUser, LogEvent
+from app.services.dimensions import FoodEntry, dimension_registry, normalize_name
+from app.services.log_events import FOOD_KINDS, EventKind
+from app.services.rollups import FACT_COLUMNS_BY_GROUP
+
+# Matched as whole words/phrases against normalized food names.
+ALLERGEN_TERMS = (
+    "whole milk", "cow milk", "cows milk", "cheese", "yogurt", "yoghurt", "butter", "cream",
+    "egg", "peanut", "almond", "cashew", "walnut", "pecan", "pistachio", "hazelnut",
+    "wheat", "soy", "tofu", "fish", "salmon", "tuna", "cod", "shrimp", "crab", "lobster", "sesame",
+)
+NEUTRAL_STOOL = 4.0  # Bristol type 4
+LOW_WATER_OZ = 4.0
+VARIETY_WEIGHT = 0.5
+FIBER_TIEBREAK = 0.1
+CHUNK_CHILDREN = 10_000
+
+HABIT_TIPS = (
+    "Log meals and diapers for a few days so recommendations can be personalized.",
+    "Offer small sips of water between meals, especially alongside fiber-rich foods.",
+    "Include a fiber-rich fruit or vegetable at each meal and keep portions small.",
+    "Keep meals simple and bland until stools firm up, and keep offering fluids.",
+    "Rotate fruits and vegetables daily for fiber variety.",
+)
+
+_GROUPS = tuple(FACT_COLUMNS_BY_GROUP)
+# One row per event: child, kind, item key (-1 for symptoms), quantity (-1 when unknown).
+HISTORY_COLUMNS = (
+    LogEvent.user_key,
+    LogEvent.kind,
+    func.coalesce(LogEvent.item_key, -1),
+    func.coalesce(LogEvent.quantity, -1),
+)
+
+
+def is_common_allergen(name: str) -> bool:
+    padded = f" {normalize_name(name)} "
+    return any(f" {term} " in padded for term in ALLERGEN_TERMS)
+
+
+@dataclass(frozen=True)
+class FoodCatalog:
+    """Foods as columns. Same-named foods (the two milk tables) share a column."""
+
+    version: int
+    names: np.ndarray  # object, (F,)
+    raw_fiber: np.ndarray  # float64, NaN where unknown
+    fiber_z: np.ndarray  # standardized fiber, 0 where unknown
+    allergen: np.ndarray  # bool
+    median_fiber: float
+    columns: Dict[str, np.ndarray]  # group -> column index by dimension key, -1 if absent
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+def build_catalog(version: int, entries: Sequence[FoodEntry]) -> FoodCatalog:
+    names: List[str] = []
+    fibers: List[float] = []
+    column_by_name: Dict[str, int] = {}
+    refs: Dict[str, List[tuple[int, int]]] = {group: [] for group in _GROUPS}
+    for entry in sorted(entries, key=lambda e: (_GROUPS.index(e.group), e.key)):
+        column = column_by_name.setdefault(normalize_name(entry.name), len(names))
+        if column == len(names):
+            names.append(entry.name)
+            fibers.append(np.nan if entry.fiber is None else float(entry.fiber))
+        refs[entry.group].append((entry.key, column))
+
+    columns = {}
+    for group, pairs in refs.items():
+        lookup = np.full(max((key for key, _ in pairs), default=-1) + 1, -1, dtype=np.int64)
+        for key, column in pairs:
+            lookup[key] = column
+        columns[group] = lookup
+
+    raw_fiber = np.array(fibers, dtype=np.float64)
+    known = ~np.isnan(raw_fiber)
+    fiber_z = np.zeros_like(raw_fiber)
+    median_fiber = 0.0
+    if known.any():
+        spread = raw_fiber[known].std() or 1.0
+        fiber_z[known] = (raw_fiber[known] - raw_fiber[known].mean()) / spread
+        median_fiber = float(np.median(raw_fiber[known]))
+    return FoodCatalog(
+        version=version,
+        names=np.array(names, dtype=object),
+        raw_fiber=raw_fiber,
+        fiber_z=fiber_z,
+        allergen=np.array([is_common_allergen(name) for name in names], dtype=bool),
+        median_fiber=median_fiber,
+        columns=columns,
+    )
+
+
+_catalog: Optional[FoodCatalog] = None
+
+
+def food_catalog() -> FoodCatalog:
+    """Catalog over the dimension registry, rebuilt only when its version changes."""
+    global _catalog
+    snapshot = dimension_registry.current()
+    if _catalog is None or _catalog.version != snapshot.version:
+        _catalog = build_catalog(snapshot.version, list(snapshot.entries.values()))
+    return _catalog
+
+
+@dataclass
+class History:
+    """Recent logs for ``child_keys`` as flat arrays: food events sorted by child, plus per-child sums."""
+
+    child_keys: np.ndarray  # sorted
+    allergic: np.ndarray
+    event_child: np.ndarray  # row index into child_keys, one per food eaten
+    event_food: np.ndarray  # catalog column
+    stool_sum: np.ndarray
+    stool_count: np.ndarray
+    water_sum: np.ndarray
+    water_count: np.ndarray
+
+
+def history_from_rows(
+    catalog: FoodCatalog, child_keys: np.ndarray, allergic: np.ndarray, rows: np.ndarray
+) -> History:
+    """Turn ``HISTORY_COLUMNS`` rows (a float64 array) into a ``History``."""
+    n = len(child_keys)
+    rows = rows.reshape(-1, len(HISTORY_COLUMNS))
+    children = rows[:, 0].astype(np.int64)
+    position = np.searchsorted(child_keys, children).clip(max=max(n - 1, 0))
+    known = (child_keys[position] == children) if n else np.zeros(len(rows), dtype=bool)
+    rows, position = rows[known], position[known]
+    kind, item, quantity = rows[:, 1].astype(np.int64), rows[:, 2].astype(np.int64), rows[:, 3]
+
+    event_child, event_food = [], []
+    for group in _GROUPS:
+        lookup = catalog.columns[group]
+        in_range = (kind == FOOD_KINDS[group]) & (item >= 0) & (item < len(lookup))
+        columns = lookup[item[in_range]]
+        resolved = columns >= 0
+        event_child.append(position[in_range][resolved])
+        event_food.append(columns[resolved])
+
+    event_child, event_food = np.concatenate(event_child), np.concatenate(event_food)
+    # Sorted by child so each scoring chunk is one contiguous slice.
+    order = np.argsort(event_child, kind="stable")
+
+    has_stool = (kind == EventKind.STOOL) & (quantity > 0)
+    has_water = (kind == EventKind.WATER_OZ) & (quantity >= 0)
+    return History(
+        child_keys=child_keys,
+        allergic=allergic,
+        event_child=event_child[order],
+        event_food=event_food[order],
+        stool_sum=np.bincount(position[has_stool], weights=quantity[has_stool], minlength=n),
+        stool_count=np.bincount(position[has_stool], minlength=n),
+        water_sum=np.bincount(position[has_water], weights=quantity[has_water], minlength=n),
+        water_count=np.bincount(position[has_water], minlength=n),
+    )
+
+
+def load_history(
+    db: Session, catalog: FoodCatalog, since: datetime, child_keys: Optional[Sequence[int]] = None
+) -> History:
+    """Logs since ``since`` for ``child_keys`` (every child when ``None``), in two queries."""
+    children = select(DimUser.user_key, func.coalesce(DimUser.allergies, 0)).order_by(DimUser.user_key)
+    events = select(*HISTORY_COLUMNS).where(LogEvent.logged_at >= since)
+    if child_keys is not None:
+        children = children.where(DimUser.user_key.in_(child_keys))
+        events = events.where(LogEvent.user_key.in_(child_keys))
+
+    # Core execution flattened straight into arrays; np.array over ORM rows is
+    # an order of magnitude slower at millions of events.
+    connection = db.connection()
+    child_rows = np.fromiter(chain.from_iterable(connection.execute(children)), dtype=np.int64).reshape(-1, 2)
+    event_rows = np.fromiter(chain.from_iterable(connection.execute(events)), dtype=np.float64)
+    return history_from_rows(catalog, child_rows[:, 0], child_rows[:, 1] != 0, event_rows)
+
+
+def top_k(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Column indices and values of each row's ``k`` highest scores, best first."""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.zeros((len(scores), 0), dtype=np.int64), np.zeros((len(scores), 0))
+    index = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    values = np.take_along_axis(scores, index, axis=1)
+    order = np.argsort(-values, axis=1, kind="stable")
+    return np.take_along_axis(index, order, axis=1), np.take_along_axis(values, order, axis=1)
+
+
+def score_chunk(catalog: FoodCatalog, history: History, start: int, stop: int, k: int) -> List[Dict[str, Any]]:
+    rows = stop - start
+    lo, hi = np.searchsorted(history.event_child, [start, stop])
+    flat = (history.event_child[lo:hi] - start) * len(catalog) + history.event_food[lo:hi]
+    counts = np.bincount(flat, minlength=rows * len(catalog)).reshape(rows, len(catalog)).astype(np.float64)
+    totals = counts.sum(axis=1)
+    share = counts / np.maximum(totals, 1.0)[:, None]
+
+    stool_count = history.stool_count[start:stop]
+    stool_mean = history.stool_sum[start:stop] / np.maximum(stool_count, 1)
+    fiber_intake = counts @ np.nan_to_num(catalog.raw_fiber) / np.maximum(totals, 1.0)
+    low_fiber_diet = (totals > 0) & (fiber_intake < catalog.median_fiber)
+    target = np.where(
+        stool_count > 0,
+        np.clip((NEUTRAL_STOOL - stool_mean) / 3.0, -1.0, 1.0),
+        np.where(low_fiber_diet, 0.5, 0.0),
+    )
+
+    avoid = share * (-target[:, None] * catalog.fiber_z[None, :])
+    suggest = (target[:, None] + FIBER_TIEBREAK) * catalog.fiber_z[None, :] + VARIETY_WEIGHT * (1.0 - share)
+    suggest[avoid > 0] = -np.inf
+    suggest[history.allergic[start:stop, None] & catalog.allergen[None, :]] = -np.inf
+
+    water_count = history.water_count[start:stop]
+    low_water = (water_count > 0) & (history.water_sum[start:stop] / np.maximum(water_count, 1) < LOW_WATER_OZ)
+    logged = (totals > 0) | (stool_count > 0)
+    tip = np.select(
+        [~logged, (target > 0.3) & low_water, target > 0.3, target < -0.3],
+        [0, 1, 2, 3],
+        default=4,
+    )
+
+    try_index, try_score = top_k(suggest, k)
+    avoid_index, avoid_score = top_k(avoid, k)
+    try_names, avoid_names = catalog.names[try_index], catalog.names[avoid_index]
+    try_ok, avoid_ok = np.isfinite(try_score), avoid_score > 0
+    return [
+        {
+            "try_today": try_names[i][try_ok[i]].tolist(),
+            "avoid_today": avoid_names[i][avoid_ok[i]].tolist(),
+            "habit_tip": HABIT_TIPS[tip[i]],
+        }
+        for i in range(rows)
+    ]
+
+
+def recommend(catalog: FoodCatalog, history: History, k: Optional[int] = None) -> Iterator[tuple[int, Dict[str, Any]]]:
+    """Yield ``(child_key, recommendations)`` for every child in ``history``.
+
+    Children are scored ``CHUNK_CHILDREN`` at a time so the dense count
+    matrix stays small however many children there are.
+    """
+    k = settings.recommendation_top_k if k is None else k
+    for start in range(0, len(history.child_keys), CHUNK_CHILDREN):
+        stop = min(start + CHUNK_CHILDREN, len(history.child_keys))
+        chunk_keys = history.child_keys[start:stop].tolist()
+        yield from zip(chunk_keys, score_chunk(catalog, history, start, stop, k))
+
+
+def window_start(days: Optional[int] = None) -> datetime:
+    days = settings.recommendation_window_days if days is None else days
+    return datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)
+
+
+async def recommend_for_child(db: AsyncSession, child_key: int) -> Dict[str, Any]:
+    catalog = food_catalog()
+    history = await db.run_sync(lambda session: load_history(session, catalog, window_start(), [child_key]))
+    for _key, recommendations in recommend(catalog, history):
+        return recommendations
+    return {"try_today": [], "avoid_today": [], "habit_tip": HABIT_TIPS[0]}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3) or sys.argv[1] != "score":
+        sys.exit("usage: python -m app.services.recommendations score [days]")
+    from app.db.session import SessionLocal
+
+    with SessionLocal() as session:
+        dimension_registry.load(session)
+        started = time.perf_counter()
+        catalog = food_catalog()
+        history = load_history(session, catalog, window_start(int(sys.argv[2]) if len(sys.argv) == 3 else None))
+        loaded = time.perf_counter()
+        scored = sum(1 for _ in recommend(catalog, history))
+        done = time.perf_counter()
+    print(
+        f"scored {scored} children against {len(catalog)} foods "
+        f"(load {loaded - started:.2f}s, score {done - loaded:.2f}s)"
+    )
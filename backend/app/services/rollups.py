@@ -0,0 +1,175 @@
+"""Per-child daily rollups over ``FactSystem``.
+
+``ChildDailyRollup`` is updated in the same transaction as each log batch, so
+trend views read one row per day instead of joining every dimension over a
+child's full history. Backfill or repair it with::
+
+    python -m app.services.rollups rebuild [child_key ...]
+"""
+import sys
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.happytummy_schema import ChildDailyRollup, DimSymptom1, DimSymptom2, FactSystem
+from app.services.dimensions import FOOD_GROUPS
+
+# food group -> (fact key column, fact quantity column)
+FACT_COLUMNS_BY_GROUP = {
+    "carb": ("CarbKey", "QuantityCarb"),
+    "meat": ("MeatKey", "QuantityMeat"),
+    "fruit": ("FruitKey", "QuantityFruit"),
+    "veg": ("VegKey", "QuantityVeg"),
+    "milk1": ("Milk1Key", "QuantityMilk1"),
+    "milk2": ("Milk2Key", "QuantityMilk2"),
+}
+FIBER_COLUMN_BY_GROUP = {
+    "carb": "CarbFiber",
+    "meat": "MeatFiber",
+    "fruit": "FruitFiber",
+    "veg": "VegFiber",
+    "milk1": "MilkFiber",
+    "milk2": "MilkFiber",
+}
+ROLLUP_COLUMNS = (
+    "CarbFiber", "MeatFiber", "FruitFiber", "VegFiber", "MilkFiber",
+    "WaterOz", "FruitIntake", "StoolTotal", "StoolCount", "EntryCount",
+)
+_rollup_table = ChildDailyRollup.__table__
+_attr_by_column = {
+    column.name: ChildDailyRollup.__mapper__.get_property_by_column(column).key
+    for column in _rollup_table.columns
+}
+
+FiberLookup = Callable[[str, int], Optional[float]]
+Symptom = tuple[Optional[int], Optional[int], Optional[int]]  # water oz, fruit intake, stool
+
+
+def parse_quantity(value: Any) -> float:
+    """Servings for fiber math; missing or unparseable quantities count as one serving."""
+    if value is None:
+        return 1.0
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 1.0
+
+
+class RollupAccumulator:
+    """Sums fact rows into per (child, day) deltas keyed by rollup column name."""
+
+    def __init__(self) -> None:
+        self.totals: Dict[tuple[int, date], Dict[str, float]] = {}
+
+    def add(self, fact: Mapping[str, Any], fiber_of: FiberLookup, symptoms: Iterable[Symptom] = ()) -> None:
+        if fact["UserKey"] is None or fact["LoggedAt"] is None:
+            return
+        day = self.totals.setdefault((fact["UserKey"], fact["LoggedAt"].date()), dict.fromkeys(ROLLUP_COLUMNS, 0))
+        day["EntryCount"] += 1
+        for group, (key_column, quantity_column) in FACT_COLUMNS_BY_GROUP.items():
+            key = fact[key_column]
+            if key is None:
+                continue
+            fiber = fiber_of(group, key)
+            if fiber:
+                day[FIBER_COLUMN_BY_GROUP[group]] += fiber * parse_quantity(fact[quantity_column])
+        for water_oz, fruit_intake, stool in symptoms:
+            day["WaterOz"] += water_oz or 0
+            day["FruitIntake"] += fruit_intake or 0
+            if stool is not None:
+                day["StoolTotal"] += stool
+                day["StoolCount"] += 1
+
+    def rows(self) -> List[Dict[str, Any]]:
+        return [
+            {"UserKey": user_key, "Day": day, **totals}
+            for (user_key, day), totals in self.totals.items()
+        ]
+
+
+def rollup_upsert(dialect_name: str):
+    """INSERT that adds to an existing (UserKey, Day) row instead of failing."""
+    dialect_insert = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}[dialect_name]
+    stmt = dialect_insert(_rollup_table)
+    return stmt.on_conflict_do_update(
+        index_elements=["UserKey", "Day"],
+        set_={column: _rollup_table.c[column] + stmt.excluded[column] for column in ROLLUP_COLUMNS},
+    )
+
+
+def _merge_rollup_rows(session: Session, rows: Sequence[Dict[str, Any]]) -> None:
+    for row in rows:
+        rollup = session.get(ChildDailyRollup, (row["UserKey"], row["Day"]))
+        if rollup is None:
+            session.add(ChildDailyRollup(**{_attr_by_column[name]: value for name, value in row.items()}))
+            continue
+        for column in ROLLUP_COLUMNS:
+            attr = _attr_by_column[column]
+            setattr(rollup, attr, getattr(rollup, attr) + row[column])
+    session.flush()
+
+
+async def apply_rollup_deltas(db: AsyncSession, accumulator: RollupAccumulator) -> None:
+    """Fold deltas into ``ChildDailyRollup`` inside the caller's transaction."""
+    rows = accumulator.rows()
+    if not rows:
+        return
+    dialect_name = db.bind.dialect.name
+    if dialect_name in ("sqlite", "postgresql"):
+        await db.execute(rollup_upsert(dialect_name), rows)
+    else:
+        await db.run_sync(_merge_rollup_rows, rows)
+
+
+def rebuild_rollups(db: Session, child_keys: Optional[Sequence[int]] = None) -> int:
+    """Recompute rollups from FactSystem (all children, or just ``child_keys``)."""
+    fibers: Dict[str, Dict[int, Optional[int]]] = {}
+    for group, (model, key_attr, _id_attr, _food_attr, fiber_attr) in FOOD_GROUPS.items():
+        fibers[group] = dict(db.execute(select(getattr(model, key_attr), getattr(model, fiber_attr))).all())
+
+    def fiber_of(group: str, key: int) -> Optional[float]:
+        return fibers[group].get(key)
+
+    query = (
+        select(
+            FactSystem,
+            DimSymptom1.water_oz1, DimSymptom1.fruit_intake1, DimSymptom1.stool1,
+            DimSymptom2.water_oz2, DimSymptom2.fruit_intake2, DimSymptom2.stool2,
+        )
+        .outerjoin(DimSymptom1, DimSymptom1.symptom1_key == FactSystem.c.Symptom1Key)
+        .outerjoin(DimSymptom2, DimSymptom2.symptom2_key == FactSystem.c.Symptom2Key)
+    )
+    clear = delete(ChildDailyRollup)
+    if child_keys is not None:
+        query = query.where(FactSystem.c.UserKey.in_(child_keys))
+        clear = clear.where(ChildDailyRollup.user_key.in_(child_keys))
+
+    accumulator = RollupAccumulator()
+    for fact in db.execute(query.execution_options(yield_per=10_000)).mappings():
+        symptoms = []
+        if fact["Symptom1Key"] is not None:
+            symptoms.append((fact["water_oz1"], fact["fruit_intake1"], fact["stool1"]))
+        if fact["Symptom2Key"] is not None:
+            symptoms.append((fact["water_oz2"], fact["fruit_intake2"], fact["stool2"]))
+        accumulator.add(fact, fiber_of, symptoms)
+
+    db.execute(clear)
+    rows = accumulator.rows()
+    if rows:
+        db.execute(insert(_rollup_table), rows)
+    db.commit()
+    return len(rows)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        sys.exit("usage: python -m app.services.rollups rebuild [child_key ...]")
+    from app.db.session import SessionLocal
+
+    keys = [int(arg) for arg in sys.argv[2:]] or None
+    with SessionLocal() as session:
+        print(f"rebuilt {rebuild_rollups(session, keys)} child-day rollups")
@@ -0,0 +1,50 @@
+"""Per-request overhead of get_current_user with and without the principal cache.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_auth_cache [iterations]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+_tmpdir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmpdir}/bench.db"
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret-key-benchmark-secret-key")
+
+from app.core.config import settings  # noqa: E402
+from app.core.security import create_access_token, get_password_hash, principal_cache  # noqa: E402
+from app.db.migrations import upgrade  # noqa: E402
+from app.db.session import SessionLocal, engine  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.routes.auth import get_current_user  # noqa: E402
+
+
+async def run(token: str, iterations: int, cached: bool) -> float:
+    settings.auth_cache_enabled = cached
+    await principal_cache.clear()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await get_current_user(token)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    upgrade(engine)
+    with SessionLocal() as db:
+        db.add(User(first_name="Bench", username="bench", hashed_password=get_password_hash("benchmark")))
+        db.commit()
+    token = create_access_token("bench")
+
+    uncached = asyncio.run(run(token, iterations, cached=False))
+    cached = asyncio.run(run(token, iterations, cached=True))
+    print(f"get_current_user without cache: {uncached:8.1f} us/request")
+    print(f"get_current_user with cache:    {cached:8.1f} us/request")
+    print(f"speedup: {uncached / cached:.1f}x over {iterations} requests")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Fixtures for the in-process API benchmark suite.
+
+The app is imported against a throwaway SQLite database seeded by
+``benchmarks.datagen``, and Featherless/Spoonacular are answered by
+``benchmarks.fake_upstreams`` through an in-process transport, so results
+only reflect this codebase.
+"""
+import os
+import tempfile
+
+_tmpdir = tempfile.mkdtemp(prefix="happytummy-bench-")
+# Settings (and module-level constants in app.routes.ai) are read at import time.
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmpdir}/bench.db"
+os.environ["NUTRITION_CACHE_PATH"] = f"{_tmpdir}/nutrition_cache.db"
+os.environ["CACHE_SQLITE_PATH"] = f"{_tmpdir}/shared_cache.db"
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret-key-benchmark-secret-key")
+os.environ["FEATHERLESS_API_KEY"] = "fake-key"
+os.environ["FEATHERLESS_MODEL"] = "fake-model"
+os.environ["FEATHERLESS_BASE_URL"] = "http://fake-upstream/v1"
+os.environ["SPOONACULAR_KEY"] = "fake-key"
+os.environ["SPOONACULAR_BASE_URL"] = "http://fake-upstream"
+# Keep the nightly job worker from competing with measured requests.
+os.environ["JOBS_WORKER_ENABLED"] = "false"
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.core import http  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.db.session import engine  # noqa: E402
+from app.main import app  # noqa: E402
+from benchmarks import datagen, fake_upstreams  # noqa: E402
+
+PASSWORD = "benchmark-password"
+
+
+async def use_fake_upstreams() -> None:
+    """Replace the lifespan's upstream clients with ones answered by ``fake_upstreams`` in-process."""
+    await http.close_http_clients()
+    transport = httpx.ASGITransport(app=fake_upstreams.app)
+    for name, base_url in (
+        ("featherless", settings.featherless_base_url),
+        ("spoonacular", settings.spoonacular_base_url),
+    ):
+        http._clients[name] = httpx.AsyncClient(base_url=base_url, transport=transport)
+
+
+@pytest.fixture(scope="session")
+def dataset() -> datagen.GeneratedData:
+    return datagen.generate(
+        engine,
+        parents=int(os.environ.get("BENCH_PARENTS", "50")),
+        children_per_parent=2,
+        facts_per_child=int(os.environ.get("BENCH_FACTS_PER_CHILD", "200")),
+        password=PASSWORD,
+    )
+
+
+@pytest.fixture(scope="session")
+def client(dataset: datagen.GeneratedData):
+    with TestClient(app) as test_client:
+        test_client.portal.call(use_fake_upstreams)
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def auth_headers(client: TestClient, dataset: datagen.GeneratedData) -> dict:
+    response = client.post("/api/auth/login", json={"username": dataset.usernames[0], "password": PASSWORD})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
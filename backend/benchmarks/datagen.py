@@ -0,0 +1,243 @@
+"""Synthetic data generator for the HappyTummy schema.
+
+Fills ``users``, ``DimUser``, ``ParentChild``, every food and symptom
+dimension, ``FactSystem`` and its ``LogEvent`` copy at a configurable scale, using batched
+executemany inserts so millions of fact rows stay practical. Run from the
+backend directory against ``DATABASE_URL``::
+
+    python -m benchmarks.datagen --parents 1000 --children-per-parent 2 --facts-per-child 500
+
+Every generated parent logs in as ``parent<N>`` with ``--password``.
+"""
+import argparse
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List
+
+from sqlalchemy import Engine, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.core.security import get_password_hash
+from app.db.migrations import upgrade
+from app.models.happytummy_schema import DimSymptom1, DimSymptom2, DimUser, FactSystem, ParentChild
+from app.models.user import User
+from app.services import log_events
+from app.services.dimensions import FOOD_GROUPS
+from app.services.log_ingest import FACT_COLUMN_NAMES
+
+FOODS: Dict[str, List[tuple[str, int]]] = {
+    "carb": [("Rice cereal", 0), ("Oatmeal", 2), ("Barley cereal", 3), ("Whole wheat toast", 2), ("Pasta", 1), ("Quinoa", 3)],
+    "fruit": [("Banana", 3), ("Apple", 2), ("Pear", 3), ("Prune", 7), ("Mango", 2), ("Blueberries", 2), ("Avocado", 7)],
+    "veg": [("Sweet potato", 3), ("Carrot", 3), ("Peas", 5), ("Broccoli", 3), ("Spinach", 2), ("Butternut squash", 3), ("Zucchini", 1)],
+    "meat": [("Chicken", 0), ("Turkey", 0), ("Beef", 0), ("Salmon", 0), ("Lentils", 8), ("Egg yolk", 0)],
+    "milk": [("Breast milk", 0), ("Formula", 0), ("Whole milk", 0), ("Yogurt", 0)],
+}
+FACT_KEY_COLUMNS = {
+    "carb": ("CarbKey", "QuantityCarb"),
+    "fruit": ("FruitKey", "QuantityFruit"),
+    "veg": ("VegKey", "QuantityVeg"),
+    "meat": ("MeatKey", "QuantityMeat"),
+    "milk1": ("Milk1Key", "QuantityMilk1"),
+    "milk2": ("Milk2Key", "QuantityMilk2"),
+}
+SYMPTOM_ROWS = 500
+CHUNK_SIZE = 20_000
+BACKFILL_CHILDREN = 1_000
+
+
+@dataclass
+class GeneratedData:
+    usernames: List[str] = field(default_factory=list)
+    child_keys: List[int] = field(default_factory=list)
+    food_keys: Dict[str, List[int]] = field(default_factory=dict)
+    fact_rows: int = 0
+
+
+def _next_key(engine: Engine, column) -> int:
+    with engine.connect() as connection:
+        return (connection.scalar(select(func.max(column))) or 0) + 1
+
+
+def _chunks(rows: Iterator[dict], size: int = CHUNK_SIZE) -> Iterator[List[dict]]:
+    chunk: List[dict] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _seed_dimensions(engine: Engine, data: GeneratedData) -> None:
+    """Insert the food and symptom dimensions unless they already have rows."""
+    # ORM-enabled inserts so rows can use the mapped attribute names.
+    with Session(engine) as session, session.begin():
+        for group, (model, _key_attr, id_attr, food_attr, fiber_attr) in FOOD_GROUPS.items():
+            key_column = model.__mapper__.primary_key[0]
+            keys = list(session.scalars(select(key_column)))
+            if not keys:
+                foods = FOODS["milk" if group.startswith("milk") else group]
+                session.execute(
+                    insert(model),
+                    [
+                        {id_attr: i + 1, food_attr: name, fiber_attr: fiber}
+                        for i, (name, fiber) in enumerate(foods)
+                    ],
+                )
+                keys = list(session.scalars(select(key_column)))
+            data.food_keys[group] = keys
+
+        for model, prefix in ((DimSymptom1, "1"), (DimSymptom2, "2")):
+            key_column = model.__mapper__.primary_key[0]
+            keys = list(session.scalars(select(key_column)))
+            if not keys:
+                rng = random.Random(int(prefix))
+                session.execute(
+                    insert(model),
+                    [
+                        {
+                            f"symptom{prefix}_id": i + 1,
+                            f"water_oz{prefix}": rng.randint(0, 8),
+                            f"fruit_intake{prefix}": rng.randint(0, 3),
+                            f"stool{prefix}": rng.randint(1, 7),
+                        }
+                        for i in range(SYMPTOM_ROWS)
+                    ],
+                )
+                keys = list(session.scalars(select(key_column)))
+            data.food_keys[f"symptom{prefix}"] = keys
+
+
+def _fact_rows(
+    rng: random.Random, data: GeneratedData, facts_per_child: int, days: int, now: datetime
+) -> Iterator[dict]:
+    blank = dict.fromkeys(FACT_COLUMN_NAMES)
+    food_groups = list(FACT_KEY_COLUMNS)
+    for child_key in data.child_keys:
+        for i in range(facts_per_child):
+            row = dict(blank)
+            row["UserKey"] = child_key
+            row["EntryID"] = f"gen-{child_key}-{i}"
+            row["LoggedAt"] = now - timedelta(seconds=rng.randrange(days * 86_400))
+            if rng.random() < 0.2:
+                row["Symptom1Key"] = rng.choice(data.food_keys["symptom1"])
+                if rng.random() < 0.3:
+                    row["Symptom2Key"] = rng.choice(data.food_keys["symptom2"])
+            else:
+                group = rng.choice(food_groups)
+                key_column, quantity_column = FACT_KEY_COLUMNS[group]
+                row[key_column] = rng.choice(data.food_keys[group])
+                quantity = rng.randint(1, 6)
+                row[quantity_column] = str(quantity) if group.startswith("milk") else quantity
+            yield row
+
+
+def generate(
+    engine: Engine,
+    parents: int = 100,
+    children_per_parent: int = 2,
+    facts_per_child: int = 100,
+    days: int = 90,
+    password: str = "benchmark-password",
+    seed: int = 0,
+) -> GeneratedData:
+    """Populate the database behind ``engine``; safe to call on a non-empty database."""
+    upgrade(engine)
+    rng = random.Random(seed)
+    data = GeneratedData()
+    _seed_dimensions(engine, data)
+
+    # One hash for everyone: bcrypt would otherwise dominate generation time.
+    hashed_password = get_password_hash(password)
+    first_user_id = _next_key(engine, User.id)
+    first_child_key = _next_key(engine, DimUser.user_key)
+    users = [
+        {
+            "id": first_user_id + i,
+            "first_name": f"Parent {first_user_id + i}",
+            "username": f"parent{first_user_id + i}",
+            "hashed_password": hashed_password,
+        }
+        for i in range(parents)
+    ]
+    children = []
+    links = []
+    for parent_index, user in enumerate(users):
+        for j in range(children_per_parent):
+            child_key = first_child_key + parent_index * children_per_parent + j
+            children.append(
+                {
+                    "user_key": child_key,
+                    "name": f"Child {child_key}",
+                    "age": rng.randint(6, 24),
+                    "gender": rng.choice(["F", "M"]),
+                    "weight": rng.randint(14, 30),
+                    "allergies": rng.choice([0, 0, 0, 1]),
+                    "early_born": rng.choice([0, 0, 1]),
+                    "delivery_method": rng.choice([0, 1]),
+                    "envi_change": rng.choice([0, 0, 1]),
+                    "parent_consent": True,
+                }
+            )
+            links.append({"parent_user_id": user["id"], "child_user_key": child_key})
+
+    with Session(engine) as session, session.begin():
+        for chunk in _chunks(iter(users)):
+            session.execute(insert(User), chunk)
+        for chunk in _chunks(iter(children)):
+            session.execute(insert(DimUser), chunk)
+        for chunk in _chunks(iter(links)):
+            session.execute(insert(ParentChild), chunk)
+    data.usernames = [user["username"] for user in users]
+    data.child_keys = [child["user_key"] for child in children]
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    for chunk in _chunks(_fact_rows(rng, data, facts_per_child, days, now)):
+        with engine.begin() as connection:
+            connection.execute(insert(FactSystem), chunk)
+        data.fact_rows += len(chunk)
+    for start in range(0, len(data.child_keys), BACKFILL_CHILDREN):
+        with engine.begin() as connection:
+            log_events.backfill(connection, data.child_keys[start : start + BACKFILL_CHILDREN])
+    return data
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--parents", type=int, default=100)
+    parser.add_argument("--children-per-parent", type=int, default=2)
+    parser.add_argument("--facts-per-child", type=int, default=100)
+    parser.add_argument("--days", type=int, default=90, help="spread LoggedAt over this many past days")
+    parser.add_argument("--password", default="benchmark-password")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rollups", action="store_true", help="rebuild ChildDailyRollup afterwards")
+    args = parser.parse_args()
+
+    from app.db.session import SessionLocal, engine
+
+    start = time.perf_counter()
+    data = generate(
+        engine,
+        parents=args.parents,
+        children_per_parent=args.children_per_parent,
+        facts_per_child=args.facts_per_child,
+        days=args.days,
+        password=args.password,
+        seed=args.seed,
+    )
+    print(
+        f"{len(data.usernames)} parents, {len(data.child_keys)} children, "
+        f"{data.fact_rows} fact rows in {time.perf_counter() - start:.1f}s"
+    )
+    if args.rollups:
+        from app.services.rollups import rebuild_rollups
+
+        with SessionLocal() as session:
+            print(f"rebuilt {rebuild_rollups(session)} child-day rollups")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Local stand-in for a Redis server, enough for ``RedisBackend``.
+
+Speaks RESP over TCP and keeps everything in one dict with per-key expiry.
+It answers ``PING``, ``AUTH``, ``SELECT``, ``GET``, ``MGET``, ``SET`` (with
+``EX``/``PX``), ``DEL``, ``INCR``, ``DBSIZE`` and ``FLUSHDB``. Benchmarks run
+it on a background thread with ``serve_in_thread``; to point a server at it::
+
+    python -m benchmarks.fake_redis --port 6390
+    CACHE_BACKEND=redis CACHE_REDIS_URL=redis://127.0.0.1:6390/0 uvicorn app.main:app --workers 4
+"""
+import argparse
+import asyncio
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+store: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+
+
+def _bulk(value: Optional[bytes]) -> bytes:
+    return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _get(key: bytes) -> Optional[bytes]:
+    entry = store.get(key)
+    if entry is None:
+        return None
+    value, expires_at = entry
+    if expires_at is not None and expires_at <= time.monotonic():
+        del store[key]
+        return None
+    return value
+
+
+def execute(args: List[bytes]) -> bytes:
+    command = args[0].upper()
+    if command == b"PING":
+        return b"+PONG\r\n"
+    if command in (b"AUTH", b"SELECT"):
+        return b"+OK\r\n"
+    if command == b"GET":
+        return _bulk(_get(args[1]))
+    if command == b"MGET":
+        return b"*%d\r\n" % (len(args) - 1) + b"".join(_bulk(_get(key)) for key in args[1:])
+    if command == b"SET":
+        expires_at = None
+        options = [arg.upper() for arg in args[3:]]
+        if b"PX" in options:
+            expires_at = time.monotonic() + int(args[3 + options.index(b"PX") + 1]) / 1000
+        elif b"EX" in options:
+            expires_at = time.monotonic() + int(args[3 + options.index(b"EX") + 1])
+        store[args[1]] = (args[2], expires_at)
+        return b"+OK\r\n"
+    if command == b"DEL":
+        return b":%d\r\n" % sum(store.pop(key, None) is not None for key in args[1:])
+    if command == b"INCR":
+        current = _get(args[1])
+        try:
+            value = int(current or 0) + 1
+        except ValueError:
+            return b"-ERR value is not an integer or out of range\r\n"
+        store[args[1]] = (str(value).encode(), store.get(args[1], (None, None))[1])
+        return b":%d\r\n" % value
+    if command == b"DBSIZE":
+        return b":%d\r\n" % len(store)
+    if command == b"FLUSHDB":
+        store.clear()
+        return b"+OK\r\n"
+    return b"-ERR unknown command '%s'\r\n" % args[0]
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        while True:
+            header = await reader.readline()
+            if not header:
+                break
+            if not header.startswith(b"*"):
+                writer.write(b"-ERR protocol error\r\n")
+                break
+            args = []
+            for _ in range(int(header[1:])):
+                length = int((await reader.readline())[1:])
+                args.append((await reader.readexactly(length + 2))[:-2])
+            writer.write(execute(args))
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host: str, port: int) -> asyncio.base_events.Server:
+    return await asyncio.start_server(_handle, host, port)
+
+
+def serve_in_thread(host: str = "127.0.0.1", port: int = 0) -> Tuple[str, threading.Event]:
+    """Start the server on a daemon thread; returns its ``redis://`` URL and a stop event."""
+    ready = threading.Event()
+    stop = threading.Event()
+    url: List[str] = []
+
+    def run() -> None:
+        async def main() -> None:
+            server = await serve(host, port)
+            bound_port = server.sockets[0].getsockname()[1]
+            url.append(f"redis://{host}:{bound_port}/0")
+            ready.set()
+            while not stop.is_set():
+                await asyncio.sleep(0.05)
+            server.close()
+            await server.wait_closed()
+
+        asyncio.run(main())
+
+    threading.Thread(target=run, name="fake-redis", daemon=True).start()
+    ready.wait()
+    return url[0], stop
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve a minimal Redis-protocol cache server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+
+    async def run() -> None:
+        server = await serve(args.host, args.port)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
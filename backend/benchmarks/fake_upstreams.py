@@ -0,0 +1,224 @@
+"""Local stand-ins for the Featherless and Spoonacular APIs.
+
+A small FastAPI app that answers the endpoints the backend calls, so the
+``/api/ai/*`` routes can be measured offline. Benchmarks mount it in-process
+through ``httpx.ASGITransport``; point ``FEATHERLESS_BASE_URL`` at
+``<host>/v1`` and ``SPOONACULAR_BASE_URL`` at ``<host>`` to use it over HTTP.
+
+Each upstream has a ``FaultProfile``: a response latency distribution plus
+the fraction of requests answered with 429 (with ``Retry-After``) or 5xx.
+Profiles default to instant, error-free answers. Set them from the
+environment (``FAKE_FEATHERLESS_LATENCY_MS=800``,
+``FAKE_SPOONACULAR_RATE_LIMIT=0.05``, ...; see ``profile_from_env``) or
+with the flags of the server mode:
+
+    python -m benchmarks.fake_upstreams --port 8100 --featherless-latency-ms 800 --featherless-dist lognormal
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+from dataclasses import dataclass, fields
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+
+FAKE_COACH_RESULT = {
+    "summary": "Digestion looks steady this week.",
+    "why": ["Fiber intake was consistent."],
+    "tryToday": ["pear"],
+    "avoidToday": ["rice cereal"],
+    "next24hPlan": ["Offer water with meals."],
+    "redFlags": ["Blood in stool", "Fever over 38C"],
+}
+FAKE_CHAT_REPLY = "Pears and prunes are gentle options today. Keep offering small sips of water between feeds."
+
+FAKE_INGREDIENTS: List[Dict[str, Any]] = [
+    {"id": 9003, "name": "apple", "fiber": 2.4, "calories": 52},
+    {"id": 9040, "name": "banana", "fiber": 2.6, "calories": 89},
+    {"id": 9252, "name": "pear", "fiber": 3.1, "calories": 57},
+    {"id": 9291, "name": "prunes", "fiber": 7.1, "calories": 240},
+    {"id": 11090, "name": "broccoli", "fiber": 2.6, "calories": 34},
+    {"id": 11124, "name": "carrot", "fiber": 2.8, "calories": 41},
+    {"id": 11507, "name": "sweet potato", "fiber": 3.0, "calories": 86},
+    {"id": 20027, "name": "quinoa", "fiber": 2.8, "calories": 120},
+    {"id": 20444, "name": "rice", "fiber": 0.4, "calories": 130},
+    {"id": 1116, "name": "yogurt", "fiber": 0.0, "calories": 61},
+]
+_INGREDIENTS_BY_ID = {item["id"]: item for item in FAKE_INGREDIENTS}
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+
+@dataclass
+class FaultProfile:
+    """Latency and failure behaviour of one fake upstream."""
+
+    latency_ms: float = 0.0  # median (mean for "uniform" and "exponential")
+    dist: str = "fixed"
+    sigma: float = 0.5  # lognormal shape; larger means a longer tail
+    rate_limit: float = 0.0  # fraction answered 429
+    retry_after: float = 1.0
+    error_rate: float = 0.0  # fraction answered 503
+    chunk_ms: float = 0.0  # delay between streamed chunks
+
+    def sample_latency(self, rng: random.Random) -> float:
+        """One response delay in seconds."""
+        if self.latency_ms <= 0:
+            return 0.0
+        if self.dist == "uniform":
+            delay = rng.uniform(0, 2 * self.latency_ms)
+        elif self.dist == "exponential":
+            delay = rng.expovariate(1 / self.latency_ms)
+        elif self.dist == "lognormal":
+            delay = rng.lognormvariate(math.log(self.latency_ms), self.sigma)
+        else:
+            delay = self.latency_ms
+        return delay / 1000
+
+
+def profile_from_env(upstream: str, environ: Optional[Dict[str, str]] = None) -> FaultProfile:
+    """``FAKE_<UPSTREAM>_<FIELD>`` variables, e.g. ``FAKE_FEATHERLESS_LATENCY_MS``."""
+    environ = os.environ if environ is None else environ
+    profile = FaultProfile()
+    for field in fields(FaultProfile):
+        value = environ.get(f"FAKE_{upstream.upper()}_{field.name.upper()}")
+        if value is not None:
+            setattr(profile, field.name, value if isinstance(field.default, str) else float(value))
+    if profile.dist not in LATENCY_DISTRIBUTIONS:
+        raise ValueError(f"unknown latency distribution {profile.dist!r}")
+    return profile
+
+
+profiles: Dict[str, FaultProfile] = {name: profile_from_env(name) for name in ("featherless", "spoonacular")}
+rng = random.Random(int(os.environ.get("FAKE_SEED", "0")))
+injected = {"rate_limited": 0, "errors": 0}
+
+app = FastAPI(title="Fake upstreams")
+
+
+async def inject_faults(upstream: str) -> Optional[JSONResponse]:
+    """Wait out the sampled latency; return a 429/503 response when one is injected."""
+    profile = profiles[upstream]
+    delay = profile.sample_latency(rng)
+    if delay:
+        await asyncio.sleep(delay)
+    roll = rng.random()
+    if roll < profile.rate_limit:
+        injected["rate_limited"] += 1
+        return JSONResponse(
+            {"error": "rate limited"}, status_code=429, headers={"Retry-After": f"{profile.retry_after:g}"}
+        )
+    if roll < profile.rate_limit + profile.error_rate:
+        injected["errors"] += 1
+        return JSONResponse({"error": "upstream unavailable"}, status_code=503)
+    return None
+
+
+def completion_text(payload: Dict[str, Any]) -> str:
+    system = " ".join(m.get("content", "") for m in payload.get("messages", []) if m.get("role") == "system")
+    return json.dumps(FAKE_COACH_RESULT) if "valid JSON ONLY" in system else FAKE_CHAT_REPLY
+
+
+def completion_body(payload: Dict[str, Any], text: str) -> Dict[str, Any]:
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "model": payload.get("model"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 120, "completion_tokens": len(text.split()), "total_tokens": 120 + len(text.split())},
+    }
+
+
+async def completion_stream(payload: Dict[str, Any], text: str):
+    chunk_delay = profiles["featherless"].chunk_ms / 1000
+    for word in text.split(" "):
+        if chunk_delay:
+            await asyncio.sleep(chunk_delay)
+        chunk = {"choices": [{"index": 0, "delta": {"content": word + " "}}]}
+        yield f"data: {json.dumps(chunk)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(payload: Dict[str, Any]):
+    fault = await inject_faults("featherless")
+    if fault is not None:
+        return fault
+    text = completion_text(payload)
+    if payload.get("stream"):
+        return StreamingResponse(completion_stream(payload, text), media_type="text/event-stream")
+    return completion_body(payload, text)
+
+
+@app.get("/food/ingredients/search")
+async def ingredient_search(query: str, number: int = 5):
+    fault = await inject_faults("spoonacular")
+    if fault is not None:
+        return fault
+    query = query.lower()
+    matches = [item for item in FAKE_INGREDIENTS if query in item["name"]][:number]
+    return {
+        "results": [{"id": item["id"], "name": item["name"], "image": ""} for item in matches],
+        "offset": 0,
+        "number": number,
+        "totalResults": len(matches),
+    }
+
+
+@app.get("/food/ingredients/{ingredient_id}/information")
+async def ingredient_information(ingredient_id: int):
+    fault = await inject_faults("spoonacular")
+    if fault is not None:
+        return fault
+    item = _INGREDIENTS_BY_ID.get(ingredient_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return {
+        "id": item["id"],
+        "name": item["name"],
+        "nutrition": {
+            "nutrients": [
+                {"name": "Calories", "amount": item["calories"], "unit": "kcal"},
+                {"name": "Fiber", "amount": item["fiber"], "unit": "g"},
+                {"name": "Sugar", "amount": 5.0, "unit": "g"},
+                {"name": "Protein", "amount": 1.0, "unit": "g"},
+                {"name": "Water", "amount": 80.0, "unit": "g"},
+            ]
+        },
+    }
+
+
+@app.get("/_fake/stats")
+async def fake_stats() -> Dict[str, Any]:
+    """Injected failures so far, for checking a load run's error budget."""
+    return {"injected": injected, "profiles": {name: vars(profile) for name, profile in profiles.items()}}
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the fake Featherless and Spoonacular APIs over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    for upstream in profiles:
+        for field in fields(FaultProfile):
+            option = f"--{upstream}-{field.name.replace('_', '-')}"
+            if field.name == "dist":
+                parser.add_argument(option, choices=LATENCY_DISTRIBUTIONS)
+            else:
+                parser.add_argument(option, type=float)
+    args = parser.parse_args()
+    for upstream, profile in profiles.items():
+        for field in fields(FaultProfile):
+            value = getattr(args, f"{upstream}_{field.name}")
+            if value is not None:
+                setattr(profile, field.name, value)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Concurrent load against the DB-backed auth and children routes.
+
+Drives the real app in-process with many simultaneous clients and reports
+throughput and latency percentiles. Run from the backend directory:
+
+    python -m benchmarks.load_children [concurrency] [requests_per_client]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+_tmpdir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmpdir}/load.db"
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret-key-benchmark-secret-key")
+# Measure the database path, not the principal cache.
+os.environ["AUTH_CACHE_ENABLED"] = "false"
+
+import httpx  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+
+async def client_journey(client: httpx.AsyncClient, headers: dict, requests: int, latencies: list) -> None:
+    for i in range(requests):
+        start = time.perf_counter()
+        if i % 10 == 0:
+            response = await client.post(
+                "/api/children", headers=headers, json={"name": f"Child {i}", "parent_consent": True}
+            )
+        else:
+            response = await client.get("/api/children", headers=headers)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+
+
+async def main(concurrency: int, requests: int) -> None:
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await client.post(
+                "/api/auth/register", json={"first_name": "Load", "username": "load", "password": "load-test-pw"}
+            )
+            response = await client.post("/api/auth/login", json={"username": "load", "password": "load-test-pw"})
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+            latencies: list[float] = []
+            start = time.perf_counter()
+            await asyncio.gather(
+                *[client_journey(client, headers, requests, latencies) for _ in range(concurrency)]
+            )
+            elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000  # noqa: E731
+    print(f"{len(latencies)} requests, concurrency {concurrency}: {len(latencies) / elapsed:.0f} req/s")
+    print(f"p50 {pct(0.50):.1f} ms  p95 {pct(0.95):.1f} ms  p99 {pct(0.99):.1f} ms  mean {statistics.mean(latencies) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    asyncio.run(main(concurrency, requests))
@@ -0,0 +1,265 @@
+"""End-to-end load test of parent journeys against a multi-worker uvicorn.
+
+Seeds a throwaway SQLite database with ``benchmarks.datagen``, starts
+``benchmarks.fake_upstreams`` and ``uvicorn app.main:app --workers N`` as
+subprocesses, then runs ``--users`` simulated parents for ``--duration``
+seconds. Each parent logs in, then repeats the journey
+children -> child chat -> nutrition search, logging in again every
+``--session-journeys`` journeys. Reports throughput and p50/p95/p99 per step.
+
+Fake upstream latency and 429/5xx injection come from the ``FAKE_*``
+environment variables described in ``benchmarks/fake_upstreams.py``, which
+the fake server inherits. Run from the backend directory:
+
+    FAKE_FEATHERLESS_LATENCY_MS=800 FAKE_FEATHERLESS_DIST=lognormal FAKE_FEATHERLESS_RATE_LIMIT=0.02 \\
+        python -m benchmarks.loadtest --workers 4 --users 100 --duration 60
+
+``--cache-backend sqlite`` or ``redis`` makes the workers share one cache
+(``redis`` starts ``benchmarks.fake_redis``), to compare against the default
+per-worker ``memory`` caches.
+
+``--target URL`` skips seeding and process startup and drives a server that
+is already running against a ``benchmarks.datagen`` database.
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from typing import Dict, List, Optional
+
+import httpx
+
+PASSWORD = "benchmark-password"
+CHAT_QUESTIONS = [
+    "Is pear ok today?",
+    "How much water should she drink?",
+    "Why are his stools so hard this week?",
+    "Can we try broccoli yet?",
+]
+# Correct spellings, typos and foods outside the local index, so some searches reach Spoonacular.
+SEARCH_QUERIES = ["apple", "banana", "pear", "prunes", "swet potato", "brocoli", "carrot", "quinoa", "yogurt", "rice"]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(url: str, process: Optional[subprocess.Popen], timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            sys.exit(f"{url} exited with status {process.returncode} during startup")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    sys.exit(f"{url} not ready after {timeout:.0f}s")
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    async def call(self, step: str, request) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await request
+        except httpx.HTTPError as e:
+            self.errors[step][type(e).__name__] += 1
+            return None
+        self.latencies[step].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors[step][str(response.status_code)] += 1
+            return None
+        return response
+
+    def report(self, elapsed: float) -> None:
+        pct = lambda values, p: values[min(len(values) - 1, int(p * len(values)))] * 1000  # noqa: E731
+        print(f"{'step':<16}{'count':>8}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'mean ms':>9}")
+        everything: List[float] = []
+        for step, values in self.latencies.items():
+            values.sort()
+            everything.extend(values)
+            errors = sum(self.errors[step].values())
+            print(
+                f"{step:<16}{len(values):>8}{errors:>8}{len(values) / elapsed:>9.1f}{pct(values, 0.50):>9.1f}"
+                f"{pct(values, 0.95):>9.1f}{pct(values, 0.99):>9.1f}{statistics.mean(values) * 1000:>9.1f}"
+            )
+        if everything:
+            everything.sort()
+            print(
+                f"{'all':<16}{len(everything):>8}{sum(sum(e.values()) for e in self.errors.values()):>8}"
+                f"{len(everything) / elapsed:>9.1f}{pct(everything, 0.50):>9.1f}{pct(everything, 0.95):>9.1f}"
+                f"{pct(everything, 0.99):>9.1f}{statistics.mean(everything) * 1000:>9.1f}"
+            )
+        for step, errors in self.errors.items():
+            if errors:
+                print(f"{step} errors: " + ", ".join(f"{kind}={count}" for kind, count in sorted(errors.items())))
+
+
+async def parent_session(
+    client: httpx.AsyncClient,
+    recorder: Recorder,
+    username: str,
+    deadline: float,
+    session_journeys: int,
+    think_seconds: float,
+    rng: random.Random,
+) -> None:
+    async def think() -> None:
+        if think_seconds:
+            await asyncio.sleep(rng.expovariate(1 / think_seconds))
+
+    while time.monotonic() < deadline:
+        response = await recorder.call(
+            "login", client.post("/api/auth/login", json={"username": username, "password": PASSWORD})
+        )
+        if response is None:
+            await asyncio.sleep(1)
+            continue
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        for _ in range(session_journeys):
+            if time.monotonic() >= deadline:
+                return
+            await think()
+            response = await recorder.call("children", client.get("/api/children", headers=headers))
+            children = response.json() if response is not None else []
+            if children:
+                await think()
+                await recorder.call(
+                    "child_chat",
+                    client.post(
+                        f"/api/ai/children/{rng.choice(children)['user_key']}/chat",
+                        params={"userMessage": rng.choice(CHAT_QUESTIONS)},
+                        json={"conversation": []},
+                        headers=headers,
+                    ),
+                )
+            await think()
+            await recorder.call(
+                "nutrition", client.get("/api/ai/nutrition/search", params={"query": rng.choice(SEARCH_QUERIES)})
+            )
+
+
+async def run_load(args: argparse.Namespace, base_url: str, usernames: List[str]) -> Recorder:
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        deadline = time.monotonic() + args.duration
+        await asyncio.gather(
+            *[
+                parent_session(
+                    client,
+                    recorder,
+                    usernames[i % len(usernames)],
+                    deadline,
+                    args.session_journeys,
+                    args.think_ms / 1000,
+                    random.Random(args.seed + i),
+                )
+                for i in range(args.users)
+            ]
+        )
+    return recorder
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4, help="uvicorn worker processes")
+    parser.add_argument("--users", type=int, default=50, help="concurrent simulated parents")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--session-journeys", type=int, default=5, help="journeys per login")
+    parser.add_argument("--think-ms", type=float, default=0, help="mean pause between steps")
+    parser.add_argument("--timeout", type=float, default=30, help="client timeout per request")
+    parser.add_argument("--parents", type=int, default=200, help="seeded parents (users cycle through them)")
+    parser.add_argument("--facts-per-child", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache-backend", choices=("memory", "sqlite", "redis"), default="memory")
+    parser.add_argument("--target", help="drive an already running server instead of starting one")
+    args = parser.parse_args()
+
+    with ExitStack() as stack:
+        if args.target:
+            base_url = args.target.rstrip("/")
+            # datagen on an empty database numbers parents from 1.
+            usernames = [f"parent{i}" for i in range(1, args.parents + 1)]
+            wait_ready(f"{base_url}/openapi.json", None)
+        else:
+            tmpdir = stack.enter_context(tempfile.TemporaryDirectory(prefix="happytummy-load-"))
+            upstream_port, app_port, redis_port = free_port(), free_port(), free_port()
+            env = {
+                **os.environ,
+                "DATABASE_URL": f"sqlite:///{tmpdir}/load.db",
+                "NUTRITION_CACHE_PATH": f"{tmpdir}/nutrition_cache.db",
+                "JWT_SECRET_KEY": os.environ.get("JWT_SECRET_KEY", "benchmark-secret-key-benchmark-secret-key"),
+                "FEATHERLESS_API_KEY": "fake-key",
+                "FEATHERLESS_MODEL": os.environ.get("FEATHERLESS_MODEL", "fake-model"),
+                "FEATHERLESS_BASE_URL": f"http://127.0.0.1:{upstream_port}/v1",
+                "SPOONACULAR_KEY": "fake-key",
+                "SPOONACULAR_BASE_URL": f"http://127.0.0.1:{upstream_port}",
+                "JOBS_WORKER_ENABLED": "false",
+                "CACHE_BACKEND": args.cache_backend,
+                "CACHE_SQLITE_PATH": f"{tmpdir}/shared_cache.db",
+                "CACHE_REDIS_URL": f"redis://127.0.0.1:{redis_port}/0",
+            }
+            os.environ.update(env)
+
+            from app.db.session import engine
+            from benchmarks import datagen
+
+            start = time.perf_counter()
+            data = datagen.generate(
+                engine, parents=args.parents, facts_per_child=args.facts_per_child, password=PASSWORD, seed=args.seed
+            )
+            engine.dispose()
+            usernames = data.usernames
+            print(f"seeded {len(data.usernames)} parents, {data.fact_rows} fact rows in {time.perf_counter() - start:.1f}s")
+
+            upstream = subprocess.Popen(
+                [sys.executable, "-m", "benchmarks.fake_upstreams", "--port", str(upstream_port)], env=env
+            )
+            stack.callback(upstream.wait)
+            stack.callback(upstream.terminate)
+            if args.cache_backend == "redis":
+                cache_server = subprocess.Popen(
+                    [sys.executable, "-m", "benchmarks.fake_redis", "--port", str(redis_port)], env=env
+                )
+                stack.callback(cache_server.wait)
+                stack.callback(cache_server.terminate)
+            server = subprocess.Popen(
+                [
+                    sys.executable, "-m", "uvicorn", "app.main:app",
+                    "--port", str(app_port), "--workers", str(args.workers), "--log-level", "warning",
+                ],
+                env=env,
+            )
+            stack.callback(server.wait)
+            stack.callback(server.terminate)
+            wait_ready(f"http://127.0.0.1:{upstream_port}/_fake/stats", upstream)
+            base_url = f"http://127.0.0.1:{app_port}"
+            wait_ready(f"{base_url}/openapi.json", server)
+
+        print(f"{args.users} users for {args.duration:.0f}s against {base_url}")
+        start = time.perf_counter()
+        recorder = asyncio.run(run_load(args, base_url, usernames))
+        recorder.report(time.perf_counter() - start)
+        if not args.target:
+            injected = httpx.get(f"http://127.0.0.1:{upstream_port}/_fake/stats").json()["injected"]
+            print("fake upstream injected: " + ", ".join(f"{kind}={count}" for kind, count in injected.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""End-to-end API benchmarks; see the "Benchmarks" section of the README."""
+import itertools
+import json
+import time
+
+import pytest
+from sqlalchemy import delete, insert
+
+from app.core.config import settings
+from app.core.security import UserPrincipal, create_access_token, invalidate_user_principals, principal_cache
+from app.db.session import engine
+from app.models.coach import CoachResult
+from app.models.happytummy_schema import FactSystem
+from app.routes.ai import coach_cache, featherless_scheduler
+from app.services import nutrition
+from app.services.child_context import child_context_cache
+from app.services.coach_precompute import precompute_coach
+
+pytest.importorskip("pytest_benchmark")
+
+from benchmarks import fake_upstreams  # noqa: E402
+from benchmarks.conftest import PASSWORD  # noqa: E402
+
+COACH_BODY = {
+    "baby": {"name": "Bench", "ageMonths": 9, "weightLb": 19},
+    "insights": ["Two hard stools this week"],
+    "recommendations": {"tryToday": ["pear"], "avoidToday": ["rice cereal"]},
+}
+CHAT_BODY = {
+    "baby": {"name": "Bench", "ageMonths": 9},
+    "recentLogs": [{"stool": 2, "waterOz": 4}],
+    "conversation": [],
+}
+
+
+def ok(response):
+    assert response.status_code == 200, response.text
+    return response
+
+
+@pytest.mark.benchmark(group="auth")
+def test_login(benchmark, client, dataset):
+    body = {"username": dataset.usernames[1], "password": PASSWORD}
+    benchmark(lambda: ok(client.post("/api/auth/login", json=body)))
+
+
+@pytest.mark.benchmark(group="auth")
+@pytest.mark.parametrize("auth_cache", [True, False], ids=["cached", "uncached"])
+def test_me(benchmark, client, auth_headers, monkeypatch, auth_cache):
+    monkeypatch.setattr(settings, "auth_cache_enabled", auth_cache)
+    client.portal.call(principal_cache.clear)
+    benchmark(lambda: ok(client.get("/api/auth/me", headers=auth_headers)))
+
+
+def test_off_loop_invalidation_runs_on_the_app_loop(client):
+    token = create_access_token("off-loop")
+
+    async def cache_principal():
+        _cached, generation = await principal_cache.lookup(token)
+        await principal_cache.set(token, UserPrincipal(1, "Off", "off-loop"), time.time() + 60, generation)
+
+    async def cached():
+        return (await principal_cache.lookup(token))[0]
+
+    client.portal.call(cache_principal)
+    assert client.portal.call(cached) is not None
+    # No running loop in this thread, as in a threadpool route with a sync session.
+    invalidate_user_principals("off-loop")
+    assert client.portal.call(cached) is None
+
+
+@pytest.mark.benchmark(group="children")
+def test_list_children(benchmark, client, auth_headers):
+    benchmark(lambda: ok(client.get("/api/children", headers=auth_headers)))
+
+
+@pytest.mark.benchmark(group="children")
+def test_child_recommendations(benchmark, client, dataset, auth_headers):
+    url = f"/api/children/{dataset.child_keys[0]}/recommendations"
+    benchmark(lambda: ok(client.get(url, headers=auth_headers)))
+
+
+@pytest.mark.benchmark(group="export")
+@pytest.mark.parametrize(
+    "params", [{"format": "csv"}, {"format": "ndjson"}, {"format": "csv", "gzip": "true"}], ids=["csv", "ndjson", "csv-gzip"]
+)
+def test_child_export(benchmark, client, dataset, auth_headers, params):
+    url = f"/api/children/{dataset.child_keys[0]}/export"
+    body = benchmark(lambda: ok(client.get(url, params=params, headers=auth_headers)).content)
+    assert body
+
+
+def test_child_export_includes_untimed_facts(client, dataset, auth_headers):
+    child_key = dataset.child_keys[0]
+    untimed = FactSystem.c.UserKey == child_key, FactSystem.c.LoggedAt.is_(None)
+    with engine.begin() as connection:
+        connection.execute(insert(FactSystem).values(UserKey=child_key, CarbKey=1, QuantityCarb=2))
+    try:
+        url = f"/api/children/{child_key}/export"
+        lines = ok(client.get(url, headers=auth_headers)).text.splitlines()
+        assert lines[0] == "logged_at,kind,item,quantity"
+        assert lines[1].startswith(",carb,") and lines[1].endswith(",2.0")
+        assert all(line.split(",")[0] for line in lines[2:])
+        first = json.loads(ok(client.get(url, params={"format": "ndjson"}, headers=auth_headers)).text.splitlines()[0])
+        assert first["logged_at"] is None and first["kind"] == "carb"
+    finally:
+        with engine.begin() as connection:
+            connection.execute(delete(FactSystem).where(*untimed))
+
+
+@pytest.mark.benchmark(group="coach")
+@pytest.mark.parametrize("coach_cache_enabled", [True, False], ids=["cached", "uncached"])
+def test_coach(benchmark, client, monkeypatch, coach_cache_enabled):
+    monkeypatch.setattr(settings, "coach_cache_enabled", coach_cache_enabled)
+    client.portal.call(coach_cache.clear)
+    benchmark(lambda: ok(client.post("/api/ai/coach", json=COACH_BODY)))
+
+
+@pytest.mark.benchmark(group="coach")
+@pytest.mark.parametrize("precomputed", [True, False], ids=["precomputed", "live"])
+def test_child_coach(benchmark, client, dataset, auth_headers, precomputed):
+    child_key = dataset.child_keys[0]
+    url = f"/api/ai/children/{child_key}/coach"
+    with engine.begin() as connection:
+        connection.execute(delete(CoachResult))
+    if precomputed:
+        client.portal.call(precompute_coach, {"child_key": child_key})
+
+    def coach():
+        # Skip the in-memory layer so every round hits the stored result or the upstream.
+        client.portal.call(coach_cache.clear)
+        body = ok(client.post(url, headers=auth_headers)).json()
+        assert ("generatedAt" in body) == precomputed
+        return body
+
+    benchmark(coach)
+
+
+@pytest.mark.benchmark(group="chat")
+def test_chat(benchmark, client):
+    benchmark(lambda: ok(client.post("/api/ai/chat", params={"userMessage": "Is pear ok?"}, json=CHAT_BODY)))
+
+
+@pytest.mark.benchmark(group="chat")
+@pytest.mark.parametrize("context_cache", [True, False], ids=["cached", "uncached"])
+def test_child_chat(benchmark, client, dataset, auth_headers, context_cache):
+    url = f"/api/ai/children/{dataset.child_keys[0]}/chat"
+
+    def chat():
+        if not context_cache:
+            client.portal.call(child_context_cache.clear)
+        return ok(client.post(url, params={"userMessage": "Is pear ok?"}, json={"conversation": []}, headers=auth_headers))
+
+    benchmark(chat)
+
+
+@pytest.mark.benchmark(group="chat")
+def test_chat_stream(benchmark, client):
+    def stream_reply():
+        with client.stream("POST", "/api/ai/chat/stream", params={"userMessage": "Is pear ok?"}, json=CHAT_BODY) as response:
+            ok(response)
+            body = "".join(response.iter_text())
+        assert "event: done" in body
+
+    benchmark(stream_reply)
+
+
+def test_rate_limited_featherless_is_a_retryable_503(client, monkeypatch):
+    monkeypatch.setitem(fake_upstreams.profiles, "featherless", fake_upstreams.FaultProfile(rate_limit=1, retry_after=2))
+    monkeypatch.setattr(featherless_scheduler, "backoff_max_seconds", 0)
+    response = client.post("/api/ai/chat", params={"userMessage": "Is pear ok?"}, json=CHAT_BODY)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "2"
+    # The upstream's own error body stays in the server log.
+    assert "rate limited" not in response.text
+
+    with client.stream("POST", "/api/ai/chat/stream", params={"userMessage": "Is pear ok?"}, json=CHAT_BODY) as stream:
+        body = "".join(stream.iter_text())
+    assert "event: error" in body and '"retryAfter": 2' in body and "rate limited" not in body
+
+
+@pytest.mark.parametrize("path", ["/api/ai/coach/cache", "/api/ai/context/cache", "/api/ai/nutrition/cache"])
+def test_cache_counters_need_a_user(client, auth_headers, path):
+    assert client.get(path).status_code == 401
+    ok(client.get(path, headers=auth_headers))
+
+
+@pytest.mark.benchmark(group="nutrition")
+def test_nutrition_search_local(benchmark, client):
+    response = benchmark(lambda: ok(client.get("/api/ai/nutrition/search", params={"query": "swet potato"})))
+    assert response.json()["results"][0]["source"] == "local"
+
+
+@pytest.mark.benchmark(group="nutrition")
+def test_nutrition_search_spoonacular_cached(benchmark, client, monkeypatch):
+    monkeypatch.setattr(settings, "local_food_search_enabled", False)
+    benchmark(lambda: ok(client.get("/api/ai/nutrition/search", params={"query": "carrot"})))
+
+
+@pytest.mark.benchmark(group="nutrition")
+def test_nutrition_search_spoonacular_cold(benchmark, client, monkeypatch):
+    monkeypatch.setattr(settings, "local_food_search_enabled", False)
+    queries = itertools.cycle(["apple", "banana", "pear", "prunes", "broccoli", "carrot"])
+
+    def clear_caches():
+        for cache in (nutrition.query_cache, nutrition.ingredient_cache):
+            cache._memory.clear()
+        nutrition.cache_store.clear()
+        return (next(queries),), {}
+
+    benchmark.pedantic(
+        lambda query: ok(client.get("/api/ai/nutrition/search", params={"query": query})),
+        setup=clear_caches,
+        rounds=30,
+    )
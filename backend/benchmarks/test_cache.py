@@ -0,0 +1,164 @@
+"""Shared cache backends: lookup cost, and sharing between worker processes.
+
+Each backend is used through two ``SharedCache`` instances with their own
+connections, as two uvicorn workers would. The Redis backend talks to
+``benchmarks.fake_redis`` on a background thread. The cache API is async;
+each test drives it on an event loop of its own.
+"""
+import asyncio
+import socket
+import tempfile
+import time
+
+import pytest
+
+from app.core.cache import SharedCache, SqliteStore, TwoTierCache
+from app.core.cache_backends import MemoryBackend, RedisBackend, SqliteBackend
+from app.core.security import PrincipalCache, UserPrincipal, create_access_token
+from benchmarks import fake_redis
+
+pytest.importorskip("pytest_benchmark")
+
+CONTEXT = {
+    "baby": {"name": "Ava", "age": 9, "allergies": 0},
+    "logs": [{"loggedAt": "2026-10-01T08:00", "foods": ["Pear x2", "Oatmeal x1"], "stool": 4}] * 20,
+}
+
+
+@pytest.fixture(scope="module")
+def redis_url():
+    url, stop = fake_redis.serve_in_thread()
+    yield url
+    stop.set()
+
+
+@pytest.fixture
+def run():
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.close()
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def workers(request, redis_url, run):
+    """Two caches that share storage the way two worker processes would."""
+    if request.param == "memory":
+        backend = MemoryBackend(1024)
+        backends = [backend, backend]
+    elif request.param == "sqlite":
+        path = f"{tempfile.mkdtemp(prefix='happytummy-cache-')}/cache.db"
+        backends = [SqliteBackend(path), SqliteBackend(path)]
+    else:
+        fake_redis.store.clear()
+        backends = [RedisBackend(redis_url), RedisBackend(redis_url)]
+    yield [SharedCache("context", backend, 60) for backend in backends]
+    for backend in backends:
+        run(backend.close())
+
+
+@pytest.mark.benchmark(group="shared-cache")
+def test_shared_cache_hit(benchmark, workers, run):
+    first, second = workers
+    run(first.set("7", CONTEXT, scope="42"))
+    assert benchmark(lambda: run(second.get("7", scope="42"))) == CONTEXT
+
+
+@pytest.mark.benchmark(group="shared-cache")
+def test_shared_cache_invalidation(benchmark, workers, run):
+    first, second = workers
+
+    async def write_invalidate_read():
+        _value, generation = await second.lookup("7", scope="42")
+        await first.set("7", CONTEXT, scope="42")
+        await first.set("8", CONTEXT, scope="43")
+        await second.invalidate(scope="42")
+        # Computed before the invalidation, so it must not become servable.
+        await second.set("7", CONTEXT, scope="42", generation=generation)
+        return await first.get("7", scope="42"), await first.get("8", scope="43")
+
+    assert benchmark(lambda: run(write_invalidate_read())) == (None, CONTEXT)
+    run(second.invalidate())
+    assert run(first.get("8", scope="43")) is None
+    assert first.errors == second.errors == 0
+
+
+def test_shared_cache_calls_interleave_on_one_loop(workers, run):
+    first, second = workers
+
+    async def concurrently():
+        await first.set("7", CONTEXT, scope="42")
+        return await asyncio.gather(*(second.get("7", scope="42") for _ in range(20)))
+
+    assert run(concurrently()) == [CONTEXT] * 20
+
+
+def test_unreadable_entries_are_misses(run):
+    backend = MemoryBackend(16)
+    cache = SharedCache("context", backend, 60)
+    run(cache.set("7", CONTEXT))
+    assert run(cache.get("7")) == CONTEXT
+    stored = run(backend.get_many(["v:context::7"]))[0]
+    # A marshal entry from an older build (format 1), and a truncated JSON one.
+    for data in (bytes([1]) + stored[1:], stored[:-5]):
+        run(backend.set("v:context::7", data, 60))
+        assert run(cache.get("7")) is None
+    assert cache.errors == 0
+
+
+def test_two_tier_cache_drops_expired_entries_and_keeps_refreshes(run):
+    store = SqliteStore(f"{tempfile.mkdtemp(prefix='happytummy-twotier-')}/cache.db")
+    cache = TwoTierCache("test", store, max_entries=16, fresh_seconds=60, max_age_seconds=120)
+    run(cache.set("old", CONTEXT))
+    run(cache.set("stale", CONTEXT))
+    store.set("test", "old", CONTEXT, time.time() - 300)
+    cache._remember("old", time.time() - 300, CONTEXT)
+    store.set("test", "stale", CONTEXT, time.time() - 90)
+    cache._remember("stale", time.time() - 90, CONTEXT)
+
+    assert run(cache.lookup("old")) is None
+    assert "old" not in cache._memory and store.get("test", "old") is None
+
+    async def refresh():
+        return "fresh"
+
+    async def serve_stale():
+        value = await cache.get_or_load("stale", refresh)
+        pending = set(cache._refreshes)
+        await asyncio.gather(*pending)
+        return value, len(pending), cache._refreshes
+
+    assert run(serve_stale()) == (CONTEXT, 1, set())
+    assert run(cache.lookup("stale")) == ("fresh", False)
+    store.close()
+
+
+def test_principal_cache_skips_a_principal_revoked_while_verifying(run):
+    cache = PrincipalCache(16, 60)
+    token = create_access_token("ava")
+    principal = UserPrincipal(1, "Ava", "ava")
+
+    async def verify_with_revocation():
+        cached, generation = await cache.lookup(token)
+        await cache.invalidate_user("ava")  # e.g. a password change in another request
+        await cache.set(token, principal, expires_at=time.time() + 60, generation=generation)
+        return cached, (await cache.lookup(token))[0]
+
+    assert run(verify_with_revocation()) == (None, None)
+
+    async def verify():
+        _cached, generation = await cache.lookup(token)
+        await cache.set(token, principal, expires_at=time.time() + 60, generation=generation)
+        return (await cache.lookup(token))[0]
+
+    assert run(verify()) == principal
+
+
+def test_unreachable_redis_is_a_miss_and_backs_off(run):
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    backend = RedisBackend(f"redis://127.0.0.1:{port}/0", timeout_seconds=0.5)
+    cache = SharedCache("context", backend, 60)
+    assert run(cache.get("7", scope="42")) is None
+    assert run(cache.get("7", scope="42")) is None
+    assert cache.errors == 2 and backend.connects == 0
@@ -0,0 +1,96 @@
+"""Chat prompt budgeting (``app.services.chat_context``) and chat session ownership."""
+import pytest
+
+from app.services.chat_context import (
+    ChatTurn,
+    assemble_messages,
+    estimate_tokens,
+    fit_turns,
+    trim_logs,
+    turns_from_messages,
+)
+
+pytest.importorskip("pytest_benchmark")
+
+from benchmarks.conftest import PASSWORD  # noqa: E402
+
+
+def turn(n: int, tokens: int = 10) -> ChatTurn:
+    return ChatTurn("user" if n % 2 == 0 else "assistant", f"turn {n}", tokens, message_id=n)
+
+
+def test_fit_turns_keeps_the_newest_turns_within_budget():
+    turns = [turn(n) for n in range(1, 8)]
+    overflow, kept = fit_turns(turns, 35)
+    assert [t.message_id for t in kept] == [5, 6, 7]
+    assert [t.message_id for t in overflow] == [1, 2, 3, 4]
+    assert fit_turns(turns, 1000) == ([], turns)
+    assert fit_turns(turns, 0) == (turns, [])
+
+
+def test_fit_turns_stops_at_the_first_turn_that_does_not_fit():
+    # A small old turn must not be kept once a newer one overflowed: history stays contiguous.
+    turns = [turn(1, tokens=2), turn(2, tokens=50), turn(3, tokens=10)]
+    overflow, kept = fit_turns(turns, 20)
+    assert [t.message_id for t in kept] == [3]
+    assert [t.message_id for t in overflow] == [1, 2]
+
+
+def test_assemble_messages_charges_the_summary_first():
+    turns = [turn(n) for n in range(1, 6)]
+    summary = "x" * 40
+    summary_tokens = estimate_tokens(f"CONVERSATION SO FAR (summary):\n{summary}")
+    messages, overflow = assemble_messages("system", "context", summary, turns, "new", 30 + summary_tokens)
+
+    assert [m["role"] for m in messages] == ["system", "system", "system", "assistant", "user", "assistant", "user"]
+    assert [m["content"] for m in messages[3:]] == ["turn 3", "turn 4", "turn 5", "new"]
+    assert [t.message_id for t in overflow] == [1, 2]
+
+
+def test_assemble_messages_always_sends_the_new_message():
+    messages, overflow = assemble_messages("system", "context", "long summary " * 50, [turn(1)], "new", 10)
+    assert messages[-1] == {"role": "user", "content": "new"}
+    assert [t.message_id for t in overflow] == [1]
+    assert [m["content"] for m in messages[:2]] == ["system", "context"]
+
+
+def test_trim_logs_keeps_the_most_recent_logs():
+    logs = [{"day": day, "stool": 4} for day in range(10)]
+    cost = estimate_tokens('{"day": 0, "stool": 4}')
+    assert trim_logs(logs, 3 * cost) == logs[-3:]
+    assert trim_logs(logs, cost - 1) == []
+    assert trim_logs(None, 100) == []
+
+
+def test_turns_from_messages_drops_malformed_entries():
+    turns = turns_from_messages(
+        [{"role": "user", "content": "hi"}, {"role": "system", "content": "x"}, "junk", {"role": "assistant"}]
+    )
+    assert [(t.role, t.content) for t in turns] == [("user", "hi")]
+
+
+def test_chat_session_belongs_to_its_parent(client, dataset, auth_headers):
+    created = client.post("/api/ai/chat/sessions", json={"child_id": dataset.child_keys[0]}, headers=auth_headers)
+    assert created.status_code == 201, created.text
+    session_id = created.json()["session_id"]
+
+    login = client.post("/api/auth/login", json={"username": dataset.usernames[1], "password": PASSWORD})
+    other = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    assert client.get(f"/api/ai/chat/sessions/{session_id}", headers=other).status_code == 404
+    reply = client.post(f"/api/ai/chat/sessions/{session_id}/messages", json={"message": "hi"}, headers=other)
+    assert reply.status_code == 404
+    # Nor can a session be opened on someone else's child.
+    foreign = client.post("/api/ai/chat/sessions", json={"child_id": dataset.child_keys[0]}, headers=other)
+    assert foreign.status_code == 404
+
+    reply = client.post(f"/api/ai/chat/sessions/{session_id}/messages", json={"message": "hi"}, headers=auth_headers)
+    assert reply.status_code == 200, reply.text
+    detail = client.get(f"/api/ai/chat/sessions/{session_id}", headers=auth_headers).json()
+    assert [m["role"] for m in detail["messages"]] == ["user", "assistant"]
+
+
+@pytest.mark.benchmark(group="chat-context")
+def test_assemble_messages(benchmark):
+    turns = [turn(n, tokens=40) for n in range(1, 201)]
+    messages, overflow = benchmark(assemble_messages, "system", "context", "summary", turns, "new", 2000)
+    assert len(messages) - 4 + len(overflow) == 200 and len(overflow) > 150
@@ -0,0 +1,114 @@
+"""Job queue leases and retention: reclaiming jobs without double-recording outcomes, deleting old ones."""
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import insert, select, update
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.jobs import Job
+from app.services.jobs import claim, delete_finished_jobs, enqueue, finish, job_row, release, utcnow
+
+pytest.importorskip("pytest_benchmark")
+
+
+async def enqueue_one(kind: str) -> None:
+    async with AsyncSessionLocal() as db:
+        await enqueue(db, [job_row(kind)])
+        await db.commit()
+
+
+async def claim_kind(worker_id: str, kind: str):
+    async with AsyncSessionLocal() as db:
+        return [job for job in await claim(db, worker_id, 100) if job.kind == kind]
+
+
+async def expire_lease(kind: str, **values) -> None:
+    stale = utcnow() - timedelta(seconds=settings.jobs_lease_seconds + 1)
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(Job).where(Job.kind == kind).values(locked_at=stale, **values))
+        await db.commit()
+
+
+async def job_state(kind: str):
+    async with AsyncSessionLocal() as db:
+        return (
+            await db.execute(select(Job.status, Job.locked_by, Job.attempts, Job.last_error).where(Job.kind == kind))
+        ).one()
+
+
+async def reclaimed_job_outcomes():
+    await enqueue_one("test-reclaim")
+    [first] = await claim_kind("worker-a", "test-reclaim")
+    await expire_lease("test-reclaim")
+    # Reclaimed by the same worker: only the per-claim lease tells the two apart.
+    [second] = await claim_kind("worker-a", "test-reclaim")
+    return (
+        first.lease != second.lease and second.lease,
+        second.attempts,
+        await finish(first),
+        await release(first),
+        await job_state("test-reclaim"),
+        await finish(second),
+        await job_state("test-reclaim"),
+    )
+
+
+def test_only_the_lease_holder_records_an_outcome(client):
+    lease, attempts, stale_outcome, _released, reclaimed, outcome, finished = client.portal.call(
+        reclaimed_job_outcomes
+    )
+    assert lease and lease.endswith(":worker-a") and attempts == 2
+    # The handler that lost its lease neither finishes nor hands back the job.
+    assert stale_outcome == "lost"
+    assert reclaimed[:3] == ("running", lease, 2)
+    assert outcome == "done"
+    assert finished[:2] == ("done", None)
+
+
+async def exhausted_lease_state():
+    await enqueue_one("test-exhausted")
+    [job] = await claim_kind("worker-a", "test-exhausted")
+    await expire_lease("test-exhausted", attempts=settings.jobs_max_attempts)
+    return await claim_kind("worker-b", "test-exhausted"), await job_state("test-exhausted")
+
+
+def test_expired_job_without_attempts_left_fails(client):
+    reclaimed, state = client.portal.call(exhausted_lease_state)
+    assert reclaimed == []
+    assert state == ("failed", None, settings.jobs_max_attempts, "lease expired")
+
+
+async def retention_survivors():
+    now = utcnow()
+    old, recent = now - timedelta(days=settings.jobs_retention_days + 1), now - timedelta(hours=1)
+    rows = [
+        {**job_row("test-retention"), "Status": status, "FinishedAt": finished_at, "DedupKey": name}
+        for name, status, finished_at in (
+            ("old-done", "done", old),
+            ("old-failed", "failed", old),
+            ("recent-done", "done", recent),
+            ("old-queued", "queued", None),
+        )
+    ]
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(Job.__table__), rows)
+        await db.commit()
+        deleted = await delete_finished_jobs(db, now - timedelta(days=settings.jobs_retention_days))
+        survivors = await db.scalars(select(Job.dedup_key).where(Job.kind == "test-retention"))
+        return deleted, sorted(survivors)
+
+
+def test_retention_deletes_only_old_finished_jobs(client):
+    deleted, survivors = client.portal.call(retention_survivors)
+    assert deleted >= 2
+    assert survivors == ["old-queued", "recent-done"]
+
+
+@pytest.mark.benchmark(group="jobs")
+def test_claim_empty_queue(benchmark, client):
+    async def claim_none():
+        async with AsyncSessionLocal() as db:
+            return await claim(db, "bench", 4)
+
+    benchmark(lambda: client.portal.call(claim_none))
@@ -0,0 +1,64 @@
+"""Child-history reads: the FactSystem star join against the narrow LogEvent table.
+
+Both read one child's last week from a separate database seeded with
+``BENCH_HISTORY_PARENTS`` parents (two children each, default ``50``) and
+``BENCH_HISTORY_FACTS_PER_CHILD`` facts per child (default ``1000``).
+"""
+import itertools
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import bindparam, create_engine, select
+from sqlalchemy.orm import aliased
+
+from app.models.happytummy_schema import DimSymptom1, DimSymptom2, FactSystem
+from app.services.log_events import CHILD_HISTORY_QUERY
+from benchmarks import datagen
+
+pytest.importorskip("pytest_benchmark")
+
+_symptom2 = aliased(DimSymptom2)
+STAR_HISTORY_QUERY = (
+    select(
+        FactSystem,
+        DimSymptom1.water_oz1, DimSymptom1.fruit_intake1, DimSymptom1.stool1,
+        _symptom2.water_oz2, _symptom2.fruit_intake2, _symptom2.stool2,
+    )
+    .outerjoin(DimSymptom1, DimSymptom1.symptom1_key == FactSystem.c.Symptom1Key)
+    .outerjoin(_symptom2, _symptom2.symptom2_key == FactSystem.c.Symptom2Key)
+    .where(
+        FactSystem.c.UserKey == bindparam("child_key"),
+        FactSystem.c.LoggedAt >= bindparam("since"),
+        FactSystem.c.LoggedAt < bindparam("until"),
+    )
+    .order_by(FactSystem.c.LoggedAt)
+)
+
+
+@pytest.fixture(scope="module")
+def history_db():
+    engine = create_engine(f"sqlite:///{tempfile.mkdtemp(prefix='happytummy-history-')}/history.db")
+    data = datagen.generate(
+        engine,
+        parents=int(os.environ.get("BENCH_HISTORY_PARENTS", "50")),
+        facts_per_child=int(os.environ.get("BENCH_HISTORY_FACTS_PER_CHILD", "1000")),
+    )
+    yield engine, data
+    engine.dispose()
+
+
+@pytest.mark.benchmark(group="child-history")
+@pytest.mark.parametrize("query", [STAR_HISTORY_QUERY, CHILD_HISTORY_QUERY], ids=["fact_system", "log_event"])
+def test_child_history(benchmark, history_db, query):
+    engine, data = history_db
+    until = datetime.now(timezone.utc).replace(tzinfo=None)
+    children = itertools.cycle(data.child_keys)
+    with engine.connect() as connection:
+        rows = benchmark(
+            lambda: connection.execute(
+                query, {"child_key": next(children), "since": until - timedelta(days=7), "until": until}
+            ).all()
+        )
+    assert rows
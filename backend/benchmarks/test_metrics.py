@@ -0,0 +1,64 @@
+"""Prometheus exposition from ``app.core.metrics``: format checks and render cost."""
+import pytest
+
+from app.core import metrics
+from app.core.metrics import Counter, Histogram
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Lets a test register its own metrics without leaking them into ``/metrics``."""
+    monkeypatch.setattr(metrics.registry, "_metrics", dict(metrics.registry._metrics))
+    return metrics.registry
+
+
+def test_label_values_are_escaped(registry):
+    counter = Counter("test_escaped_total", "Escaping.", ("path",))
+    counter.inc(path='a\\b "c"\nd')
+    assert counter.render() == (
+        "# HELP test_escaped_total Escaping.\n"
+        "# TYPE test_escaped_total counter\n"
+        'test_escaped_total{path="a\\\\b \\"c\\"\\nd"} 1\n'
+    )
+
+
+def test_histogram_buckets_sum_and_count(registry):
+    histogram = Histogram("test_seconds", "Buckets.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, route="/x")
+    assert histogram.samples() == [
+        'test_seconds_bucket{route="/x",le="0.1"} 2',
+        'test_seconds_bucket{route="/x",le="1"} 3',
+        'test_seconds_bucket{route="/x",le="+Inf"} 4',
+        'test_seconds_sum{route="/x"} 3.65',
+        'test_seconds_count{route="/x"} 4',
+    ]
+
+
+def test_registry_rejects_duplicate_names(registry):
+    Counter("test_duplicate_total", "First.")
+    with pytest.raises(ValueError):
+        Counter("test_duplicate_total", "Second.")
+
+
+def test_route_label_is_the_path_template(client, dataset, auth_headers):
+    child_key = dataset.child_keys[0]
+    labels = {"method": "GET", "route": "/api/children/{child_id}/rollups", "status": 200}
+    before = metrics.http_requests.value(**labels)
+    client.get(f"/api/children/{child_key}/rollups", headers=auth_headers).raise_for_status()
+    assert metrics.http_requests.value(**labels) == before + 1
+
+    unmatched = {"method": "GET", "route": "unmatched", "status": 404}
+    before = metrics.http_requests.value(**unmatched)
+    client.get(f"/api/no-such-route/{child_key}")
+    assert metrics.http_requests.value(**unmatched) == before + 1
+    assert f"/{child_key}" not in client.get("/metrics").text
+
+
+@pytest.mark.benchmark(group="metrics")
+def test_render(benchmark, client, dataset, auth_headers):
+    client.get(f"/api/children/{dataset.child_keys[0]}/rollups", headers=auth_headers).raise_for_status()
+    text = benchmark(metrics.registry.render)
+    assert "# TYPE http_request_duration_seconds histogram" in text
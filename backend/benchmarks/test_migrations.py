@@ -0,0 +1,48 @@
+"""Schema migrations: a fresh upgrade, Postgres-compatible DDL and the startup version check."""
+import tempfile
+
+import pytest
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, create_engine, create_mock_engine, false, inspect
+
+from app.db.migrations import LATEST_VERSION, _add_column, _create_index, current_version, ensure_schema_current, upgrade
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.fixture(scope="module")
+def migrated_engine():
+    engine = create_engine(f"sqlite:///{tempfile.mkdtemp(prefix='happytummy-migrate-')}/migrate.db")
+    upgrade(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_fresh_database_reaches_the_latest_version(migrated_engine):
+    assert current_version(migrated_engine) == LATEST_VERSION
+    schema = inspect(migrated_engine)
+    assert {"ParentConsent"} <= {c["name"] for c in schema.get_columns("DimUser")}
+    assert {"EntryID", "LoggedAt"} <= {c["name"] for c in schema.get_columns("FactSystem")}
+    assert "ChildKey" in {c["name"] for c in schema.get_columns("ChatSession")}
+    indexes = {i["name"]: i for i in schema.get_indexes("LogEvent")}
+    assert indexes["ux_LogEvent_UserKey_EntryID_Kind"]["unique"]
+    assert upgrade(migrated_engine) == []
+
+
+def test_added_columns_render_for_postgres():
+    statements = []
+    connection = create_mock_engine("postgresql://", lambda sql, *args, **kwargs: statements.append(str(sql)))
+    _add_column(connection, "DimUser", Column("ParentConsent", Boolean, nullable=False, server_default=false()))
+    _add_column(connection, "FactSystem", Column("LoggedAt", DateTime))
+    _add_column(connection, "ChatSession", Column("ChildKey", Integer, ForeignKey("DimUser.UserKey")))
+    _create_index(connection, "FactSystem", "ux_FactSystem_UserKey_EntryID", "UserKey", "EntryID", unique=True)
+    assert [" ".join(s.split()) for s in statements] == [
+        'ALTER TABLE "DimUser" ADD COLUMN "ParentConsent" BOOLEAN DEFAULT false NOT NULL',
+        'ALTER TABLE "FactSystem" ADD COLUMN "LoggedAt" TIMESTAMP WITHOUT TIME ZONE',
+        'ALTER TABLE "ChatSession" ADD COLUMN "ChildKey" INTEGER REFERENCES "DimUser" ("UserKey")',
+        'CREATE UNIQUE INDEX "ux_FactSystem_UserKey_EntryID" ON "FactSystem" ("UserKey", "EntryID")',
+    ]
+
+
+@pytest.mark.benchmark(group="migrations")
+def test_startup_schema_check(benchmark, migrated_engine):
+    benchmark(ensure_schema_current, migrated_engine, False)
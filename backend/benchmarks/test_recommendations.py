@@ -0,0 +1,142 @@
+"""Recommendation scoring on in-memory histories: correctness and speed.
+
+The correctness tests use a small named catalog; the benchmarks time the
+NumPy scoring alone, at nightly-batch scale, without the database load in
+front of it.
+"""
+import os
+
+import numpy as np
+import pytest
+
+from app.services.dimensions import FoodEntry
+from app.services.log_events import FOOD_KINDS, EventKind
+from app.services.recommendations import (
+    HISTORY_COLUMNS,
+    build_catalog,
+    history_from_rows,
+    is_common_allergen,
+    recommend,
+)
+
+pytest.importorskip("pytest_benchmark")
+
+FOODS_PER_GROUP = 8
+GROUPS = ("carb", "meat", "fruit", "veg", "milk1", "milk2")
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    rng = np.random.default_rng(0)
+    entries = [
+        FoodEntry(group, key, key, f"{group} food {key}", int(rng.integers(0, 8)))
+        for group in GROUPS
+        for key in range(1, FOODS_PER_GROUP + 1)
+    ]
+    return build_catalog(1, entries)
+
+
+def synthetic_history(catalog, children: int, facts_per_child: int):
+    rng = np.random.default_rng(1)
+    child_keys = np.arange(1, children + 1, dtype=np.int64)
+    rows = np.full((children * facts_per_child, len(HISTORY_COLUMNS)), -1, dtype=np.float64)
+    rows[:, 0] = np.repeat(child_keys, facts_per_child)
+    food_kinds = np.array([FOOD_KINDS[group] for group in GROUPS])
+    rows[:, 1] = food_kinds[rng.integers(0, len(GROUPS), len(rows))]
+    rows[:, 2] = rng.integers(1, FOODS_PER_GROUP + 1, len(rows))
+    rows[:, 3] = rng.integers(1, 4, len(rows))
+    # About one entry in five is a stool or water measurement instead of a food.
+    symptom = rng.random(len(rows)) < 0.2
+    rows[symptom, 1] = np.where(rng.random(symptom.sum()) < 0.5, EventKind.STOOL, EventKind.WATER_OZ)
+    rows[symptom, 2] = -1
+    rows[symptom, 3] = rng.integers(1, 8, symptom.sum())
+    return history_from_rows(catalog, child_keys, rng.random(children) < 0.25, rows)
+
+
+# (group, key, name, fiber)
+NAMED_FOODS = (
+    ("carb", 1, "Oatmeal", 4),
+    ("carb", 2, "Rice cereal", 0),
+    ("carb", 3, "Wheat toast", 2),
+    ("fruit", 1, "Prune", 7),
+    ("fruit", 2, "Pear", 6),
+    ("fruit", 3, "Banana", 1),
+    ("veg", 1, "Peas", 5),
+    ("veg", 2, "Carrot", 3),
+    ("meat", 1, "Egg", 0),
+    ("meat", 2, "Salmon", 0),
+    ("milk1", 1, "Yogurt", 0),
+    ("milk1", 2, "Peanut butter", 3),
+)
+FIBER = {name: fiber for _group, _key, name, fiber in NAMED_FOODS}
+HARD_STOOLS = [(EventKind.STOOL, -1, 1), (EventKind.STOOL, -1, 2)]
+LOOSE_STOOLS = [(EventKind.STOOL, -1, 6), (EventKind.STOOL, -1, 7)]
+
+
+@pytest.fixture(scope="module")
+def named_catalog():
+    return build_catalog(1, [FoodEntry(group, key, key, name, fiber) for group, key, name, fiber in NAMED_FOODS])
+
+
+def recommend_one(catalog, events, allergic=False):
+    """Recommendations for one child from ``(kind, item key, quantity)`` events, every food ranked."""
+    rows = np.array([(1, kind, item, quantity) for kind, item, quantity in events], dtype=np.float64)
+    history = history_from_rows(catalog, np.array([1]), np.array([allergic]), rows)
+    [(_key, result)] = recommend(catalog, history, k=len(catalog))
+    return result
+
+
+def eaten(group: str, key: int, times: int = 1):
+    return [(FOOD_KINDS[group], key, 1)] * times
+
+
+@pytest.mark.parametrize(
+    "events",
+    [[], HARD_STOOLS, LOOSE_STOOLS, eaten("meat", 1, 3) + eaten("fruit", 3) + HARD_STOOLS],
+    ids=["no-logs", "hard", "loose", "eats-egg"],
+)
+def test_allergic_child_is_never_offered_allergens(named_catalog, events):
+    allergens = {name for _group, _key, name, _fiber in NAMED_FOODS if is_common_allergen(name)}
+    assert allergens == {"Wheat toast", "Egg", "Salmon", "Yogurt", "Peanut butter"}
+
+    allergic = recommend_one(named_catalog, events, allergic=True)
+    assert allergic["try_today"] and not allergens & set(allergic["try_today"])
+    # The same history without the flag does rank them, so the filter is what removed them.
+    assert allergens & set(recommend_one(named_catalog, events)["try_today"])
+
+
+def test_hard_stools_rank_high_fiber_foods_first(named_catalog):
+    ranked = recommend_one(named_catalog, HARD_STOOLS)["try_today"]
+    assert ranked[:3] == ["Prune", "Pear", "Peas"]
+    assert [FIBER[name] for name in ranked] == sorted((FIBER[name] for name in ranked), reverse=True)
+
+
+def test_loose_stools_rank_low_fiber_foods_first(named_catalog):
+    ranked = recommend_one(named_catalog, LOOSE_STOOLS)["try_today"]
+    assert FIBER[ranked[0]] == 0 and "Prune" not in ranked[:6]
+
+
+def test_hard_stools_flag_recent_low_fiber_foods(named_catalog):
+    result = recommend_one(named_catalog, eaten("carb", 2, 4) + eaten("fruit", 2) + HARD_STOOLS)
+    assert result["avoid_today"] == ["Rice cereal"]
+    assert "Rice cereal" not in result["try_today"]
+    assert result["try_today"][0] == "Prune"  # the pear was just eaten; variety favours the prune
+
+
+def test_recommendations_are_deterministic(named_catalog):
+    events = eaten("veg", 2, 2) + eaten("carb", 1) + LOOSE_STOOLS
+    assert recommend_one(named_catalog, events) == recommend_one(named_catalog, events)
+
+
+@pytest.mark.benchmark(group="recommendations")
+def test_recommend_single_child(benchmark, catalog):
+    history = synthetic_history(catalog, 1, 35)
+    benchmark(lambda: list(recommend(catalog, history)))
+
+
+@pytest.mark.benchmark(group="recommendations")
+def test_recommend_batch(benchmark, catalog):
+    children = int(os.environ.get("BENCH_RECOMMEND_CHILDREN", "100000"))
+    history = synthetic_history(catalog, children, 35)
+    results = benchmark.pedantic(lambda: sum(1 for _ in recommend(catalog, history)), rounds=3)
+    assert results == children
@@ -0,0 +1,300 @@
+"""Upstream admission control: Retry-After parsing, priority order, circuit breaking, hedging."""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httpx
+import pytest
+
+from app.core.upstream import (
+    CircuitBreaker,
+    LatencyTracker,
+    Priority,
+    UpstreamScheduler,
+    UpstreamUnavailable,
+    hedged,
+    parse_retry_after,
+)
+
+pytest.importorskip("pytest_benchmark")
+
+
+def make_scheduler(max_in_flight: int = 4, max_retries: int = 3, breaker: CircuitBreaker | None = None):
+    return UpstreamScheduler(
+        "test",
+        max_in_flight=max_in_flight,
+        max_queue=10,
+        queue_timeout_seconds=5,
+        max_retries=max_retries,
+        backoff_base_seconds=0,
+        backoff_max_seconds=0,
+        breaker=breaker or CircuitBreaker("test", failure_threshold=2, reset_seconds=60),
+    )
+
+
+def replies(*statuses: int):
+    """A ``send`` answering with ``statuses`` in turn; counts its calls in ``send.calls``."""
+    remaining = list(statuses)
+
+    async def send() -> httpx.Response:
+        send.calls += 1
+        return httpx.Response(remaining.pop(0) if len(remaining) > 1 else remaining[0])
+
+    send.calls = 0
+    return send
+
+
+async def status_of(scheduler: UpstreamScheduler, send) -> int:
+    async with scheduler.request(send) as response:
+        return response.status_code
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("120", 120.0), ("1.5", 1.5), ("-3", 0.0), (None, None), ("", None), ("soon", None)],
+)
+def test_parse_retry_after_seconds(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_http_date():
+    assert 25 < parse_retry_after(format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)) <= 30
+    assert parse_retry_after(format_datetime(datetime.now(timezone.utc) - timedelta(hours=1), usegmt=True)) == 0.0
+
+
+def test_interactive_waiters_are_admitted_first():
+    async def scenario():
+        scheduler = make_scheduler(max_in_flight=1)
+        release = asyncio.Event()
+        admitted = []
+
+        async def hold() -> httpx.Response:
+            await release.wait()
+            return httpx.Response(200)
+
+        async def wait_as(label: str, priority: Priority) -> None:
+            async def send() -> httpx.Response:
+                admitted.append(label)
+                return httpx.Response(200)
+
+            async with scheduler.request(send, priority):
+                pass
+
+        holder = asyncio.ensure_future(status_of(scheduler, hold))
+        await asyncio.sleep(0)
+        waiters = [
+            asyncio.ensure_future(wait_as("background-1", Priority.BACKGROUND)),
+            asyncio.ensure_future(wait_as("background-2", Priority.BACKGROUND)),
+        ]
+        await asyncio.sleep(0)
+        waiters.append(asyncio.ensure_future(wait_as("interactive", Priority.INTERACTIVE)))
+        await asyncio.sleep(0)
+        assert scheduler.queued == 3
+        release.set()
+        await asyncio.gather(holder, *waiters)
+        return admitted
+
+    assert asyncio.run(scenario()) == ["interactive", "background-1", "background-2"]
+
+
+def test_queue_timeout_after_the_handover_frees_the_slot(monkeypatch):
+    scheduler = make_scheduler(max_in_flight=1)
+
+    async def handed_over_then_timed_out(waiter, timeout):
+        scheduler._release()  # the holder finishes and passes its slot to the waiter
+        raise asyncio.TimeoutError
+
+    async def scenario():
+        await scheduler._acquire(Priority.INTERACTIVE)
+        monkeypatch.setattr(asyncio, "wait_for", handed_over_then_timed_out)
+        with pytest.raises(UpstreamUnavailable) as raised:
+            await scheduler._acquire(Priority.INTERACTIVE)
+        monkeypatch.undo()
+        return raised.value.reason
+
+    assert asyncio.run(scenario()) == "queue_timeout"
+    assert scheduler._in_flight == 0 and scheduler.queued == 0
+
+
+def test_breaker_opens_half_opens_and_closes():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=0.05)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(UpstreamUnavailable):
+        breaker.before_call()
+
+    time.sleep(0.06)
+    breaker.before_call()  # the probe
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(UpstreamUnavailable):
+        breaker.before_call()  # only one probe at a time
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+
+def test_breaker_probe_is_freed_when_the_call_ends_without_an_outcome():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=0)
+    breaker.before_call()
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.end_call()
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_breaker_counts_one_outcome_per_request():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=60)
+    scheduler = make_scheduler(breaker=breaker)
+
+    recovered = replies(503, 502, 200)
+    assert asyncio.run(status_of(scheduler, recovered)) == 200
+    assert recovered.calls == 3 and breaker.failures == 0
+
+    failing = replies(503)
+    assert asyncio.run(status_of(scheduler, failing)) == 503
+    assert failing.calls == 4 and breaker.failures == 1
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_breaker_ignores_rate_limiting():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=60)
+    scheduler = make_scheduler(breaker=breaker)
+    for _ in range(3):
+        assert asyncio.run(status_of(scheduler, replies(429))) == 429
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0
+
+
+def test_breaker_counts_transport_errors_once():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=60)
+    scheduler = make_scheduler(breaker=breaker)
+
+    async def unreachable() -> httpx.Response:
+        raise httpx.ConnectError("refused")
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(status_of(scheduler, unreachable))
+    assert breaker.failures == 1 and breaker.state == CircuitBreaker.CLOSED
+
+
+class PrimaryError(Exception):
+    pass
+
+
+class BackupError(Exception):
+    pass
+
+
+def call(result=None, after: float = 0.0, error: Exception | None = None, log: list | None = None):
+    """A coroutine factory finishing after ``after`` seconds; notes a cancellation in ``log``."""
+
+    async def run():
+        try:
+            await asyncio.sleep(after)
+        except asyncio.CancelledError:
+            if log is not None:
+                log.append("cancelled")
+            raise
+        if error is not None:
+            raise error
+        return result
+
+    return run
+
+
+def test_latency_tracker_delay():
+    tracker = LatencyTracker(window=40, percentile=90, min_delay=0.2, initial_delay=1.5)
+    for _ in range(LatencyTracker.MIN_SAMPLES - 1):
+        tracker.observe(0.5)
+    assert tracker.delay() == 1.5
+    tracker.observe(0.5)
+    assert tracker.delay() == 0.5
+    for seconds in range(40):
+        tracker.observe(seconds / 10)
+    assert tracker.delay() == 3.6  # p90 of 0.0 .. 3.9; the older samples left the window
+    for _ in range(40):
+        tracker.observe(0.01)
+    assert tracker.delay() == 0.2
+
+
+def test_hedged_fast_primary_wins_without_a_backup():
+    backup_calls = []
+    result = asyncio.run(hedged("test", call("a"), lambda: backup_calls.append(1), delay=0.5))
+    assert result == ("a", "primary") and not backup_calls
+
+
+def test_hedged_slow_primary_is_raced_and_cancelled():
+    log = []
+    tracker = LatencyTracker(window=10, percentile=50, min_delay=0, initial_delay=0)
+    result = asyncio.run(hedged("test", call("a", after=1.0, log=log), call("b"), delay=0.02, tracker=tracker))
+    assert result == ("b", "hedge")
+    assert log == ["cancelled"]
+    # The cut-short primary still records how long it had been running.
+    assert len(tracker.samples) == 1 and tracker.samples[0] >= 0.02
+
+
+def test_hedged_without_delay_never_hedges():
+    result = asyncio.run(hedged("test", call("a", after=0.05), call("b"), delay=None))
+    assert result == ("a", "primary")
+
+
+def test_hedged_falls_back_when_the_primary_fails():
+    result = asyncio.run(hedged("test", call(error=PrimaryError()), call("b"), delay=1.0))
+    assert result == ("b", "fallback")
+
+
+def test_hedged_raises_without_fallback_when_not_allowed():
+    backup_calls = []
+
+    async def backup():
+        backup_calls.append(1)
+
+    with pytest.raises(PrimaryError):
+        asyncio.run(hedged("test", call(error=PrimaryError()), backup, delay=1.0, fallback_on=lambda exc: False))
+    assert not backup_calls
+
+
+def test_hedged_raises_the_primary_error_when_the_fallback_fails():
+    with pytest.raises(PrimaryError) as raised:
+        asyncio.run(hedged("test", call(error=PrimaryError()), call(error=BackupError()), delay=1.0))
+    assert isinstance(raised.value.__context__, BackupError)
+
+
+def test_hedged_raises_the_primary_error_when_both_racers_fail():
+    with pytest.raises(PrimaryError):
+        asyncio.run(
+            hedged("test", call(after=0.05, error=PrimaryError()), call(error=BackupError()), delay=0.01)
+        )
+    with pytest.raises(PrimaryError):
+        asyncio.run(
+            hedged("test", call(after=0.02, error=PrimaryError()), call(after=0.05, error=BackupError()), delay=0.01)
+        )
+
+
+def test_scheduler_needs_a_breaker():
+    scheduler = UpstreamScheduler("test", 1, 1, 1, 0, 0, 0)
+    with pytest.raises(ValueError):
+        asyncio.run(status_of(scheduler, replies(200)))
+
+
+@pytest.mark.benchmark(group="upstream")
+def test_scheduler_overhead(benchmark):
+    scheduler = make_scheduler()
+    send = replies(200)
+
+    async def hundred_requests():
+        for _ in range(100):
+            await status_of(scheduler, send)
+
+    benchmark(lambda: asyncio.run(hundred_requests()))
+    assert scheduler.breaker.state == CircuitBreaker.CLOSED